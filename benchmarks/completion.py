@@ -0,0 +1,60 @@
+"""
+Measuring completion of names of contacts.
+Prints the time of building the index, of completing by the beginning of the name,
+by the beginning with a typo, and of keeping the index in sync with adding and deleting.
+A frame of the terminal is about 16 ms.
+Run from the project folder:
+py -m benchmarks.completion [number of names, 1000000 by default]
+"""
+
+import random
+import string
+import sys
+import time
+
+from tools.indexing import NameIndex
+
+
+def make_names(count: int) -> set:
+    random.seed(count)
+    letters = string.ascii_lowercase + 'абвгдежзиклмнопрстуфхцчшщюяії'
+    return {''.join(random.choice(letters) for _ in range(random.randint(4, 10))).capitalize()
+            for _ in range(count)}
+
+
+def measure(index: NameIndex, prefixes: list) -> tuple:
+    """
+    Average and worst milliseconds of completing
+    """
+    times = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.complete(prefix)
+        times.append(time.perf_counter() - start)
+    return sum(times) / len(times) * 1000, max(times) * 1000
+
+
+def perform(count: int = 1_000_000) -> None:
+    names = make_names(count)
+    start = time.perf_counter()
+    index = NameIndex(names)
+    print(f'{len(names)} names, building of the index: {time.perf_counter() - start:.2f} s')
+    sample = random.sample(sorted(names), 500)
+    cases = {
+        'beginning': [name[:3] for name in sample],
+        'beginning with a typo': [name[1] + name[0] + name[2:6] for name in sample],
+        'unknown beginning': ['ъъ' + name[:3] for name in sample],
+    }
+    for title, prefixes in cases.items():
+        average, worst = measure(index, prefixes)
+        print(f'{title}: {average:.2f} ms on average, {worst:.2f} ms at worst')
+    start = time.perf_counter()
+    for number in range(1000):
+        index.add(f'Added{number}', None)
+    for number in range(1000):
+        index.discard(f'Added{number}')
+    print(f'adding or deleting of the name: {(time.perf_counter() - start) / 2:.2f} ms')
+
+
+if __name__ == '__main__':
+    perform(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,93 @@
+"""
+Measuring memory used by contacts & notes.
+Compares records with __dict__ and datetime fields (as they were kept before __slots__)
+with the slotted records of tools.records.
+Run from the project folder:
+py -m benchmarks.memory [number of records, 1000000 by default]
+"""
+
+import sys
+import tracemalloc
+from datetime import datetime, timedelta
+
+from tools.records import Note, Person
+
+
+class DictPerson:
+    """
+    Contact as it was kept before __slots__: fields in __dict__, birthday as datetime
+    """
+
+    def __init__(self, name, address, phone, email, birthday):
+        self.name = name
+        self.address = address
+        self.phone = phone
+        self.email = email
+        self.birthday = birthday
+
+
+class DictNote:
+    """
+    Note as it was kept before __slots__: fields in __dict__, date as ISO string
+    """
+
+    def __init__(self, value, keyWords, date):
+        self.date = date
+        self.value = value
+        self.keyWords = keyWords
+
+
+def measure(build, count: int) -> float:
+    """
+    Measuring bytes allocated per record
+    :param build: function
+        builds the record by its number
+    :param count: int
+        number of records
+    :return: float
+        bytes per record
+    """
+    tracemalloc.start()
+    start, _ = tracemalloc.get_traced_memory()
+    records = [build(number) for number in range(count)]
+    end, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return (end - start) / count
+
+
+def perform(count: int = 1_000_000) -> None:
+    """
+    Printing bytes per contact & note before and after __slots__
+    """
+    # Field values are shared between both kinds of records, so only records themselves are measured
+    names = [f'Name{number}' for number in range(count)]
+    birthday = datetime(1990, 1, 1)
+    created = datetime.now()
+
+    def dict_person(number):
+        return DictPerson(names[number], 'NULL', 'NULL', 'NULL', birthday + timedelta(days=number % 366))
+
+    def slotted_person(number):
+        person = Person.__new__(Person)
+        person.name, person.address, person.phone, person.email = names[number], 'NULL', 'NULL', 'NULL'
+        person.birthday = birthday + timedelta(days=number % 366)
+        return person
+
+    def dict_note(number):
+        return DictNote(names[number], [], (created + timedelta(seconds=number)).isoformat())
+
+    def slotted_note(number):
+        note = Note(names[number], [])
+        note.date = (created + timedelta(seconds=number)).isoformat()
+        return note
+
+    print(f'{count} records')
+    print(f'contact with __dict__: {measure(dict_person, count):.1f} bytes')
+    print(f'contact with __slots__: {measure(slotted_person, count):.1f} bytes')
+    print(f'note with __dict__: {measure(dict_note, count):.1f} bytes')
+    print(f'note with __slots__: {measure(slotted_note, count):.1f} bytes')
+
+
+if __name__ == '__main__':
+    perform(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,65 @@
+"""
+Measuring normalizing of names by file_sort.
+Compares translate + re.sub per name (as it was done before) with the combined translate table,
+the cached normalize and normalize_many.
+Run from the project folder:
+py -m benchmarks.normalize [number of names, 1000000 by default]
+"""
+
+import random
+import re
+import sys
+import timeit
+
+from tools import sorting
+
+
+def old_normalize(old_name: str) -> str:
+    """
+    Normalizing as it was done before: two passes, the regex is looked up in the cache of re every time
+    """
+    new_name = old_name.translate(sorting.transliteration)
+    new_name = re.sub(r'\W', '_', new_name)
+
+    return new_name
+
+
+def make_names(count: int) -> list:
+    """
+    Names like in a real folder: cyrillic & latin words, spaces, symbols, numbered series
+    """
+    random.seed(count)
+    words = ['Фото', 'photo', 'Документ', 'report', 'Відео', 'IMG', 'скан', 'final (copy)', 'Літо-2021']
+    stems = [f'{random.choice(words)} {random.choice(words)} {number % 500}' for number in range(count // 10 or 1)]
+    return [random.choice(stems) for _ in range(count)]
+
+
+def perform(count: int = 1_000_000) -> None:
+    """
+    Printing seconds and names per second of every way of normalizing
+    """
+    names = make_names(count)
+    assert [old_normalize(name) for name in names[:1000]] == sorting.normalize_many(names[:1000])
+
+    def per_name_old():
+        return [old_normalize(name) for name in names]
+
+    def per_name_table():
+        return [name.translate(sorting.name_table) for name in names]
+
+    def per_name_cached():
+        sorting.normalize.cache_clear()
+        return [sorting.normalize(name) for name in names]
+
+    def batch():
+        return sorting.normalize_many(names)
+
+    print(f'{count} names, {len(set(names))} distinct')
+    for title, function in (('translate + re.sub', per_name_old), ('combined table', per_name_table),
+                            ('cached normalize', per_name_cached), ('normalize_many', batch)):
+        seconds = min(timeit.repeat(function, number=1, repeat=3))
+        print(f'{title}: {seconds:.3f} s, {count / seconds:,.0f} names/s')
+
+
+if __name__ == '__main__':
+    perform(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
@@ -0,0 +1,93 @@
+"""
+Measuring cold start of the address book.
+Every case runs in a new interpreter with -X importtime: the wall time of the process,
+the import time of main and the heavy packages which were imported are printed,
+so an eager import coming back is seen at once. Import times of the heavy packages alone
+are printed for comparison.
+Run from the project folder:
+py -m benchmarks.startup [number of runs, 5 by default]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+HEAVY = ('rich.console', 'dateutil.parser', 'phonenumbers', 'prompt_toolkit', 'numpy', 'asyncio')
+
+CASES = {
+    # cli() up to the first prompt: the book is opened and the prompt of commands is ready
+    'cli() to the first prompt': (
+        "import main\n"
+        "app = main.AddressBook(DATABASE, background=True)\n"
+        "print(app)\n"
+        "main.ui.cmd\n"
+        "app.close()\n"
+    ),
+    # one-shot command like py main.py find ann
+    'one-shot find': (
+        "import main\n"
+        "main.run_commands(['find', 'ann'], DATABASE)\n"
+    ),
+}
+
+
+def run(code: str, database: str) -> tuple:
+    """
+    Running the code in a new interpreter
+    :param code: str
+        the code, DATABASE is the location of the book
+    :param database: str
+    :return: tuple
+        wall seconds, microseconds of importing main, set of imported heavy packages
+    """
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'DATABASE = {database!r}\n{code}'],
+                            capture_output=True, text=True, check=True, stdin=subprocess.DEVNULL)
+    seconds = time.perf_counter() - start
+    main_us, imported = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line.split('|')
+        name = name.strip()
+        if name == 'main':
+            main_us = int(cumulative)
+        if name in HEAVY:
+            imported.add(name)
+    return seconds, main_us, imported
+
+
+def package_time(name: str) -> float:
+    """
+    Milliseconds of importing the package alone
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {name}'],
+                            capture_output=True, text=True)
+    times = [int(line.split('|')[1]) for line in result.stderr.splitlines()
+             if line.startswith('import time:') and line.split('|')[-1].strip() == name]
+    return times[-1] / 1000 if times else float('nan')
+
+
+def perform(runs: int = 5) -> None:
+    """
+    Printing the best wall time and import time of every case
+    """
+    with tempfile.TemporaryDirectory() as folder:
+        database = os.path.join(folder, 'contacts.data')
+        # the first run creates the book and compiles the modules
+        run(CASES['one-shot find'], database)
+        for title, code in CASES.items():
+            results = [run(code, database) for _ in range(runs)]
+            seconds = min(result[0] for result in results)
+            main_ms = min(result[1] for result in results) / 1000
+            imported = ', '.join(sorted(results[0][2])) or 'none'
+            print(f'{title}: {seconds * 1000:.0f} ms, import of main {main_ms:.1f} ms, heavy packages: {imported}')
+    print('import of the heavy packages alone:',
+          ', '.join(f'{name} {package_time(name):.1f} ms' for name in HEAVY))
+
+
+if __name__ == '__main__':
+    perform(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
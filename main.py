@@ -1,177 +1,417 @@
-import pickle
-import os
+import copy
 import re
-from datetime import datetime
-from tools import autocompletion as ui, validator
-from tools import sorting
-from dateutil import parser
-from rich.console import Console
-from rich.table import Table
+import shlex
+import sys
+import threading
+from calendar import monthrange
+from datetime import datetime, timedelta
+from tools.lazy import lazy_import
+from tools.records import MULTI_FIELDS, Note, Person, console
+from tools.storage import SqliteStorage, birthday_dates, birthday_keys, migrate_to_snapshot, open_storage
+
+# heavy packages and the tools which use them are imported by the first command which needs them
+ui = lazy_import('tools.autocompletion')
+validator = lazy_import('tools.validator')
+batch = lazy_import('tools.batch')
+exporter = lazy_import('tools.exporter')
+importer = lazy_import('tools.importer')
+server = lazy_import('tools.server')
+sorting = lazy_import('tools.sorting')
+paging = lazy_import('tools.paging')
+parser = lazy_import('dateutil.parser')
 
 
 CLI_UI = '''
 CMD HELPER: 1.Add 2.View all 3.Search 4.Find 5.Sort 6.Update 7.Delete 8.Reset 9.File sort 10. Help 11.Exit
 '''
 
-console = Console()
+NO_BIRTHDAY = datetime(1900, 1, 1)
 
 
-class Person:
+class AddressBook:
     """
-    A class is used to create fields to address book.
-    ________________________________________________
-
-    Attributes
-    __________
-    name : str
-        name of the contact
-    address : str
-        address of the contact
-    phone : str
-        phone of the contact
-    email : str
-        email of the contact
-    birthday : str
-        birthday of the contact
-
-    Methods
-    _______
-    print_tab
-        used to show info about the contact as a table
-
+    This class maneges elements of address book & diary.
     """
 
-    def __init__(self, name: str = None, address: str = None, phone: str = None, email: str = None, birthday: str = None):
+    def __init__(self, database, journal: bool = True, storage=None, columnar: bool = False,
+                 background: bool = False):
+        """
+        Loading the address book & diary
+        :param database: str
+            location of the database: .db, .sqlite, .sqlite3 - SQLite database, any other - pickle file
+        :param journal: bool
+            if True, every change of the pickle file is appended to the log file '<database>.log'
+            and the pickle file is rewritten only during compaction,
+            otherwise the whole book is rewritten on exit
+        :param storage: Storage
+            storage backend to use instead of the one chosen by the database extension
+        :param columnar: bool
+            if True, contacts of the in-memory storages are also kept as numpy columns,
+            find and sort_birthday run over them as vectorized masks
+        :param background: bool
+            if True, changes are saved by the background thread on a timer or after many changes,
+            so commands never wait for the disk; the last changes are saved by close or on exit
+        """
+        self.database = database
+        # nothing to close if opening fails
+        self.closed = True
+        self.storage = storage or open_storage(database, Person, Note, journal, background)
+        self.closed = False
+        if columnar:
+            self.storage.enable_columns()
+
+    @property
+    def persons(self):
+        return self.storage.persons
+
+    @property
+    def notes(self):
+        return self.storage.notes
+
+    def add_contact(self, name: str, address: str = '', phone: str = '', email: str = '', birthday: str = '',
+                    region: str = None) -> Person:
         """
-        Creating fields of the address book
+        Adding the contact without asking the user, empty fields get defaults
         :param name: str
-            name of the contact
         :param address: str
-            address of the contact
         :param phone: str
-            phone of the contact
         :param email: str
-            email of the contact
         :param birthday: str
-            birthday of the contact
+        :param region: str
+            ISO country code for the phone without +
+        :return: Person
+            added contact
+        :raise ValueError: if fields are invalid, the contact is already present
+            or the phone or the email belongs to another contact
         """
-        self.name = name
-        self.address = address
-        self.phone = phone
-        self.email = email
-        self.birthday = parser.parse(birthday)
+        fields = importer.validate_record(
+            {'name': name, 'address': address, 'phone': phone, 'email': email, 'birthday': birthday}, region)
+        with self.storage.lock:
+            if name in self.persons:
+                raise ValueError("Contact already present")
+            conflict = self.storage.conflict(name, fields['phone'], fields['email'])
+            if conflict:
+                raise ValueError(conflict)
+            person = Person(*(fields[field] for field in importer.FIELDS))
+            self.storage.put_person(name, person)
+        return person
 
-    def __getitem__(self, i):
-        return self.__dict__[i]
-
-    def __str__(self):
+    def update_contact(self, name: str, address: str = '', phone: str = '', email: str = '', birthday: str = '',
+                       region: str = None) -> Person:
         """
-        Returning all data of the contact as a string
-        :return: str
+        Changing fields of the contact without asking the user, empty fields are kept
+        :param name: str
+        :param address: str
+        :param phone: str
+        :param email: str
+        :param birthday: str
+        :param region: str
+            ISO country code for the phone without +
+        :return: Person
+            changed contact
+        :raise KeyError: if the contact isn't found
+        :raise ValueError: if fields are invalid or the phone or the email belongs to another contact
         """
-        return f"{self.name}, {self.address}, {self.phone}, {self.email}, {self.birthday.date()}"
+        if phone:
+            phone = validator.validate_phone(phone, region)
+        if email:
+            validator.validate_email(email)
+        if birthday:
+            try:
+                birthday = parser.parse(birthday).date().isoformat()
+            except (ValueError, OverflowError) as error:
+                raise ValueError(f"Invalid birthday: {birthday!r}") from error
+        with self.storage.lock:
+            changes = self.field_changes(self.persons[name], address, phone, email, birthday)
+            conflict = self.storage.conflict(name, phone, email)
+            if conflict:
+                raise ValueError(conflict)
+            self.storage.patch_person(name, changes)
+            return self.persons[name]
 
-    def print_tab(self):
+    @staticmethod
+    def field_changes(person: Person, address: str = '', phone: str = '', email: str = '',
+                      birthday: str = '') -> dict:
         """
-        Printing data of the contact as a formatted table
-        :return: None
+        Changes of the contact by new values: the new address, phone or email becomes the main one,
+        other values of the field are kept; empty values are not changed
+        :param person: Person
+        :param address: str
+        :param phone: str
+            validated phone
+        :param email: str
+            validated email
+        :param birthday: str
+            validated birthday in ISO format
+        :return: dict
+            field -> new value like Person.get_value returns it
         """
-        table = Table(show_header=False,
-                      header_style="bold blue", show_lines=True)
-        table.add_row(
-            f'[cyan]{self.name}[/cyan]', f'[cyan]{self.address}[/cyan]', f'[cyan]{self.phone}[/cyan]',
-            f'[cyan]{self.email}[/cyan]', f'[cyan]{self.birthday.date()}[/cyan]'
-        )
-        console.print(table)
-
+        changes = {}
+        for field, value in (('address', address), ('phone', phone), ('email', email)):
+            if value:
+                changes[field] = (value,) + person.values(field)[1:]
+        if birthday:
+            changes['birthday'] = birthday
+        return changes
 
-class Note:
-    """
-    A class is used to create fields to diary.
-    ________________________________________________
-
-    Attributes
-    __________
-    value : str
-        text of the note
-    keyWords : list
-        a keywords list of the note
-    date : datetime
-        date of note creating
-
-    Methods
-    _______
-    print_in_table
-        used to show info about the note as a table
+    def add_contact_value(self, name: str, field: str, value: str, region: str = None) -> Person:
+        """
+        Adding one more address, phone or email to the contact without asking the user
+        :param name: str
+        :param field: str
+            'address', 'phone' or 'email'
+        :param value: str
+        :param region: str
+            ISO country code for the phone without +
+        :return: Person
+            changed contact
+        :raise KeyError: if the contact isn't found
+        :raise ValueError: if the value is invalid or belongs to another contact
+        """
+        if field not in MULTI_FIELDS:
+            raise ValueError(f"Field must be one of {', '.join(MULTI_FIELDS)}")
+        value = value.strip()
+        if not value:
+            raise ValueError(f"{field.capitalize()} is required")
+        if field == 'phone':
+            value = validator.validate_phone(value, region)
+        elif field == 'email':
+            validator.validate_email(value)
+        with self.storage.lock:
+            person = self.persons[name]
+            if field != 'address':
+                conflict = self.storage.conflict(name, **{field: value})
+                if conflict:
+                    raise ValueError(conflict)
+            self.storage.patch_person(name, {field: person.values(field) + (value,)})
+            return self.persons[name]
 
-    """
-    def __init__(self, value: str, keyWords: list) -> None:
+    def remove_contact_value(self, name: str, field: str, value: str, region: str = None) -> Person:
         """
-        Creating fields of the diary
+        Removing the address, the phone or the email of the contact without asking the user,
+        the next value becomes the main one
+        :param name: str
+        :param field: str
+            'address', 'phone' or 'email'
         :param value: str
-            text of the note
-        :param keyWords: list
-            a keywords list of the note
+            phones are compared in E.164 format, other values case insensitive
+        :param region: str
+            ISO country code for the phone without +
+        :return: Person
+            changed contact
+        :raise KeyError: if the contact or the value isn't found
         """
-        self.date = datetime.now().isoformat()
-        self.value = value
-        self.keyWords = keyWords
+        if field not in MULTI_FIELDS:
+            raise ValueError(f"Field must be one of {', '.join(MULTI_FIELDS)}")
+        value = value.strip()
+        if field == 'phone':
+            value = validator.parse_phone(value, region) or value
+        with self.storage.lock:
+            values = self.persons[name].values(field)
+            kept = tuple(item for item in values if item.lower() != value.lower())
+            if kept == values:
+                raise KeyError(value)
+            self.storage.patch_person(name, {field: kept})
+            return self.persons[name]
 
-    def get_keywords(self):
+    def contact_history(self, name: str, at: str = None):
         """
-        Joining all tags of the note in string
-        :return: str
-            string of keywords
+        Changes of the contact or its fields at the moment in the past
+        :param name: str
+        :param at: str
+            date and time, e.g. 2024-05-01 or 2024-05-01 18:30
+        :return: list or dict
+            changes from the oldest one: dicts of the date, the field, old and new values;
+            fields at the moment if it's given
+        :raise KeyError: if the contact isn't found
+        :raise ValueError: if the moment is invalid
         """
-        return ", ".join(self.keyWords)
+        person = self.persons[name]
+        if at:
+            try:
+                moment = parser.parse(at).timestamp()
+            except (ValueError, OverflowError) as error:
+                raise ValueError(f"Invalid date: {at!r}") from error
+            return {field: person.value_at(field, moment) for field in ('name',) + MULTI_FIELDS + ('birthday',)}
+        changes, newer = [], {}
+        for when, field, old in reversed(person.history or ()):
+            new = newer.get(field, person.get_value(field))
+            newer[field] = old
+            changes.append({'date': datetime.fromtimestamp(when).isoformat(sep=' '),
+                            'field': field, 'old': old, 'new': new})
+        changes.reverse()
+        return changes
 
-    def print_in_table(self):
+    def delete_contact(self, name: str) -> None:
         """
-        Printing notes as a formatted table
+        Deleting the contact without asking the user
+        :param name: str
         :return: None
+        :raise KeyError: if the contact isn't found
         """
-        table = Table(show_header=False,
-                      header_style="bold blue", show_lines=True)
-        table.add_row(
-            f'[cyan]{datetime.fromisoformat(self.date).strftime("%m/%d/%Y, %H:%M:%S")}[/cyan]', f'[cyan]{self.value}[/cyan]')
-        console.print(table)
+        with self.storage.lock:
+            if name not in self.persons:
+                raise KeyError(name)
+            self.storage.pop_person(name)
 
-    def __str__(self):
-        return "{:<25} {}".format(datetime.fromisoformat(self.date).strftime("%m/%d/%Y, %H:%M:%S"), self.value)
+    def add_note_text(self, text: str) -> Note:
+        """
+        Adding the note without asking the user, keywords are enclosed in the text by symbol #
+        :param text: str
+        :return: Note
+            added note
+        """
+        note = Note(*self.parse_note(text))
+        self.storage.put_note(note.date, note)
+        return note
 
+    def delete_notes_with_keyword(self, keyword: str) -> list:
+        """
+        Deleting notes by keyword without asking the user
+        :param keyword: str
+        :return: list
+            deleted notes
+        """
+        with self.storage.lock:
+            found = self.storage.notes_with_keyword(keyword)
+            for key, _ in found:
+                self.storage.pop_note(key)
+        return [note for _, note in found]
 
-class AddressBook:
-    """
-    This class maneges elements of address book & diary.
-    """
+    def find_by_phone(self, phone: str, region: str = None) -> list:
+        """
+        Finding contacts by the phone through the hash index, the phone is turned into E.164 format first
+        :param phone: str
+        :param region: str
+            ISO country code for the phone without +
+        :return: list
+            (name, contact) tuples
+        """
+        return self.storage.persons_by('phone', validator.parse_phone(phone, region) or phone)
 
-    def __init__(self, database):
-        self.database = database
-        self.persons = {}
-        self.notes = {}
-        if not os.path.exists(self.database):
-            file_pointer = open(self.database, 'wb')
-            pickle.dump({}, file_pointer)
-            file_pointer.close()
-        else:
-            with open(self.database, 'rb') as Application:
-                dict_application = pickle.load(Application)
-                self.persons = dict_application.get("persons", self.persons)
-                self.notes = dict_application.get("notes", self.notes)
+    def find_by_email(self, email: str) -> list:
+        """
+        Finding contacts by the email through the hash index, case insensitive
+        :param email: str
+        :return: list
+            (name, contact) tuples
+        """
+        return self.storage.persons_by('email', email)
+
+    @staticmethod
+    def merged_person(persons: list) -> Person:
+        """
+        Joining the same contacts: addresses, phones and emails of all contacts are kept,
+        the main ones and the birthday are taken from the first contact which has them
+        :param persons: list
+            contacts, the first one is the main, its history is kept
+        :return: Person
+        """
+        birthdays = [person.birthday.date() for person in persons if person.birthday != NO_BIRTHDAY]
+        person = Person(persons[0].name, "NULL", "NULL", "NULL", str(birthdays[0] if birthdays else NO_BIRTHDAY.date()))
+        for field in MULTI_FIELDS:
+            values = {}
+            for other in persons:
+                for value in other.values(field):
+                    values.setdefault(value.lower(), value)
+            person.set_value(field, values.values())
+        person.history = persons[0].history
+        return person
+
+    def duplicates_report(self) -> list:
+        """
+        Finding contacts which share a phone or an email and proposing their merging
+        :return: list
+            dicts: names of the group, shared phones and emails, merged fields
+        """
+        report = []
+        for names in self.storage.duplicate_groups():
+            persons = [self.persons[name] for name in names]
+            shared = {}
+            for field in ('phone', 'email'):
+                values = [str(person[field]).lower() for person in persons if person[field] not in (None, '', "NULL")]
+                shared[field] = sorted({value for value in values if values.count(value) > 1})
+            merged = exporter.contact_json(self.merged_person(persons))
+            report.append({'names': names, 'phones': shared['phone'], 'emails': shared['email'], 'merged': merged})
+        return report
+
+    def merge_contacts(self, names: list) -> Person:
+        """
+        Merging contacts into the first one, other contacts are deleted
+        :param names: list
+            names of the same contact, the first one is kept
+        :return: Person
+            merged contact
+        :raise KeyError: if a contact isn't found
+        :raise ValueError: if less than two names are given
+        """
+        names = list(dict.fromkeys(names))
+        if len(names) < 2:
+            raise ValueError("Two or more names are needed")
+        with self.storage.lock, self.storage.transaction():
+            person = self.merged_person([self.persons[name] for name in names])
+            for name in names[1:]:
+                self.storage.pop_person(name)
+            self.storage.put_person(names[0], person)
+        return person
+
+    def import_file(self, path: str, region: str = None) -> tuple:
+        """
+        Importing contacts from CSV, vCard or JSONL file without asking the user
+        :param path: str
+        :param region: str
+            ISO country code for phones without +
+        :return: tuple
+            numbers of imported and rejected records
+        :raise OSError: if the file can't be read
+        :raise ValueError: if the format is unknown
+        """
+        return importer.import_file(path, self.storage, Person, region)
 
     def add(self):
         """
         Adding record to the address book with fields: name, address, phone, email, birthday
         """
-        name, _address, _phone, _email, _birthday = self.get_details()
-        address = _address or "NULL"
-        phone = _phone or "NULL"
-        email = _email or "NULL"
-        birthday = _birthday or "1900-01-01"
-        if name not in self.persons:
-            self.persons[name] = Person(name, address, phone, email, birthday)
-        else:
-            print("Contact already present")
+        name, address, phone, email, birthday = self.get_details()
+        try:
+            self.add_contact(name, address, phone, email, birthday)
+        except ValueError as error:
+            print(error)
+
+    def import_contacts(self):
+        """
+        Importing contacts from CSV (header: name, address, phone, email, birthday[, region]), vCard or JSONL file.
+        Rejected records are written to the file '<file>.rejects.jsonl' with reasons
+        """
+        path = input("File to import [.csv, .vcf, .jsonl]: ")
+        region = input("ISO country code for phones without + like UA, GB, PL etc.: ").upper()
+        try:
+            imported, rejected = self.import_file(path, region or None)
+        except (OSError, ValueError) as error:
+            print(error)
+            return
+        print(f"Imported {imported} contacts, rejected {rejected}")
+        if rejected:
+            print(f"Rejected records are written to {path}.rejects.jsonl")
+
+    def export(self):
+        """
+        Exporting contacts to CSV, JSONL or vCard file, notes to CSV or JSONL file.
+        Fields can be selected, records can be filtered like in find / search_notes
+        """
+        what = input("What to export [contacts/notes]: ").strip().lower() or "contacts"
+        path = input("File to export [.csv, .jsonl, .vcf]: ")
+        fields = input("Fields separated by comma, empty for all: ").split(',')
+        query = input("Filter like in find / search_notes, empty for all: ")
+        try:
+            if what == "notes":
+                count = exporter.export_notes(self.storage, path, fields, query)
+            else:
+                count = exporter.export_contacts(self.storage, path, fields, query)
+        except (OSError, ValueError) as error:
+            print(error)
+            return
+        print(f"Exported {count} {what} to {path}")
 
     def add_note(self):
         """
@@ -180,34 +420,27 @@ class AddressBook:
         """
         value, keyWords = self.get_note()
         note = Note(value, keyWords)
-        self.notes[note.date] = note
+        self.storage.put_note(note.date, note)
 
     def view_all(self):
         """
-        Printing whole address book as a formatted table
+        Printing whole address book as a formatted table page by page
         """
         if self.persons:
-            table = Table(show_header=True,
-                          header_style="bold blue", show_lines=True)
-            table.add_column("#", style="dim", width=3, justify="center")
-            table.add_column("NAME", min_width=12, justify="center")
-            table.add_column("ADDRESS", min_width=10, justify="center")
-            table.add_column("PHONE", min_width=18, justify="center")
-            table.add_column("EMAIL", min_width=18, justify="center")
-            table.add_column("BIRTHDAY", min_width=15, justify="center")
-            for idx, person in enumerate(self.persons.values(), start=1):
-                _ = person.__dict__
-                table.add_row(
-                    str(idx), f'[cyan]{_["name"]}[/cyan]', f'[cyan]{_["address"]}[/cyan]', f'[cyan]{_["phone"]}[/cyan]',
-                    f'[cyan]{_["email"]}[/cyan]', f'[cyan]{_["birthday"].date()}[/cyan]'
-                )
-            console.print(table)
+            # all addresses, phones and emails of the contact are shown in the cell line by line
+            rows = (
+                (str(idx), str(_["name"]), *('\n'.join(_.values(field)) or "NULL" for field in MULTI_FIELDS),
+                 str(_["birthday"].date()))
+                for idx, _ in enumerate(self.persons.values(), start=1)
+            )
+            columns = [("#", 3), ("NAME", 12), ("ADDRESS", 10), ("PHONE", 18), ("EMAIL", 18), ("BIRTHDAY", 15)]
+            paging.Pager(columns, rows, console=console()).show()
         else:
             print("No match contacts in database")
 
     def view_all_notes(self):
         """
-        Printing all notes as a formatted table
+        Printing all notes as a formatted table page by page
         """
         if self.notes:
             self.print_notes_in_table(self.notes.values(), "#")
@@ -218,26 +451,65 @@ class AddressBook:
         """
         Searching record in address book by name and printing found record as a formatted table
         """
-        name = input("Enter the name: ")
+        name = ui.ask("Enter the name: ", self.storage.complete_names)
         if name in self.persons:
             self.persons[name].print_tab()
         else:
+            self.not_found(name)
+
+    def by_phone(self):
+        """
+        Searching contacts by phone in any format and printing found contacts as a formatted table
+        """
+        phone = input("Enter the phone: ").strip()
+        region = "" if phone.startswith("+") else input("ISO country code like UA, GB, PL etc.: ").upper()
+        found = self.find_by_phone(phone, region or None)
+        for _, person in found:
+            person.print_tab()
+        if not found:
             print("Contact not found")
 
-    def search_notes(self):
+    def by_email(self):
         """
-        Searching note by text or keyword and printing found notes as a formatted table
+        Searching contacts by email and printing found contacts as a formatted table
         """
-        keyword = input("What are you looking for?: ")
-        note_list_keyword = []
-        note_list = []
-        for note in self.notes.values():
-            keywords = note.get_keywords()
-            if keyword in keywords:
-                note_list_keyword.append(note)
+        found = self.find_by_email(input("Enter the email: ").strip())
+        for _, person in found:
+            person.print_tab()
+        if not found:
+            print("Contact not found")
 
-            if not note in note_list_keyword and keyword in str(note):
-                note_list.append(note)
+    def duplicates(self):
+        """
+        Finding contacts which share a phone or an email.
+        Every group is printed with the merged contact, the group can be merged into the first contact
+        """
+        report = self.duplicates_report()
+        if not report:
+            print("No duplicates in database")
+        for group in report:
+            print(f"{', '.join(group['names'])} share {', '.join(group['phones'] + group['emails'])}")
+            self.merged_person([self.persons[name] for name in group['names']]).print_tab()
+            if input("Merge them? [y/N]: ").strip().lower() == "y":
+                self.merge_contacts(group['names'])
+                print("Merged")
+
+    def not_found(self, name: str):
+        """
+        Printing that the contact isn't found with similar names
+        :param name: str
+        :return: None
+        """
+        similar = self.storage.complete_names(name, 5) if name else []
+        print(f"Contact not found{', did you mean: ' + ', '.join(similar) if similar else ''}")
+
+    def search_notes(self):
+        """
+        Searching note by keyword, beginning of keyword or phrase of the text
+        and printing found notes as a formatted table
+        """
+        keyword = ui.ask("What are you looking for?: ", self.storage.complete_tags)
+        note_list_keyword, note_list = self.storage.search_notes(keyword)
 
         if note_list_keyword or note_list:
             if note_list_keyword:
@@ -256,10 +528,9 @@ class AddressBook:
         count = 0
         obj = input('What do you want to find? ')
 
-        for contact in self.persons.values():
-            if obj.lower() in str(contact).lower():
-                count += 1
-                contact.print_tab()
+        for contact in self.storage.find_persons(obj):
+            count += 1
+            contact.print_tab()
 
         if count == 0:
             print('No matches found')
@@ -288,44 +559,129 @@ class AddressBook:
             1st element: note
             2nd element: list of the keywords
         """
-        userInput = input("Note (keywords as #words#): ")
-        keywords = re.findall(r"\#.+\#", userInput)
-        value = userInput.strip()
-        return value, [keyword.replace("#", "").strip() for keyword in keywords]
+        return AddressBook.parse_note(input("Note (keywords as #words#): "))
+
+    @staticmethod
+    def parse_note(text: str) -> tuple:
+        """
+        Splitting the text of the note into the note and keywords
+        :param text: str
+        :return: tuple
+            1st element: note
+            2nd element: list of the keywords
+        """
+        keywords = re.findall(r"\#.+\#", text)
+        return text.strip(), [keyword.replace("#", "").strip() for keyword in keywords]
 
     def update(self):
         """
         Updating record in address book. You can change one field or all ones immediately
         """
-        dict_name = input("Enter the name: ")
+        dict_name = ui.ask("Enter the name: ", self.storage.complete_names)
         if dict_name in self.persons:
             print("Found. Enter new details and keep empty fields if no any changes")
             _name, _address, _phone, _email, _birthday = self.get_details()
-            name = _name or self.persons[dict_name]["name"]
-            address = _address or self.persons[dict_name]["address"]
-            phone = _phone or self.persons[dict_name]["phone"]
-            email = _email or self.persons[dict_name]["email"]
-            birthday = _birthday or str(self.persons[dict_name]["birthday"])
-            self.persons[dict_name].__init__(
-                name, address, phone, email, birthday)
+            conflict = self.storage.conflict(dict_name, _phone, _email)
+            if conflict:
+                print(conflict)
+                return
+            if _birthday:
+                # only the typed birthday is parsed, the kept one isn't parsed again
+                try:
+                    _birthday = parser.parse(_birthday).date().isoformat()
+                except (ValueError, OverflowError):
+                    print(f"Invalid birthday: {_birthday}")
+                    return
+            changes = self.field_changes(self.persons[dict_name], _address, _phone, _email, _birthday)
+            if _name:
+                changes['name'] = _name
+            self.storage.patch_person(dict_name, changes)
             print("Address book successfully updated")
         else:
-            print("Contact not found")
+            self.not_found(dict_name)
+
+    def add_value(self):
+        """
+        Adding one more address, phone or email to the contact, the main one is kept
+        """
+        name = ui.ask("Enter the name: ", self.storage.complete_names)
+        if name not in self.persons:
+            self.not_found(name)
+            return
+        field = input("What to add [address/phone/email]: ").strip().lower()
+        if field == "phone":
+            value = validator.phone_check() or ''
+        elif field == "email":
+            value = validator.email_check() or ''
+        else:
+            value = input(f"New {field}: ")
+        try:
+            self.add_contact_value(name, field, value)
+        except ValueError as error:
+            print(error)
+            return
+        self.persons[name].print_tab()
+
+    def remove_value(self):
+        """
+        Removing the address, the phone or the email of the contact, the next one becomes the main one
+        """
+        name = ui.ask("Enter the name: ", self.storage.complete_names)
+        if name not in self.persons:
+            self.not_found(name)
+            return
+        field = input("What to remove [address/phone/email]: ").strip().lower()
+        try:
+            self.remove_contact_value(name, field, input(f"The {field} to remove: "))
+        except ValueError as error:
+            print(error)
+            return
+        except KeyError as error:
+            print(f"Not found: {error.args[0]}")
+            return
+        self.persons[name].print_tab()
+
+    def history(self):
+        """
+        Printing changes of the contact, or its fields at the moment in the past
+        """
+        name = ui.ask("Enter the name: ", self.storage.complete_names)
+        if name not in self.persons:
+            self.not_found(name)
+            return
+        at = input("At the moment [yyyy-mm-dd hh:mm, empty for all changes]: ").strip()
+        try:
+            history = self.contact_history(name, at)
+        except ValueError as error:
+            print(error)
+            return
+        if at:
+            for field, value in history.items():
+                print(f"{field}: {', '.join(value) or 'NULL' if isinstance(value, tuple) else value}")
+            return
+        for change in history:
+            old, new = (', '.join(value) or "NULL" if isinstance(value, tuple) else value
+                        for value in (change['old'], change['new']))
+            print(f"{change['date']} {change['field']}: {old} -> {new}")
+        if not history:
+            print("No changes")
 
     def update_notes(self):
         """
         Amending notes and keywords by searching keyword
         """
-        keyword = input("Enter the key word to note: ")
+        keyword = ui.ask("Enter the key word to note: ", self.storage.complete_tags)
         noteskeyToUpdate = []
-        for noteKey in self.notes:
-            if keyword in self.notes[noteKey].keyWords:
-                self.notes[noteKey].print_in_table()
-                print("Will be changed")
-                value, keyWords = self.get_note()
-                self.notes[noteKey].keyWords = keyWords
-                self.notes[noteKey].value = value
-                noteskeyToUpdate.append(noteKey)
+        for noteKey, note in self.storage.notes_with_keyword(keyword):
+            note.print_in_table()
+            print("Will be changed")
+            value, keyWords = self.get_note()
+            # the note may be written by the background saver right now, the copy is changed
+            note = copy.copy(note)
+            note.keyWords = keyWords
+            note.value = value
+            self.storage.put_note(noteKey, note)
+            noteskeyToUpdate.append(noteKey)
 
         if not noteskeyToUpdate:
             print(f"no notes with key word {keyword}")
@@ -334,28 +690,27 @@ class AddressBook:
         """
         Deleting record in address book by name
         """
-        name = input("Enter the name to delete: ")
+        name = ui.ask("Enter the name to delete: ", self.storage.complete_names)
         if name in self.persons:
-            del self.persons[name]
+            self.storage.pop_person(name)
             print("Deleted the contact")
         else:
-            print("Contact not found in the app")
+            self.not_found(name)
 
     def delete_notes(self):
         """
         Deleting notes by keyword
         """
-        keyword = input("Enter the key word to note: ")
+        keyword = ui.ask("Enter the key word to note: ", self.storage.complete_tags)
         noteskeyToDel = []
-        for noteKey in self.notes:
-            if keyword in self.notes[noteKey].keyWords:
-                self.notes[noteKey].print_in_table()
-                print("Was deleted")
-                noteskeyToDel.append(noteKey)
+        for noteKey, note in self.storage.notes_with_keyword(keyword):
+            note.print_in_table()
+            print("Was deleted")
+            noteskeyToDel.append(noteKey)
 
         if noteskeyToDel:
             for notekey in noteskeyToDel:
-                self.notes.pop(notekey)
+                self.storage.pop_note(notekey)
         else:
             print(f"no notes with key word {keyword}")
 
@@ -363,24 +718,45 @@ class AddressBook:
         """
         Deleting all records in address book
         """
-        self.persons = {}
+        self.storage.clear_persons()
 
     def reset_notes(self):
         """
         Deleting all notes in diary
         """
-        self.notes = {}
+        self.storage.clear_notes()
 
     def get_birthdays(self):
         """
-        Printing contacts which have birthday in defined period
+        Printing contacts which have birthday in defined period.
+        Enter number of days, or 'week' / 'month' to get reminders for every day of the next week / month
+        """
+        period = input("Enter timedelta for birthday: ").strip().lower()
+        if period in ('week', 'month'):
+            return self.print_birthday_calendar(period)
+        result = self.birthdays(int(period))
+        for day, names in result.items():
+            print(f"Start reminder on {day}: {', '.join(names)}")
+        return result
+
+    def birthdays(self, gap_days: int, current_date: datetime = None) -> dict:
+        """
+        Collecting contacts which have birthday in the next days without asking the user.
+        Birthdays on the weekend are reminded on Monday
+        :param gap_days: int
+            number of days
+        :param current_date: datetime
+            now by default
+        :return: dict
+            day of the week -> list of names
         """
-        gap_days = int(input("Enter timedelta for birthday: "))
-        current_date = datetime.now()
+        current_date = current_date or datetime.now()
         result = {}
 
-        for name in self.persons:
-            bday = self.persons[name]["birthday"]
+        # Weekend birthdays are reminded on Monday, so the period starts 3 days earlier
+        keys = birthday_keys(current_date - timedelta(days=3), gap_days + 4)
+        for name, person in self.storage.birthday_persons(keys):
+            bday = person["birthday"]
             try:
                 mappedbday = bday.replace(year=current_date.year)
             except ValueError:
@@ -398,9 +774,54 @@ class AddressBook:
                         result[current_date.strftime('%A')].append(name)
                     except KeyError:
                         result[current_date.strftime('%A')] = [name]
+        return result
 
+    def birthday_calendar(self, start: datetime, days: int) -> dict:
+        """
+        Collecting contacts which have birthday on every day of the period in a single pass
+        :param start: datetime
+            first day of the period
+        :param days: int
+            length of the period
+        :return: dict
+            date -> list of names, sorted by date
+        """
+        dates = birthday_dates(start, days)
+        result = {}
+        for name, person in self.storage.birthday_persons(set(dates)):
+            birthday = person["birthday"]
+            result.setdefault(dates[(birthday.month, birthday.day)], []).append(name)
+        return dict(sorted(result.items()))
+
+    @staticmethod
+    def period_days(period: str, today: datetime) -> int:
+        """
+        Number of days of the next week or month
+        :param period: str
+            'week' or 'month'
+        :param today: datetime
+        :return: int
+        """
+        if period == 'week':
+            return 7
+        next_month = today.replace(day=1) + timedelta(days=32)
+        return (next_month.replace(day=min(today.day, monthrange(next_month.year, next_month.month)[1]))
+                - today).days
+
+    def print_birthday_calendar(self, period: str) -> dict:
+        """
+        Printing reminders for every day of the next week or month
+        :param period: str
+            'week' or 'month'
+        :return: dict
+            date -> list of names
+        """
+        today = datetime.now()
+        result = self.birthday_calendar(today, self.period_days(period, today))
         for day, names in result.items():
-            print(f"Start reminder on {day}: {', '.join(names)}")
+            print(f"Reminder on {day} ({day.strftime('%A')}): {', '.join(names)}")
+        if not result:
+            print("No birthdays in this period")
         return result
 
     @classmethod
@@ -410,6 +831,8 @@ class AddressBook:
         You can use next functions:
         """
         functions = {'add': cls.add,
+                     'import': cls.import_contacts,
+                     'export': cls.export,
                      'add_note': cls.add_note,
                      'view_all': cls.view_all,
                      'view_all_notes': cls.view_all_notes,
@@ -418,56 +841,69 @@ class AddressBook:
                      'find': cls.find,
                      'update': cls.update,
                      'update_notes': cls.update_notes,
+                     'add_value': cls.add_value,
+                     'remove_value': cls.remove_value,
+                     'history': cls.history,
                      'delete': cls.delete,
                      'delete_notes': cls.delete_notes,
                      'reset': cls.reset,
                      'reset_notes': cls.reset_notes,
                      'sort_birthday': cls.get_birthdays,
+                     'by_phone': cls.by_phone,
+                     'by_email': cls.by_email,
+                     'duplicates': cls.duplicates,
                      'file_sort': sorting.perform
                      }
         for name, function in functions.items():
             print(name)
             print(f'\t{function.__doc__}')
 
+    def close(self):
+        """
+        Saving the last changes and closing the storage
+        """
+        if not self.closed:
+            self.closed = True
+            self.storage.close()
+
     def __del__(self):
-        with open(self.database, 'wb') as db:
-            pickle.dump({"persons": self.persons, "notes": self.notes}, db)
+        self.close()
 
     @staticmethod
     def print_notes_in_table(notes: list, table_name: str):
         """
-        Printing notes as a formatted table
-        :param notes: list
-            list of the selected notes
+        Printing notes as a formatted table page by page
+        :param notes: iterable
+            the selected notes
         :param table_name: str
             name of the formatted table
         :return: None
         """
-
-        table = Table(show_header=True,
-                      header_style="bold blue", show_lines=True)
-        table.add_column(table_name, style="dim",
-                         width=5, justify="center")
-        table.add_column("DATE", min_width=12, justify="center")
-        table.add_column("VALUE", min_width=50, justify="center")
-
-        for idx, note in enumerate(notes, start=1):
-            table.add_row(str(
-                idx), f'[cyan]{datetime.fromisoformat(note.date).strftime("%m/%d/%Y, %H:%M:%S")}[/cyan]', f'[cyan]{note.value}[/cyan]')
-
-        console.print(table)
+        rows = (
+            (str(idx), note.created.strftime("%m/%d/%Y, %H:%M:%S"), note.value)
+            for idx, note in enumerate(notes, start=1)
+        )
+        paging.Pager([(table_name, 5), ("DATE", 12), ("VALUE", 50)], rows, console=console()).show()
 
     def __str__(self):
         return CLI_UI
 
 
-def cli():
+def cli(database: str = 'contacts.data', columnar: bool = False):
     """
     Comparing inputted command with existing ones
     and performing correspondent command
+    :param database: str
+        location of the book, --database= of the command line
+    :param columnar: bool
+        if True, contacts are also kept as numpy columns, --columnar of the command line
     :return: None
     """
-    app = AddressBook('contacts.data')
+    app = AddressBook(database, columnar=columnar, background=True)
+    if not isinstance(app.storage, SqliteStorage):
+        # the index of names is built in the background, so the first completion of a name doesn't wait for it;
+        # SQLite completes names by the index in the database and needs no warming up
+        threading.Thread(target=app.storage.complete_names, args=('',), daemon=True).start()
     choice = ''
     while choice != 'exit':
         print(app)
@@ -476,6 +912,12 @@ def cli():
             case 'add':
                 print(app.add.__doc__)
                 app.add()
+            case 'import':
+                print(app.import_contacts.__doc__)
+                app.import_contacts()
+            case 'export':
+                print(app.export.__doc__)
+                app.export()
             case 'add_notes':
                 print(app.add_note.__doc__)
                 app.add_note()
@@ -500,6 +942,15 @@ def cli():
             case 'update_notes':
                 print(app.update_notes.__doc__)
                 app.update_notes()
+            case 'add_value':
+                print(app.add_value.__doc__)
+                app.add_value()
+            case 'remove_value':
+                print(app.remove_value.__doc__)
+                app.remove_value()
+            case 'history':
+                print(app.history.__doc__)
+                app.history()
             case 'delete':
                 print(app.delete.__doc__)
                 app.delete()
@@ -515,6 +966,15 @@ def cli():
             case 'file_sort':
                 print(sorting.perform.__doc__)
                 sorting.perform()
+            case 'by_phone':
+                print(app.by_phone.__doc__)
+                app.by_phone()
+            case 'by_email':
+                print(app.by_email.__doc__)
+                app.by_email()
+            case 'duplicates':
+                print(app.duplicates.__doc__)
+                app.duplicates()
             case 'sort_birthday':
                 print(app.get_birthdays.__doc__)
                 app.get_birthdays()
@@ -525,7 +985,74 @@ def cli():
                 print("Exiting...")
             case _:
                 print("Invalid choice")
+    app.close()
+
+
+def serve(port: int = None, database: str = 'contacts.data', columnar: bool = False):
+    """
+    Serving the address book as HTTP/JSON API on localhost, changes are saved in batches
+    :param port: int
+        server.PORT by default
+    :param database: str
+    :param columnar: bool
+    :return: None
+    """
+    app = AddressBook(database, columnar=columnar, background=True)
+    try:
+        server.serve(app, port=port or server.PORT)
+    finally:
+        app.close()
+
+
+def run_commands(args: list, database: str = 'contacts.data', columnar: bool = False) -> int:
+    """
+    Running the command given by arguments (py main.py search Bob), or commands of the file or stdin
+    line by line (py main.py batch [file]) against the book loaded once.
+    Results are printed as JSON lines, changes are saved once at the end
+    :param args: list
+        the command and its arguments, or 'batch' and the file, stdin for '-' or by default
+    :param database: str
+    :param columnar: bool
+    :return: int
+        exit status: 0 if all commands succeeded, 1 otherwise, 2 if the file can't be read
+    """
+    if args[0] == 'batch' and args[1:2] not in ([], ['-']):
+        try:
+            lines = open(args[1], encoding='utf-8')
+        except OSError as error:
+            print(error, file=sys.stderr)
+            return 2
+    elif args[0] == 'batch':
+        lines = sys.stdin
+    else:
+        lines = [shlex.join(args)]
+    app = AddressBook(database, columnar=columnar)
+    try:
+        failed = batch.run_batch(app, lines)
+    finally:
+        app.close()
+        if lines is not sys.stdin and hasattr(lines, 'close'):
+            lines.close()
+    return 1 if failed else 0
 
 
 if __name__ == '__main__':
-    cli()
+    arguments = sys.argv[1:]
+    database = 'contacts.data'
+    columnar = False
+    while arguments[:1] and arguments[0].startswith('--'):
+        option = arguments.pop(0)
+        if option.startswith('--database='):
+            database = option.partition('=')[2]
+        elif option == '--columnar':
+            columnar = True
+        else:
+            sys.exit(f"Unknown option {option}, use --database=FILE or --columnar")
+    if arguments[:1] == ['migrate']:
+        migrate_to_snapshot(arguments[1] if len(arguments) > 1 else database)
+    elif arguments[:1] == ['serve']:
+        serve(int(arguments[1]) if len(arguments) > 1 else None, *(arguments[2:3] or [database]), columnar=columnar)
+    elif arguments[:1] == ['batch'] or arguments[:1] and arguments[0].lower() in batch.COMMANDS:
+        sys.exit(run_commands(arguments, database, columnar))
+    else:
+        cli(database, columnar)
@@ -0,0 +1,101 @@
+"""
+Duplicate files: only files with the same content are duplicates, the first of them is the original,
+hashes are cached between runs and sorting looks for duplicates only on request.
+Run from the project folder:
+py -m pytest tests
+"""
+
+import os
+
+import pytest
+
+from tools.dedup import BLOCK_SIZE, CACHE_NAME, HashCache, find_duplicates
+from tools.sorting import sort_folder
+
+
+def write(path, content: bytes) -> str:
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_files_with_the_same_content_are_found(tmp_path):
+    large = os.urandom(BLOCK_SIZE * 2)
+    paths = [
+        write(tmp_path / 'a.txt', b'same'),
+        write(tmp_path / 'b.txt', b'same'),
+        write(tmp_path / 'c.txt', b'else'),
+        write(tmp_path / 'd.txt', b'same '),
+        write(tmp_path / 'big.bin', large),
+        # the same size and the same first block, the end is different
+        write(tmp_path / 'tail.bin', large[:-1] + bytes([large[-1] ^ 1])),
+        write(tmp_path / 'copy.bin', large),
+        str(tmp_path / 'gone.txt'),
+    ]
+    os.link(tmp_path / 'a.txt', tmp_path / 'link.txt')
+    paths.append(str(tmp_path / 'link.txt'))
+
+    # hard links of the original aren't duplicates, nothing is freed by linking them
+    assert find_duplicates(paths, workers=2) == {paths[1]: paths[0], paths[6]: paths[4]}
+    assert find_duplicates(paths[::-1], workers=2) == {paths[1]: paths[-1], paths[4]: paths[6]}
+    assert find_duplicates([]) == {}
+
+
+def test_hashes_are_cached(tmp_path):
+    paths = [write(tmp_path / 'a.txt', b'same'), write(tmp_path / 'b.txt', b'same'),
+             write(tmp_path / 'c.txt', b'alone')]
+    cache = HashCache(tmp_path)
+    assert find_duplicates(paths, cache) == {paths[1]: paths[0]}
+    cache.save()
+    # only files with the same size are hashed
+    assert len(HashCache(tmp_path).entries) == 2
+
+    cache = HashCache(tmp_path)
+    key = next(iter(cache.entries))
+    cache.entries[key] = ['cached', 'cached']
+    find_duplicates(paths, cache)
+    assert cache.used[key] == ['cached', 'cached']
+    # a rewritten file gets a new key, hashes of files which are gone are dropped
+    write(tmp_path / 'b.txt', b'else')
+    os.remove(paths[0])
+    cache.save()
+    cache = HashCache(tmp_path)
+    assert find_duplicates(paths[1:], cache) == {}
+    cache.save()
+    assert HashCache(tmp_path).entries == {}
+
+
+def test_broken_cache_is_ignored(tmp_path):
+    (tmp_path / CACHE_NAME).write_text('{', encoding='utf-8')
+    assert HashCache(tmp_path).entries == {}
+
+
+def make_folder(path):
+    (path / 'docs').mkdir()
+    (path / 'docs' / 'documents').mkdir()
+    write(path / 'docs' / 'documents' / 'report.txt', b'report')
+    write(path / 'docs' / 'copy.txt', b'report')
+    write(path / 'docs' / 'other.txt', b'other')
+
+
+def test_duplicates_are_not_looked_for_by_default(tmp_path):
+    make_folder(tmp_path)
+    assert sort_folder(tmp_path) == []
+    assert sorted(os.listdir(tmp_path / 'docs' / 'documents')) == ['copy.txt', 'other.txt', 'report.txt']
+    assert not (tmp_path / CACHE_NAME).exists()
+
+
+@pytest.mark.parametrize('policy', ['report', 'hardlink', 'skip'])
+def test_duplicates_are_sorted_by_policy(tmp_path, policy, capsys):
+    make_folder(tmp_path)
+    assert sort_folder(tmp_path, duplicates=policy) == []
+    documents = tmp_path / 'docs' / 'documents'
+    assert 'duplicate docs/copy.txt of docs/documents/report.txt' in capsys.readouterr().out
+    assert (tmp_path / CACHE_NAME).exists()
+    assert (documents / 'other.txt').exists()
+    if policy == 'skip':
+        assert not (documents / 'copy.txt').exists() and (tmp_path / 'docs' / 'copy.txt').exists()
+        return
+    assert (documents / 'copy.txt').read_bytes() == b'report'
+    assert not (tmp_path / 'docs' / 'copy.txt').exists()
+    linked = os.path.samefile(documents / 'copy.txt', documents / 'report.txt')
+    assert linked is (policy == 'hardlink')
@@ -0,0 +1,131 @@
+"""
+Extraction of archives: entries never leave the target folder, an archive which expands over the size
+or the compression ratio limit is stopped and nothing of it is left.
+Run from the project folder:
+py -m pytest tests
+"""
+
+import gzip
+import io
+import os
+import tarfile
+import zipfile
+
+import pytest
+
+from tools.extractor import RATIO_FLOOR, extract
+
+
+def files(folder) -> list:
+    return sorted(os.path.relpath(os.path.join(root, name), folder)
+                  for root, _, names in os.walk(folder) for name in names)
+
+
+def make_zip(path, entries: dict) -> str:
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in entries.items():
+            archive.writestr(name, content)
+    return str(path)
+
+
+def make_tar(path, entries: dict, mode: str = 'w') -> str:
+    with tarfile.open(path, mode) as archive:
+        for name, content in entries.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            archive.addfile(info, io.BytesIO(content))
+        link = tarfile.TarInfo('link')
+        link.type, link.linkname = tarfile.SYMTYPE, '/etc/passwd'
+        archive.addfile(link)
+    return str(path)
+
+
+TRAVERSAL = {'../evil.txt': b'up', '/etc/evil.txt': b'absolute', 'a/../../b/evil.txt': b'deep',
+             '..\\win.txt': b'windows', 'a/ok.txt': b'ok', 'ok.txt': b'first', './ok.txt': b'second'}
+
+
+@pytest.mark.parametrize('make, ext', [(make_zip, '.zip'), (make_tar, '.tar')])
+def test_entries_stay_in_the_folder(tmp_path, make, ext):
+    (tmp_path / 'sorted').mkdir()
+    source = make(tmp_path / 'sorted' / f'archive{ext}', TRAVERSAL)
+    target = tmp_path / 'sorted' / 'archive'
+    extract(source, str(target), ext)
+
+    # '..' and absolute parts are dropped, links are skipped, taken names get a number
+    expected = ['a/b/evil.txt', 'a/ok.txt', 'etc/evil.txt', 'evil.txt', 'ok.txt', 'ok_1.txt', 'win.txt']
+    assert files(target) == [os.path.normpath(name) for name in expected]
+    assert files(tmp_path) == sorted([os.path.join('sorted', f'archive{ext}')] +
+                                     [os.path.join('sorted', 'archive', os.path.normpath(name)) for name in expected])
+    assert (target / 'evil.txt').read_bytes() == b'up'
+
+
+def test_entries_are_added_to_the_existing_folder(tmp_path):
+    target = tmp_path / 'archive'
+    target.mkdir()
+    (target / 'ok.txt').write_bytes(b'old')
+    extract(make_zip(tmp_path / 'archive.zip', {'ok.txt': b'new', 'new.txt': b'new'}), str(target), '.zip')
+    assert files(target) == ['new.txt', 'ok.txt', 'ok_1.txt']
+    assert (target / 'ok.txt').read_bytes() == b'old' and (target / 'ok_1.txt').read_bytes() == b'new'
+    assert not os.path.exists(f'{target}.part')
+
+
+@pytest.mark.parametrize('ext', ['.zip', '.tar', '.gz'])
+def test_size_limit(tmp_path, ext):
+    content = {'a.txt': os.urandom(600), 'b.txt': os.urandom(600)}
+    if ext == '.zip':
+        source = make_zip(tmp_path / 'big.zip', content)
+    elif ext == '.tar':
+        source = make_tar(tmp_path / 'big.tar', content)
+    else:
+        source = str(tmp_path / 'big.txt.gz')
+        with gzip.open(source, 'wb') as file:
+            file.write(content['a.txt'] + content['b.txt'])
+    target = tmp_path / 'big'
+    with pytest.raises(ValueError):
+        extract(source, str(target), ext, max_size=1000)
+    assert files(tmp_path) == [os.path.basename(source)]
+
+    extract(source, str(target), ext, max_size=1200)
+    assert sum(os.path.getsize(target / name) for name in files(target)) == 1200
+
+
+@pytest.mark.parametrize('ext', ['.zip', '.gz'])
+def test_ratio_limit(tmp_path, ext):
+    zeros = bytes(RATIO_FLOOR + 1)
+    if ext == '.zip':
+        source = make_zip(tmp_path / 'bomb.zip', {'zeros.bin': zeros})
+    else:
+        # the stream is counted while copying, the expanded size isn't declared
+        source = make_tar(tmp_path / 'bomb.tar.gz', {'zeros.bin': zeros}, 'w:gz')
+    assert os.path.getsize(source) * 100 < RATIO_FLOOR
+    with pytest.raises(ValueError):
+        extract(source, str(tmp_path / 'bomb'), ext)
+    assert files(tmp_path) == [os.path.basename(source)]
+    # a small archive may expand up to the floor whatever its ratio is
+    source = make_zip(tmp_path / 'zeros.zip', {'zeros.bin': zeros[:RATIO_FLOOR]})
+    extract(source, str(tmp_path / 'zeros'), '.zip')
+    assert os.path.getsize(tmp_path / 'zeros' / 'zeros.bin') == RATIO_FLOOR
+
+
+def test_lying_zip_is_stopped(tmp_path):
+    source = make_zip(tmp_path / 'lying.zip', {'a.txt': b'x' * 5000})
+    with open(source, 'r+b') as file:
+        data = file.read()
+        # the declared size in the central directory is made small to pass the check of declared sizes
+        position = data.rindex(b'PK\x01\x02') + 24
+        file.seek(position)
+        file.write((10).to_bytes(4, 'little'))
+    # no more than the declared size is read, so the checksum doesn't match
+    with pytest.raises(OSError):
+        extract(source, str(tmp_path / 'lying'), '.zip', max_size=1000)
+    assert files(tmp_path) == ['lying.zip']
+
+
+def test_broken_and_unknown_archives(tmp_path):
+    source = tmp_path / 'broken.zip'
+    source.write_bytes(b'not an archive')
+    with pytest.raises(OSError):
+        extract(str(source), str(tmp_path / 'broken'), '.zip')
+    with pytest.raises(ValueError):
+        extract(str(source), str(tmp_path / 'broken'), '.rar')
+    assert files(tmp_path) == ['broken.zip']
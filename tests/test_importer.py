@@ -0,0 +1,116 @@
+"""
+Bulk import of contacts: invalid records and records which conflict with the book are rejected
+with reasons, the other ones are imported in one transaction.
+Run from the project folder:
+py -m pytest tests
+"""
+
+import json
+
+import pytest
+
+from tools.importer import import_file, read_jsonl, read_vcard, validate_record
+from tools.records import Note, Person
+from tools.storage import open_storage
+
+
+HEADER = 'name,address,phone,email,birthday,region,phones\n'
+
+
+def rejects(path: str) -> list:
+    with open(path, encoding='utf-8') as file:
+        return [(line['number'], line['error']) for line in map(json.loads, file)]
+
+
+@pytest.fixture(params=['contacts.data', 'contacts.db'])
+def storage(tmp_path, request):
+    storage = open_storage(str(tmp_path / request.param), Person, Note)
+    storage.put_person('Ann', Person('Ann', 'Kyiv', '+380501234567', 'ann@mail.com', '1990-05-17'))
+    yield storage
+    storage.close()
+
+
+def test_valid_record_gets_defaults():
+    fields = validate_record({'name': 'Bob', 'phone': '050 765 43 21', 'phones': ['050 765 43 21', '+380671112233'],
+                              'birthday': '17.05.1990'}, 'UA')
+    assert fields['phone'] == '+380507654321' and fields['phones'] == ('+380671112233',)
+    assert fields['birthday'] == '1990-05-17'
+    assert (fields['address'], fields['email']) == ('NULL', 'NULL')
+    # the main value is taken from the list if it isn't given
+    fields = validate_record({'name': 'Bob', 'emails': ['bob@mail.com', 'bob@work.com'], 'birthday': ''})
+    assert fields['email'] == 'bob@mail.com' and fields['emails'] == ('bob@work.com',)
+    assert fields['birthday'] == '1900-01-01'
+
+
+@pytest.mark.parametrize('record, errors', [
+    ({'phone': '+380507654321'}, ["Invalid Name: ''"]),
+    ({'name': 'Bob1'}, ["Invalid Name: 'Bob1'"]),
+    ({'name': 'Bob', 'phone': '12345'}, ["Invalid phone number: '12345'"]),
+    ({'name': 'Bob', 'email': 'bob@mail'}, ["Invalid Email: 'bob@mail'"]),
+    ({'name': 'Bob', 'birthday': '1990-02-30'}, ["Invalid birthday: '1990-02-30'"]),
+    ({'name': 'Bob', 'phones': ['+380507654321', 'nothing']}, ["Invalid phone number: 'nothing'"]),
+    ({'name': '', 'email': 'bob', 'birthday': 'soon'}, ["Invalid Name: ''", "Invalid Email: 'bob'",
+                                                        "Invalid birthday: 'soon'"]),
+    ({'line': '{', 'error': 'Invalid JSON'}, ['Invalid JSON']),
+])
+def test_invalid_record_is_rejected_with_all_errors(record, errors):
+    with pytest.raises(ValueError) as error:
+        validate_record(record, 'UA')
+    assert str(error.value) == '; '.join(errors)
+
+
+def test_import_rejects_invalid_and_conflicting_records(tmp_path, storage):
+    path = tmp_path / 'contacts.csv'
+    path.write_text(HEADER +
+                    'Bob,Lviv,050 765 43 21,bob@mail.com,1985-03-01,UA,\n'
+                    'Ann,Odesa,,,,,\n'
+                    'Cid,,+380501234567,,,,\n'
+                    'Dan,,,ANN@mail.com,,,\n'
+                    'Eve,,,,,,"+380671112233\n0507654321"\n'
+                    'Fay,,0671112233,,,UA,\n'
+                    'Gus,,12345,,,,\n'
+                    'Hal,,,hal@mail.com,,,\n', encoding='utf-8')
+    imported, rejected = import_file(str(path), storage, Person, 'UA', workers=1)
+
+    assert (imported, rejected) == (3, 5)
+    assert rejects(f'{path}.rejects.jsonl') == [
+        (2, "Contact already present"),
+        (3, "Phone +380501234567 already belongs to Ann"),
+        (4, "Email ANN@mail.com already belongs to Ann"),
+        # other values and records imported before in the file are checked too
+        (5, "Phone +380507654321 already belongs to Bob"),
+        (7, "Invalid phone number: '12345'"),
+    ]
+    assert sorted(storage.persons) == ['Ann', 'Bob', 'Fay', 'Hal']
+    assert storage.persons['Bob'].phone == '+380507654321'
+    assert storage.persons['Ann'].address == 'Kyiv'
+
+
+def test_rejects_file_is_removed_without_rejects(tmp_path, storage):
+    path = tmp_path / 'contacts.jsonl'
+    path.write_text('{"name": "Bob", "phones": ["+380507654321", "+380671112233"]}\n\n', encoding='utf-8')
+    assert import_file(str(path), storage, Person, workers=1) == (1, 0)
+    assert storage.persons['Bob'].values('phone') == ('+380507654321', '+380671112233')
+    assert not (tmp_path / 'contacts.jsonl.rejects.jsonl').exists()
+
+
+def test_unknown_format_is_refused(tmp_path, storage):
+    with pytest.raises(ValueError):
+        import_file(str(tmp_path / 'contacts.txt'), storage, Person)
+
+
+def test_readers_of_files(tmp_path):
+    path = tmp_path / 'contacts.jsonl'
+    path.write_text('{"Name": "Bob", "Phones": [380507654321]}\n[1, 2]\nnot json\n', encoding='utf-8')
+    assert list(read_jsonl(str(path))) == [
+        {'name': 'Bob', 'phones': ['380507654321']},
+        {'line': '[1, 2]', 'error': 'Invalid JSON'},
+        {'line': 'not json', 'error': 'Invalid JSON'},
+    ]
+    path = tmp_path / 'contacts.vcf'
+    path.write_text('BEGIN:VCARD\r\nFN:Bob\r\nitem1.TEL;TYPE=CELL:+380507654321\r\nTEL:+38067\r\n 1112233\r\n'
+                    'ADR:;;Main st\\, 1;Lviv;;;\r\nEND:VCARD\r\n', encoding='utf-8')
+    assert list(read_vcard(str(path))) == [{
+        'name': 'Bob', 'phone': '+380507654321', 'phones': ['+380507654321', '+380671112233'],
+        'address': 'Main st, 1, Lviv', 'addresses': ['Main st, 1, Lviv'],
+    }]
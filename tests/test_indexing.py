@@ -0,0 +1,265 @@
+"""
+In-memory indexes of the address book & diary: every index must find the same records
+as the scan it replaces and stay in sync when records are changed and deleted.
+Run from the project folder:
+py -m pytest tests
+"""
+
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from tools.indexing import BirthdayIndex, NameIndex, NoteIndex, TokenIndex, UniqueIndex, group_duplicates
+from tools.records import Note, Person
+from tools.storage import birthday_dates, birthday_keys, open_storage
+
+
+def person(name: str, address: str = 'Kyiv', phone: str = '+380501234567', email: str = None,
+           birthday: str = '1990-05-17') -> Person:
+    return Person(name, address, phone, email or f'{name.lower()}@mail.com', birthday)
+
+
+def note(date: str, text: str, tags: list) -> Note:
+    record = Note(text, tags)
+    record.date = date
+    return record
+
+
+NOTES = [
+    note('2024-01-01T10:00:00', 'Buy milk and bread', ['shop', 'food']),
+    note('2024-01-02T10:00:00', 'Call mom', ['family']),
+    note('2024-01-03T10:00:00', 'Shopping list for the trip', ['trip']),
+    note('2024-01-04T10:00:00', 'Workshop at noon', ['work']),
+]
+
+
+def test_token_index_ranks_by_field():
+    index = TokenIndex([
+        ('Ann', person('Ann', address='Annapolis')),
+        ('Bob', person('Bob', address='Annapolis')),
+        ('Joanna', person('Joanna')),
+    ])
+    # the name goes before the email and the address, contacts of one rank keep the order of adding
+    assert index.search('ANN') == ['Ann', 'Joanna', 'Bob']
+    assert index.search('0501234') == ['Ann', 'Bob', 'Joanna']
+    assert index.search('1990-05') == ['Ann', 'Bob', 'Joanna']
+    assert index.search('bob@') == ['Bob']
+    assert index.search('zzz') == []
+
+
+def test_token_index_short_text_checks_all_contacts():
+    index = TokenIndex([('Ann', person('Ann')), ('Bob', person('Bob'))])
+    assert index.search('b') == ['Bob']
+    assert index.search('') == ['Ann', 'Bob']
+
+
+def test_token_index_follows_changes():
+    index = TokenIndex([('Ann', person('Ann', address='Lviv'))])
+    index.add('Ann', person('Ann', address='Odesa'))
+    assert index.search('lviv') == []
+    assert index.search('odes') == ['Ann']
+    moved = person('Ann', address='Odesa')
+    moved.set_value('address', ('Odesa', 'Kharkiv'))
+    index.add('Ann', moved)
+    assert index.search('kharkiv') == ['Ann']
+    index.discard('Ann')
+    index.discard('Ann')
+    assert index.search('ann') == [] and not index.postings and not index.fields
+
+
+def test_note_index_finds_tags_and_phrases():
+    index = NoteIndex((record.date, record) for record in NOTES)
+    assert index.with_tag('shop') == ['2024-01-01T10:00:00']
+    assert index.with_tag('sho') == []
+    # a part of a tag and a part of a word are found, also by short texts
+    assert index.with_tag_part('hop') == ['2024-01-01T10:00:00']
+    assert index.with_tag_part('o') == ['2024-01-01T10:00:00', '2024-01-04T10:00:00']
+    assert index.with_phrase('ilk') == ['2024-01-01T10:00:00']
+    assert index.with_phrase('SHOP') == ['2024-01-03T10:00:00', '2024-01-04T10:00:00']
+    assert index.with_phrase('mom') == ['2024-01-02T10:00:00']
+    assert index.with_phrase('milk bread') == []
+
+
+def test_note_index_follows_changes():
+    index = NoteIndex((record.date, record) for record in NOTES)
+    index.add('2024-01-01T10:00:00', note('2024-01-01T10:00:00', 'Buy tea', ['shopping']))
+    assert index.with_phrase('milk') == []
+    assert index.with_tag('shop') == []
+    assert index.sorted_tags == ['family', 'shopping', 'trip', 'work']
+    index.discard('2024-01-04T10:00:00')
+    assert index.with_phrase('workshop') == [] and 'work' not in index.tags
+    assert index.complete_tag('shp') == ['shopping']
+    index.clear()
+    assert index.with_tag_part('') == [] and not index.postings
+
+
+@pytest.mark.parametrize('name', ['notes.data', 'notes.db'])
+def test_notes_are_found_alike_by_backends(tmp_path, name):
+    storage = open_storage(str(tmp_path / name), Person, Note)
+    for record in NOTES:
+        storage.put_note(record.date, record)
+    for text in ('hop', 'ilk', 'o', 'SHOP', 'trip', 'nothing'):
+        # the scan which the index replaces
+        with_tag = [record.date for record in NOTES if any(text in tag for tag in record.keyWords)]
+        with_text = [record.date for record in NOTES
+                     if text.lower() in record.value.lower() and record.date not in with_tag]
+        by_key, by_text = storage.search_notes(text)
+        assert [record.date for record in by_key] == with_tag
+        assert [record.date for record in by_text] == with_text
+        assert [record.date for record in storage.iter_found_notes(text)] == with_tag + with_text
+    storage.close()
+
+
+def test_birthday_index_finds_days():
+    index = BirthdayIndex([
+        ('Ann', person('Ann', birthday='1990-05-17')),
+        ('Bob', person('Bob', birthday='1988-02-29')),
+        ('Cid', person('Cid', birthday='1975-05-17')),
+    ])
+    assert list(index.keys_on(5, 17)) == ['Ann', 'Cid']
+    assert list(index.keys_on(2, 29)) == ['Bob']
+    assert list(index.keys_on(2, 28)) == [] and list(index.keys_on(3, 1)) == []
+    # a new birthday replaces the old one, the contact goes to the end of the day
+    index.add('Ann', person('Ann', birthday='1992-02-29'))
+    assert list(index.keys_on(5, 17)) == ['Cid']
+    assert list(index.keys_on(2, 29)) == ['Bob', 'Ann']
+    index.discard('Bob')
+    index.discard('Bob')
+    assert list(index.keys_on(2, 29)) == ['Ann'] and 'Bob' not in index.slots
+
+
+def test_leap_birthday_is_celebrated_on_28_february():
+    assert birthday_dates(datetime(2023, 2, 27), 3) == {
+        (2, 27): datetime(2023, 2, 27).date(), (2, 28): datetime(2023, 2, 28).date(),
+        (2, 29): datetime(2023, 2, 28).date(), (3, 1): datetime(2023, 3, 1).date()}
+    assert birthday_keys(datetime(2024, 2, 28), 1) == {(2, 28)}
+    assert birthday_keys(datetime(2024, 2, 28), 2) == {(2, 28), (2, 29)}
+    assert len(birthday_keys(datetime(2024, 1, 1), 1000)) == 366
+    assert birthday_keys(datetime(2024, 1, 1), -1) == set()
+
+
+@pytest.mark.parametrize('name', ['contacts.data', 'contacts.db'])
+def test_birthdays_are_found_alike_by_backends(tmp_path, name):
+    storage = open_storage(str(tmp_path / name), Person, Note)
+    for key, birthday in (('Ann', '1990-05-17'), ('Bob', '1988-02-29'), ('Cid', '1975-05-18'), ('Dan', '1975-05-17')):
+        storage.put_person(key, person(key, birthday=birthday))
+    storage.pop_person('Dan')
+    found = dict(storage.birthday_persons(birthday_keys(datetime(2023, 2, 28), 1)))
+    assert sorted(found) == ['Bob']
+    found = dict(storage.birthday_persons({(5, 17), (5, 18)}))
+    assert sorted(found) == ['Ann', 'Cid'] and found['Cid'].name == 'Cid'
+    assert list(storage.birthday_persons(set())) == []
+    storage.close()
+
+
+NAMES = ['Anna', 'ann', 'Annette', 'Bob', 'Boris', 'Mark', 'Maria', 'Marta', 'Олег', 'Ольга']
+
+
+def test_name_index_completes_the_beginning():
+    index = NameIndex(NAMES)
+    assert index.complete('ANN') == ['ann', 'Anna', 'Annette']
+    assert index.complete('mar') == ['Maria', 'Mark', 'Marta']
+    assert index.complete('ол') == ['Олег', 'Ольга']
+    assert index.complete('') == sorted(NAMES, key=str.lower)
+    assert index.complete('mar', 2) == ['Maria', 'Mark']
+    # names with one typo are added below the limit, short prefixes are taken as they are
+    assert index.complete('bor') == ['Boris', 'Bob']
+    assert index.complete('bro') == ['Boris', 'Bob']
+    assert index.complete('mra') == ['Maria', 'Mark', 'Marta']
+    assert index.complete('bx') == []
+    assert index.complete('xyz') == []
+
+
+def test_name_index_follows_changes():
+    index = NameIndex(['Bob'])
+    index.add('bob', person('bob'))
+    index.add('Bob', person('Bob'))
+    assert index.names == ['Bob', 'bob']
+    index.discard('Bob')
+    index.discard('Bob')
+    assert index.complete('bo') == ['bob']
+    index.clear()
+    assert index.complete('bo') == []
+
+
+@pytest.mark.parametrize('prefix', ['', 'a', 'ANN', 'anx', 'mra', 'bro', 'bor', 'ол', 'оьл', 'xyz'])
+def test_names_are_completed_alike_by_backends(tmp_path, prefix):
+    expected = NameIndex(NAMES).complete(prefix, 5)
+    storage = open_storage(str(tmp_path / 'contacts.db'), Person, Note)
+    for key in NAMES:
+        storage.put_person(key, person(key))
+    assert storage.complete_names(prefix, 5) == expected
+    storage.close()
+
+
+def test_unique_index_finds_normalized_values():
+    ann = person('Ann', email='Ann@Mail.com ')
+    ann.set_value('phone', ('+380501234567', '+380671112233'))
+    index = UniqueIndex('phone', [('Ann', ann), ('Bob', person('Bob', phone='NULL'))])
+    assert index.get('+38 (050) 123-45-67') == ['Ann']
+    assert index.get('+380671112233') == ['Ann']
+    assert index.get('NULL') == [] and index.get(None) == []
+    assert UniqueIndex('email', [('Ann', ann)]).get('ANN@mail.com') == ['Ann']
+    assert 'Bob' not in index.values
+
+
+def test_unique_index_keeps_duplicates():
+    index = UniqueIndex('phone', [('Ann', person('Ann')), ('Bob', person('Bob')), ('Cid', person('Cid'))])
+    assert index.get('+380501234567') == ['Ann', 'Bob', 'Cid']
+    assert list(index.duplicates()) == [('+380501234567', ['Ann', 'Bob', 'Cid'])]
+    index.discard('Bob')
+    index.add('Cid', person('Cid', phone='+380671112233'))
+    # the last owner of the value is kept without a list
+    assert index.keys['+380501234567'] == 'Ann'
+    assert list(index.duplicates()) == []
+    index.discard('Ann')
+    assert index.get('+380501234567') == [] and '+380501234567' not in index.keys
+
+
+def test_duplicates_are_grouped_through_each_other():
+    assert group_duplicates([['Ann', 'Bob'], ['Cid', 'Dan'], ['Bob', 'Cid'], ['Eve', 'Fay']]) == [
+        ['Ann', 'Bob', 'Cid', 'Dan'], ['Eve', 'Fay']]
+    assert group_duplicates([['Bob', 'Ann'], ['Ann', 'Bob']]) == [['Bob', 'Ann']]
+    assert group_duplicates([]) == []
+
+
+@pytest.mark.parametrize('name', ['contacts.data', 'contacts.db'])
+def test_unique_values_are_found_alike_by_backends(tmp_path, name):
+    storage = open_storage(str(tmp_path / name), Person, Note)
+    # old books kept phones as they were typed
+    storage.put_person('Ann', person('Ann', phone='050 123 45 67', email='Ann@Mail.com'))
+    storage.put_person('Bob', person('Bob', phone='(050) 123-45-67', email='bob@mail.com'))
+    cid = person('Cid', phone='+380671112233', email='cid@mail.com')
+    cid.set_value('email', ('cid@mail.com', 'BOB@mail.com'))
+    storage.put_person('Cid', cid)
+    storage.put_person('Dan', person('Dan', phone='+380931234567', email='dan@mail.com'))
+    storage.pop_person('Dan')
+    assert storage.keys_by('phone', '050-123-45-67') == ['Ann', 'Bob']
+    assert storage.keys_by('email', 'ann@mail.com') == ['Ann']
+    assert storage.keys_by('email', 'bob@mail.com') == ['Bob', 'Cid']
+    assert storage.keys_by('phone', '+380931234567') == []
+    assert storage.conflict('Ann', email='ANN@mail.com') is None
+    assert storage.conflict('Dan', phone='0501234567') == "Phone 0501234567 already belongs to Ann"
+    assert sorted(storage.shared_values('phone')) == [('0501234567', ['Ann', 'Bob'])]
+    assert [sorted(group) for group in storage.duplicate_groups()] == [['Ann', 'Bob', 'Cid']]
+    storage.close()
+
+
+def test_old_database_gets_key_columns(tmp_path):
+    path = str(tmp_path / 'contacts.db')
+    storage = open_storage(path, Person, Note)
+    storage.put_person('Ann', person('Ann', phone='050 123 45 67', email='Ann@Mail.com'))
+    storage.close()
+    # the database of the version which searched raw phones and emails
+    connection = sqlite3.connect(path)
+    for column in ('name_key', 'phone_key', 'email_key'):
+        connection.execute(f'DROP INDEX persons_{column}')
+        connection.execute(f'ALTER TABLE persons DROP COLUMN {column}')
+    connection.close()
+
+    storage = open_storage(path, Person, Note)
+    assert storage.keys_by('phone', '(050) 123-45-67') == ['Ann']
+    assert storage.keys_by('email', 'ann@mail.com') == ['Ann']
+    assert storage.complete_names('an') == ['Ann']
+    storage.close()
@@ -0,0 +1,210 @@
+"""
+Round-trips of the pickle journal and the snapshot storage: replay of the log, the torn tail,
+recovery of the rotated log, changes on top of the snapshot, compaction and reading during a reload.
+Run from the project folder:
+py -m pytest tests
+"""
+
+import os
+import pickle
+import sys
+import threading
+import time
+import types
+
+import pytest
+
+from tools import snapshot
+from tools.journal import Journal
+from tools.records import Note, Person
+from tools.storage import JournalStorage, SnapshotStorage, migrate_to_snapshot, open_storage
+
+
+def person(name: str, phone: str = '0501234567') -> Person:
+    return Person(name, 'Kyiv', phone, f'{name.lower()}@mail.com', '1990-05-17')
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'contacts.data')
+
+
+def names(storage) -> list:
+    return sorted(storage.persons)
+
+
+def test_journal_is_replayed(path):
+    storage = JournalStorage(path)
+    storage.put_person('Ann', person('Ann'))
+    storage.put_person('Bob', person('Bob'))
+    storage.pop_person('Ann')
+    storage.put_note('1', Note('buy milk', ['shop']))
+    storage.journal.close()
+
+    storage = JournalStorage(path)
+    assert names(storage) == ['Bob']
+    assert storage.persons['Bob'].email == 'bob@mail.com'
+    assert storage.notes['1'].value == 'buy milk'
+    assert storage.journal.records == 4
+
+
+def test_torn_tail_is_cut_off(path):
+    storage = JournalStorage(path)
+    storage.put_person('Ann', person('Ann'))
+    storage.put_person('Bob', person('Bob'))
+    storage.journal.close()
+    log = f'{path}.log'
+    size = os.path.getsize(log)
+    os.truncate(log, size - 5)
+
+    storage = JournalStorage(path)
+    assert names(storage) == ['Ann']
+    storage.journal.close()
+    # the torn record is cut off, the next records are appended after the whole ones
+    assert os.path.getsize(log) < size - 5
+    storage = JournalStorage(path)
+    storage.put_person('Cid', person('Cid'))
+    storage.journal.close()
+    assert names(JournalStorage(path)) == ['Ann', 'Cid']
+
+
+def test_unknown_class_keeps_the_log(path):
+    module = types.ModuleType('gone')
+    module.Record = type('Record', (), {'__module__': 'gone'})
+    sys.modules['gone'] = module
+    try:
+        broken = pickle.dumps(('put', 'persons', 'Bob', module.Record()))
+    finally:
+        del sys.modules['gone']
+    storage = JournalStorage(path)
+    storage.put_person('Ann', person('Ann'))
+    storage.journal.close()
+    log = f'{path}.log'
+    with open(log, 'ab') as file:
+        file.write(broken)
+    size = os.path.getsize(log)
+
+    with pytest.raises(ModuleNotFoundError):
+        list(Journal.replay_file(log))
+    assert os.path.getsize(log) == size
+
+
+@pytest.mark.parametrize('module', [b'__main__', b'main'])
+def test_records_of_old_modules_are_read(path, module):
+    # old versions pickled contacts under the module of the script, protocol 0 names the class as text
+    record = pickle.dumps(('put', 'persons', 'Ann', person('Ann')), protocol=0)
+    with open(f'{path}.log', 'wb') as file:
+        file.write(record.replace(b'ctools.records\n', b'c' + module + b'\n'))
+
+    storage = JournalStorage(path)
+    assert type(storage.persons['Ann']) is Person
+    assert storage.persons['Ann'].email == 'ann@mail.com'
+
+
+def test_rotated_log_is_recovered(path):
+    storage = JournalStorage(path)
+    storage.put_person('Ann', person('Ann'))
+    storage.journal.close()
+    # the background compaction was interrupted after the log was rotated
+    storage.journal.rotate()
+    storage.put_person('Bob', person('Bob'))
+    storage.journal.close()
+
+    storage = JournalStorage(path)
+    assert names(storage) == ['Ann', 'Bob']
+    assert not storage.journal.has_rotated()
+    assert os.path.getsize(f'{path}.log') == 0
+    storage.journal.close()
+    assert names(JournalStorage(path)) == ['Ann', 'Bob']
+
+
+def test_patch_is_replayed(path):
+    storage = JournalStorage(path)
+    storage.put_person('Ann', person('Ann'))
+    applied = storage.patch_person('Ann', {'phone': ('0509999999', '0501234567'), 'address': ('Lviv',)}, 1000)
+    assert applied == {'phone': ('0509999999', '0501234567'), 'address': ('Lviv',)}
+    assert storage.patch_person('Ann', {'address': ('Lviv',)}, 2000) == {}
+    storage.journal.close()
+
+    ann = JournalStorage(path).persons['Ann']
+    assert ann.values('phone') == ('0509999999', '0501234567')
+    assert ann.address == 'Lviv'
+    assert sorted(ann.history) == [(1000, 'address', ('Kyiv',)), (1000, 'phone', ('0501234567',))]
+    assert ann.value_at('address', 999) == ('Kyiv',)
+
+
+def test_overlay_raw_items(tmp_path):
+    path = str(tmp_path / 'table.snapshot')
+    snapshot.write(path, {'persons': [(key, pickle.dumps(key.upper())) for key in ('a', 'b', 'c')]})
+    table = snapshot.OverlayTable(snapshot.open_sections(path)['persons'])
+    table['b'] = 'changed'
+    table['d'] = 'added'
+    del table['c']
+
+    items = [(key, pickle.loads(record)) for key, record in table.raw_items()]
+    assert items == [('a', 'A'), ('b', 'changed'), ('d', 'added')]
+    assert list(table) == ['a', 'b', 'd'] and len(table) == 3
+    table.clear()
+    table['e'] = 'new'
+    assert [(key, pickle.loads(record)) for key, record in table.raw_items()] == [('e', 'new')]
+    table.close()
+
+
+def test_snapshot_compaction(path):
+    storage = JournalStorage(path)
+    for name in ('Ann', 'Bob', 'Cid'):
+        storage.put_person(name, person(name))
+    storage.put_note('1', Note('buy milk', ['shop']))
+    storage.journal.close()
+    migrate_to_snapshot(path)
+    assert snapshot.is_snapshot(path)
+
+    storage = open_storage(path, Person, Note)
+    assert isinstance(storage, SnapshotStorage)
+    assert names(storage) == ['Ann', 'Bob', 'Cid']
+    storage.pop_person('Bob')
+    storage.put_person('Dan', person('Dan'))
+    storage.patch_person('Ann', {'email': ('ann@work.com',)}, 1000)
+    storage.compact()
+    assert not os.path.exists(f'{path}.tmp')
+    assert os.path.getsize(f'{path}.log') == 0
+    storage.put_person('Eve', person('Eve'))
+    storage.close()
+
+    storage = open_storage(path, Person, Note)
+    assert names(storage) == ['Ann', 'Cid', 'Dan', 'Eve']
+    assert storage.persons['Ann'].email == 'ann@work.com'
+    assert storage.persons['Ann'].history == ((1000, 'email', ('ann@mail.com',)),)
+    assert storage.notes['1'].keyWords == ['shop']
+    storage.close()
+
+
+def test_snapshot_is_read_during_reload(path):
+    storage = JournalStorage(path)
+    with storage.transaction():
+        for number in range(300):
+            storage.put_person(f'Name{number:03}', person(f'Name{number:03}'))
+    storage.journal.close()
+    migrate_to_snapshot(path)
+    storage = open_storage(path, Person, Note)
+    storage.put_person('Zed', person('Zed'))
+    reading, read = threading.Event(), []
+
+    def reload():
+        reading.wait()
+        storage.write_data(storage.copy_data())
+        # the saver waits for the reader, the mapping it iterates isn't closed under it
+        storage.reload()
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    with storage.reading():
+        reading.set()
+        for key, value in storage.persons.items():
+            time.sleep(0.001)
+            read.append(value.name)
+    thread.join()
+    assert len(read) == 301
+    assert storage.written is None and not os.path.exists(f'{path}.tmp')
+    assert names(storage) == sorted(read)
+    storage.close()
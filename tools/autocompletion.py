@@ -1,17 +1,23 @@
 """
-Autocomplete commands in console.
+Autocomplete commands, names of contacts and tags of notes in console.
+Commands are matched fuzzily, names and tags are completed by indexes of the book
+(see Storage.complete_names), one typo is forgiven.
 Need to install pkg prompt_toolkit
 First time need to enter command from terminal:
 pip install prompt_toolkit
 """
 
+import sys
+
 from prompt_toolkit import prompt
-from prompt_toolkit.completion import WordCompleter
+from prompt_toolkit.completion import Completer, Completion, FuzzyCompleter, WordCompleter
 from prompt_toolkit.key_binding import KeyBindings
 
-cmd = WordCompleter(
+cmd = FuzzyCompleter(WordCompleter(
     [
         "add",
+        "import",
+        "export",
         "add_notes",
         "view_all",
         "view_all_notes",
@@ -19,8 +25,14 @@ cmd = WordCompleter(
         "find",
         "search_notes",
         "sort_birthday",
+        "by_phone",
+        "by_email",
+        "duplicates",
         "update",
         "update_notes",
+        "add_value",
+        "remove_value",
+        "history",
         "delete",
         "delete_notes",
         "reset",
@@ -30,7 +42,7 @@ cmd = WordCompleter(
         "help"
     ],
     ignore_case=True,
-)
+))
 
 
 kb = KeyBindings()
@@ -48,6 +60,49 @@ def _(event):
         b.start_completion(select_first=False)
 
 
+class IndexCompleter(Completer):
+    """
+    A class is used to complete the whole input by the function of the book.
+    ________________________________________________
+
+    Attributes
+    __________
+    complete : function
+        prefix -> list of values, e.g. Storage.complete_names
+
+    Methods
+    _______
+    get_completions
+        values for the text before the cursor, all values are offered by Ctrl+Space on empty input
+
+    """
+
+    def __init__(self, complete) -> None:
+        self.complete = complete
+
+    def get_completions(self, document, complete_event):
+        text = document.text_before_cursor
+        if not text.strip() and not complete_event.completion_requested:
+            return
+        for value in self.complete(text.strip()):
+            yield Completion(value, start_position=-len(text))
+
+
+def ask(message: str, complete=None) -> str:
+    """
+    Asking the user with completion of the answer; plain input is used if stdin isn't a terminal
+    :param message: str
+    :param complete: function
+        prefix -> list of values, e.g. Storage.complete_names
+    :return: str
+        inputted text
+    """
+    if complete is None or not sys.stdin.isatty():
+        return input(message)
+    return prompt(message, completer=IndexCompleter(complete), complete_while_typing=True,
+                  complete_in_thread=True, key_bindings=kb)
+
+
 def autocomplete():
     """
     Autocompleting commands by inputted first letters
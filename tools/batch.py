@@ -0,0 +1,299 @@
+"""
+Non-interactive commands over the address book & diary.
+One command is given by arguments of main.py, many commands are read line by line from a file
+or stdin (batch mode). All commands run against one loaded book in one transaction,
+so the book is read once and changes are written once at the end.
+Every result is printed as a JSON line:
+{"command": "search", "ok": true, "result": {...}} or {"command": "search", "ok": false, "error": "..."}
+
+Commands, words are joined into the name or the text, options are given as field=value;
+lines are split like in the shell, so the text can be quoted, lines starting with # are comments:
+add NAME [address=] [phone=] [email=] [birthday=] [region=]
+search NAME
+find TEXT [limit=100] [offset=0]
+view_all [limit=100] [offset=0]
+update NAME [address=] [phone=] [email=] [birthday=] [region=]
+add_value NAME address=|phone=|email= [region=]
+remove_value NAME address=|phone=|email= [region=]
+history NAME [at=2024-05-01]
+delete NAME
+reset
+add_notes TEXT with #keywords#
+view_all_notes
+search_notes TEXT
+delete_notes KEYWORD
+reset_notes
+sort_birthday [DAYS, 7 by default | week | month]
+by_phone PHONE [region=]
+by_email EMAIL
+duplicates
+merge NAME NAME... (into the first one)
+import FILE [region=]
+export FILE [what=contacts|notes] [fields=name,phone] [query=]
+help
+"""
+
+from datetime import datetime
+import json
+import shlex
+import sys
+
+from tools import exporter
+from tools.exporter import contact_json, notes_json
+
+
+CONTACT_OPTIONS = ('address', 'phone', 'email', 'birthday', 'region')
+VALUE_OPTIONS = ('address', 'phone', 'email', 'region')
+PAGE_OPTIONS = ('limit', 'offset')
+PAGE_LIMIT = 100
+
+
+def page(persons, options: dict) -> dict:
+    """
+    Taking the page of found contacts
+    :param persons: iterable
+    :param options: dict
+        limit and offset
+    :return: dict
+        number of all found contacts and contacts of the page
+    """
+    limit = int(options.get('limit', PAGE_LIMIT))
+    offset = int(options.get('offset', 0))
+    contacts, count = [], 0
+    for person in persons:
+        if offset <= count < offset + limit:
+            contacts.append(contact_json(person))
+        count += 1
+    return {'count': count, 'contacts': contacts}
+
+
+def required(text: str, what: str) -> str:
+    if not text:
+        raise ValueError(f"{what} is required")
+    return text
+
+
+def add(book, text: str, options: dict):
+    return contact_json(book.add_contact(required(text, "Name"), **options))
+
+
+def search(book, text: str, options: dict):
+    return contact_json(book.persons[required(text, "Name")])
+
+
+def find(book, text: str, options: dict):
+    return page(book.storage.find_persons(required(text, "Text")), options)
+
+
+def view_all(book, text: str, options: dict):
+    return page(book.persons.values(), options)
+
+
+def update(book, text: str, options: dict):
+    return contact_json(book.update_contact(required(text, "Name"), **options))
+
+
+def value_field(options: dict) -> tuple:
+    """
+    Taking the only field of the value
+    :param options: dict
+    :return: tuple
+        field, value
+    """
+    fields = [field for field in VALUE_OPTIONS[:-1] if field in options]
+    if len(fields) != 1:
+        raise ValueError("One of address=, phone=, email= is required")
+    return fields[0], options[fields[0]]
+
+
+def add_value(book, text: str, options: dict):
+    return contact_json(book.add_contact_value(required(text, "Name"), *value_field(options),
+                                               options.get('region') or None))
+
+
+def remove_value(book, text: str, options: dict):
+    return contact_json(book.remove_contact_value(required(text, "Name"), *value_field(options),
+                                                  options.get('region') or None))
+
+
+def history(book, text: str, options: dict):
+    return book.contact_history(required(text, "Name"), options.get('at'))
+
+
+def delete(book, text: str, options: dict):
+    book.delete_contact(required(text, "Name"))
+    return {'deleted': text}
+
+
+def reset(book, text: str, options: dict):
+    count = len(book.persons)
+    book.storage.clear_persons()
+    return {'deleted': count}
+
+
+def add_notes(book, text: str, options: dict):
+    return notes_json([book.add_note_text(required(text, "Text"))])[0]
+
+
+def view_all_notes(book, text: str, options: dict):
+    return {'notes': notes_json(book.notes.values())}
+
+
+def search_notes(book, text: str, options: dict):
+    by_key, by_text = book.storage.search_notes(required(text, "Text"))
+    return {'by_key': notes_json(by_key), 'by_text': notes_json(by_text)}
+
+
+def delete_notes(book, text: str, options: dict):
+    return {'deleted': notes_json(book.delete_notes_with_keyword(required(text, "Keyword")))}
+
+
+def reset_notes(book, text: str, options: dict):
+    count = len(book.notes)
+    book.storage.clear_notes()
+    return {'deleted': count}
+
+
+def sort_birthday(book, text: str, options: dict):
+    period = text.lower() or '7'
+    if period in ('week', 'month'):
+        today = datetime.now()
+        calendar = book.birthday_calendar(today, book.period_days(period, today))
+        return {day.isoformat(): names for day, names in calendar.items()}
+    return book.birthdays(int(period))
+
+
+def by_phone(book, text: str, options: dict):
+    found = book.find_by_phone(required(text, "Phone"), options.get('region') or None)
+    return [contact_json(person) for _, person in found]
+
+
+def by_email(book, text: str, options: dict):
+    return [contact_json(person) for _, person in book.find_by_email(required(text, "Email"))]
+
+
+def duplicates(book, text: str, options: dict):
+    return book.duplicates_report()
+
+
+def merge(book, text: str, options: dict):
+    return contact_json(book.merge_contacts(text.split()))
+
+
+def import_contacts(book, text: str, options: dict):
+    imported, rejected = book.import_file(required(text, "File"), options.get('region') or None)
+    return {'imported': imported, 'rejected': rejected}
+
+
+def export(book, text: str, options: dict):
+    path = required(text, "File")
+    fields = options.get('fields', '').split(',')
+    if options.get('what', 'contacts') == 'notes':
+        count = exporter.export_notes(book.storage, path, fields, options.get('query'))
+    else:
+        count = exporter.export_contacts(book.storage, path, fields, options.get('query'))
+    return {'exported': count}
+
+
+def help_commands(book, text: str, options: dict):
+    return {name: list(allowed) for name, (_, allowed) in COMMANDS.items()}
+
+
+COMMANDS = {
+    'add': (add, CONTACT_OPTIONS),
+    'search': (search, ()),
+    'find': (find, PAGE_OPTIONS),
+    'view_all': (view_all, PAGE_OPTIONS),
+    'update': (update, CONTACT_OPTIONS),
+    'add_value': (add_value, VALUE_OPTIONS),
+    'remove_value': (remove_value, VALUE_OPTIONS),
+    'history': (history, ('at',)),
+    'delete': (delete, ()),
+    'reset': (reset, ()),
+    'add_notes': (add_notes, ()),
+    'view_all_notes': (view_all_notes, ()),
+    'search_notes': (search_notes, ()),
+    'delete_notes': (delete_notes, ()),
+    'reset_notes': (reset_notes, ()),
+    'sort_birthday': (sort_birthday, ()),
+    'by_phone': (by_phone, ('region',)),
+    'by_email': (by_email, ()),
+    'duplicates': (duplicates, ()),
+    'merge': (merge, ()),
+    'import': (import_contacts, ('region',)),
+    'export': (export, ('what', 'fields', 'query')),
+    'help': (help_commands, ()),
+}
+
+
+def split_words(words: list, allowed: tuple) -> tuple:
+    """
+    Splitting words of the command into the text and options
+    :param words: list
+    :param allowed: tuple
+        options of the command, other words with '=' are a part of the text
+    :return: tuple
+        text, options
+    """
+    text, options = [], {}
+    for word in words:
+        field, equal, value = word.partition('=')
+        if equal and field.lower() in allowed:
+            options[field.lower()] = value
+        else:
+            text.append(word)
+    return ' '.join(text).strip(), options
+
+
+def run_command(book, words: list) -> dict:
+    """
+    Running one command
+    :param book: AddressBook
+    :param words: list
+        the command and its arguments
+    :return: dict
+        the JSON line of the result
+    """
+    name = words[0].lower()
+    if name not in COMMANDS:
+        return {'command': name, 'ok': False, 'error': f"Unknown command, use {', '.join(COMMANDS)}"}
+    function, allowed = COMMANDS[name]
+    text, options = split_words(words[1:], allowed)
+    try:
+        return {'command': name, 'ok': True, 'result': function(book, text, options)}
+    except KeyError as error:
+        return {'command': name, 'ok': False, 'error': f"Not found: {error.args[0]}"}
+    except (OSError, ValueError) as error:
+        return {'command': name, 'ok': False, 'error': str(error)}
+
+
+def run_batch(book, lines, output=None) -> int:
+    """
+    Running commands line by line in one transaction and printing results as JSON lines.
+    A failed command doesn't stop the batch
+    :param book: AddressBook
+    :param lines: iterable
+        commands, empty lines and comments are skipped
+    :param output: file object
+        stdout by default
+    :return: int
+        number of failed commands
+    """
+    output = output or sys.stdout
+    failed = 0
+    with book.storage.transaction():
+        for line in lines:
+            if line.lstrip().startswith('#'):
+                continue
+            try:
+                words = shlex.split(line)
+            except ValueError as error:
+                result = {'command': line.strip(), 'ok': False, 'error': str(error)}
+            else:
+                if not words:
+                    continue
+                result = run_command(book, words)
+            failed += not result['ok']
+            output.write(json.dumps(result, ensure_ascii=False) + '\n')
+    output.flush()
+    return failed
@@ -0,0 +1,320 @@
+"""
+Columnar copy of the address book for analytics-style queries.
+Strings are kept as categorical columns, birthdays as arrays of day numbers,
+so filters run as vectorized masks over all contacts.
+Need to install pkg numpy
+First time need to enter command from terminal:
+pip install numpy
+
+Example:
+    store.filter(Column('email').endswith('@corp.com') & Column('birthday').between(date(1980, 1, 1), date(1989, 12, 31)))
+"""
+
+from abc import ABC, abstractmethod
+from datetime import date
+
+from tools.indexing import PERSON_FIELDS, person_fields
+from tools.lazy import lazy_import
+
+# numpy is imported by the first columnar store, None if it isn't installed
+np = lazy_import('numpy', optional=True)
+
+# rows of deleted contacts and replaced values are dropped when they are this part of all rows, and at least COMPACT_MIN
+COMPACT_FRACTION = 0.25
+COMPACT_MIN = 1024
+
+
+class Expression(ABC):
+    """
+    Filter over the columns, expressions are combined with &, | and ~
+    """
+
+    @abstractmethod
+    def mask(self, store):
+        """
+        Calculating the mask of matching rows
+        :param store: ColumnStore
+        :return: numpy.ndarray
+            boolean array with a value for every row
+        """
+
+    def __and__(self, other):
+        return Combined(np.logical_and, self, other)
+
+    def __or__(self, other):
+        return Combined(np.logical_or, self, other)
+
+    def __invert__(self):
+        return Inverted(self)
+
+
+class Combined(Expression):
+
+    def __init__(self, operation, left: Expression, right: Expression) -> None:
+        self.operation = operation
+        self.left = left
+        self.right = right
+
+    def mask(self, store):
+        return self.operation(self.left.mask(store), self.right.mask(store))
+
+
+class Inverted(Expression):
+
+    def __init__(self, expression: Expression) -> None:
+        self.expression = expression
+
+    def mask(self, store):
+        return ~self.expression.mask(store)
+
+
+class CategoryTest(Expression):
+    """
+    Test of a string column. It runs once per distinct value, rows take the result by their codes
+    """
+
+    def __init__(self, field: str, test) -> None:
+        self.field = field
+        self.test = test
+
+    def mask(self, store):
+        return store.category_mask(self.field, self.test)
+
+
+class BirthdayTest(Expression):
+    """
+    Test of the birthday column: over day numbers or over month * 100 + day
+    """
+
+    def __init__(self, test, by_month_day: bool = False) -> None:
+        self.test = test
+        self.by_month_day = by_month_day
+
+    def mask(self, store):
+        column = store.month_days if self.by_month_day else store.ordinals
+        return self.test(column[:store.size])
+
+
+class Column:
+    """
+    A class is used to build filters over one column. Strings are compared case insensitive.
+    ________________________________________________
+
+    Attributes
+    __________
+    field : str
+        name, phone, email, address or birthday
+
+    Methods
+    _______
+    contains, startswith, endswith, equals
+        filters over strings, the birthday is compared as yyyy-mm-dd
+    between
+        filter over birthdays from the first to the last date inclusive
+    born_on
+        filter over birthdays by days of a year
+
+    """
+
+    def __init__(self, field: str) -> None:
+        if field not in PERSON_FIELDS:
+            raise ValueError(f"Unknown field {field}, use one of {', '.join(PERSON_FIELDS)}")
+        self.field = field
+
+    def contains(self, text: str) -> Expression:
+        text = text.lower()
+        return CategoryTest(self.field, lambda values: np.char.find(values, text) >= 0)
+
+    def startswith(self, text: str) -> Expression:
+        return CategoryTest(self.field, lambda values: np.char.startswith(values, text.lower()))
+
+    def endswith(self, text: str) -> Expression:
+        return CategoryTest(self.field, lambda values: np.char.endswith(values, text.lower()))
+
+    def equals(self, text: str) -> Expression:
+        return CategoryTest(self.field, lambda values: values == text.lower())
+
+    def between(self, first: date, last: date) -> Expression:
+        first, last = first.toordinal(), last.toordinal()
+        return BirthdayTest(lambda ordinals: (ordinals >= first) & (ordinals <= last))
+
+    def born_on(self, keys: set) -> Expression:
+        month_days = np.array(sorted(month * 100 + day for month, day in keys), dtype=np.int16)
+        return BirthdayTest(lambda values: np.isin(values, month_days), by_month_day=True)
+
+
+class ColumnStore:
+    """
+    A class is used to keep contacts as columns, it's updated together with the storage.
+    ________________________________________________
+
+    Attributes
+    __________
+    keys : list
+        key of the contact of every row, None for deleted rows
+    rows : dict
+        key -> number of the row
+    categories : dict
+        field -> list of distinct lowercased values
+    codes : dict
+        field -> array of numbers of values in categories for every row
+    ordinals : numpy.ndarray
+        day number of the birthday for every row
+    month_days : numpy.ndarray
+        month * 100 + day of the birthday for every row
+    alive : numpy.ndarray
+        False for deleted rows
+    dead : int
+        number of deleted rows
+    replaced : int
+        number of values of string columns replaced by changes, they may be kept by no row
+
+    Methods
+    _______
+    add
+        adding the contact or updating its row
+    discard
+        marking the row of the contact as deleted, deleted rows are dropped when there are many of them
+    compact
+        dropping deleted rows and values which no row has
+    clear
+        removing all contacts
+    filter
+        finding keys of contacts which match the expression
+    search
+        finding contacts by a substring of any field, ranked by the field
+
+    """
+
+    def __init__(self, items=()) -> None:
+        if np is None:
+            raise ImportError("Columnar store needs numpy, install it: pip install numpy")
+        self.clear()
+        for key, person in items:
+            self.add(key, person)
+
+    def clear(self) -> None:
+        self.size = 0
+        self.dead = 0
+        self.replaced = 0
+        self.keys = []
+        self.rows = {}
+        self.categories = {field: [] for field in PERSON_FIELDS}
+        self.category_codes = {field: {} for field in PERSON_FIELDS}
+        self.category_arrays = {}
+        self.codes = {field: np.zeros(0, dtype=np.int32) for field in PERSON_FIELDS}
+        self.ordinals = np.zeros(0, dtype=np.int32)
+        self.month_days = np.zeros(0, dtype=np.int16)
+        self.alive = np.zeros(0, dtype=bool)
+
+    def _grow(self) -> None:
+        capacity = max(1024, len(self.alive) * 2)
+        for field in PERSON_FIELDS:
+            self.codes[field] = np.resize(self.codes[field], capacity)
+        self.ordinals = np.resize(self.ordinals, capacity)
+        self.month_days = np.resize(self.month_days, capacity)
+        alive = np.zeros(capacity, dtype=bool)
+        alive[:self.size] = self.alive[:self.size]
+        self.alive = alive
+
+    def _code(self, field: str, value: str) -> int:
+        codes = self.category_codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.categories[field])
+            self.categories[field].append(value)
+            self.category_arrays.pop(field, None)
+        return code
+
+    def add(self, key, person) -> None:
+        row = self.rows.get(key)
+        if row is None:
+            if self.size == len(self.alive):
+                self._grow()
+            row = self.rows[key] = self.size
+            self.keys.append(key)
+            self.size += 1
+        for field, value in zip(PERSON_FIELDS, person_fields(person)):
+            code = self._code(field, value)
+            if self.alive[row] and self.codes[field][row] != code:
+                self.replaced += 1
+            self.codes[field][row] = code
+        birthday = person["birthday"]
+        self.ordinals[row] = birthday.toordinal()
+        self.month_days[row] = birthday.month * 100 + birthday.day
+        self.alive[row] = True
+        self._compact_if_needed()
+
+    def discard(self, key) -> None:
+        row = self.rows.pop(key, None)
+        if row is not None:
+            self.alive[row] = False
+            self.keys[row] = None
+            self.dead += 1
+            self._compact_if_needed()
+
+    def _compact_if_needed(self) -> None:
+        if self.dead + self.replaced >= max(COMPACT_MIN, self.size * COMPACT_FRACTION):
+            self.compact()
+
+    def compact(self) -> None:
+        """
+        Dropping deleted rows, alive rows keep their order; values of string columns
+        which no alive row has are dropped from categories too
+        :return: None
+        """
+        rows = np.flatnonzero(self.alive[:self.size])
+        for field in PERSON_FIELDS:
+            used, codes = np.unique(self.codes[field][rows], return_inverse=True)
+            self.categories[field] = [self.categories[field][code] for code in used]
+            self.category_codes[field] = {value: code for code, value in enumerate(self.categories[field])}
+            self.codes[field] = codes.astype(np.int32)
+        self.category_arrays = {}
+        self.ordinals = self.ordinals[rows]
+        self.month_days = self.month_days[rows]
+        self.alive = np.ones(len(rows), dtype=bool)
+        self.keys = [self.keys[row] for row in rows]
+        self.rows = {key: row for row, key in enumerate(self.keys)}
+        self.size = len(rows)
+        self.dead = self.replaced = 0
+
+    def category_mask(self, field: str, test):
+        """
+        Running the test over distinct values of the column and spreading results to rows
+        :param field: str
+        :param test: function
+            takes an array of distinct values, returns a boolean array
+        :return: numpy.ndarray
+        """
+        values = self.category_arrays.get(field)
+        if values is None:
+            values = self.category_arrays[field] = np.array(self.categories[field], dtype=str)
+        if not len(values):
+            return np.zeros(self.size, dtype=bool)
+        return np.asarray(test(values), dtype=bool)[self.codes[field][:self.size]]
+
+    def filter(self, expression: Expression) -> list:
+        """
+        Finding contacts which match the expression
+        :param expression: Expression
+        :return: list
+            keys of contacts in order of the book
+        """
+        rows = np.flatnonzero(expression.mask(self) & self.alive[:self.size])
+        return [self.keys[row] for row in rows]
+
+    def search(self, text: str) -> list:
+        """
+        Finding contacts which contain the text in any field.
+        Contacts matched by name go first, then by phone, email, address, birthday
+        :param text: str
+            searched text, case insensitive
+        :return: list
+            keys of found contacts
+        """
+        rank = np.full(self.size, len(PERSON_FIELDS), dtype=np.int8)
+        for field_rank in reversed(range(len(PERSON_FIELDS))):
+            rank[Column(PERSON_FIELDS[field_rank]).contains(text).mask(self)] = field_rank
+        rows = np.flatnonzero((rank < len(PERSON_FIELDS)) & self.alive[:self.size])
+        rows = rows[np.argsort(rank[rows], kind='stable')]
+        return [self.keys[row] for row in rows]
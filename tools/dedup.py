@@ -0,0 +1,194 @@
+"""
+Finding duplicate files by content.
+Files are grouped by size first, then by the hash of the first block,
+and only files which are still alike are hashed completely.
+Hashes are computed by a pool of threads and cached by inode, size and modification time.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+
+BLOCK_SIZE = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+WORKERS = min(32, (os.cpu_count() or 1) * 4)
+POLICIES = ('report', 'hardlink', 'skip')
+CACHE_NAME = '.file_sort.hashes'
+
+
+def file_key(stat: os.stat_result) -> str:
+    """
+    Key of the file content in the cache: it's changed whenever the file is rewritten
+    :param stat: os.stat_result
+    :return: str
+    """
+    return f'{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def hash_file(path: str, limit: int = None) -> str:
+    """
+    Hashing the file by chunks
+    :param path: str
+    :param limit: int
+        number of first bytes to hash, the whole file by default
+    :return: str
+        hex digest
+    """
+    digest = hashlib.blake2b(digest_size=32)
+    with open(path, 'rb') as file:
+        if limit is not None:
+            digest.update(file.read(limit))
+        else:
+            while chunk := file.read(CHUNK_SIZE):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashCache:
+    """
+    A class is used to keep hashes of files between runs of sorting.
+    ________________________________________________
+
+    Attributes
+    __________
+    path : Path
+        location of the cache in the sorting folder
+    entries : dict
+        file key -> [hash of the first block, hash of the whole file]
+
+    Methods
+    _______
+    get
+        the hash of the first block (index 0) or the whole file (index 1), None if unknown
+    put
+        remembering the hash
+    save
+        writing hashes of files seen by this run
+
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self.path = Path(folder, CACHE_NAME)
+        self.used = {}
+        try:
+            with open(self.path, encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def get(self, key: str, index: int):
+        entry = self.used.get(key) or self.entries.get(key)
+        if entry is None:
+            return None
+        self.used[key] = entry
+        return entry[index]
+
+    def put(self, key: str, index: int, digest: str) -> None:
+        entry = self.used.setdefault(key, list(self.entries.get(key, [None, None])))
+        entry[index] = digest
+
+    def save(self) -> None:
+        """
+        Writing the cache atomically if it's changed, hashes of files not seen by this run are dropped
+        :return: None
+        """
+        if self.used == self.entries:
+            return
+        self.entries, self.used = self.used, {}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.entries, file)
+        os.replace(tmp_path, self.path)
+
+
+def digests(files: List[tuple], index: int, cache: HashCache = None, workers: int = WORKERS) -> Dict[str, str]:
+    """
+    Hashing files in a pool of threads, cached hashes are taken from the cache
+    :param files: list
+        (path, key) tuples
+    :param index: int
+        0 - the first block, 1 - the whole file
+    :param cache: HashCache
+    :param workers: int
+        number of threads
+    :return: dict
+        path -> hex digest, unreadable files are left out
+    """
+    result, missing = {}, []
+    for path, key in files:
+        digest = cache.get(key, index) if cache is not None else None
+        if digest is None:
+            missing.append((path, key))
+        else:
+            result[path] = digest
+    limit = BLOCK_SIZE if index == 0 else None
+    with ThreadPoolExecutor(workers) as executor:
+        futures = [(path, key, executor.submit(hash_file, path, limit)) for path, key in missing]
+        for path, key, future in futures:
+            try:
+                result[path] = future.result()
+            except OSError:
+                continue
+            if cache is not None:
+                cache.put(key, index, result[path])
+    return result
+
+
+def alike(groups, index: int, cache: HashCache = None, workers: int = WORKERS) -> List[list]:
+    """
+    Splitting groups of files by the hash
+    :param groups: iterable
+        lists of (path, key) tuples
+    :param index: int
+        0 - the first block, 1 - the whole file
+    :param cache: HashCache
+    :param workers: int
+    :return: list
+        groups of two and more files with the same hash
+    """
+    groups = [group for group in groups if len(group) > 1]
+    hashed = digests([file for group in groups for file in group], index, cache, workers)
+    result = []
+    for number, group in enumerate(groups):
+        by_digest = {}
+        for path, key in group:
+            if path in hashed:
+                by_digest.setdefault((number, hashed[path]), []).append((path, key))
+        result.extend(same for same in by_digest.values() if len(same) > 1)
+    return result
+
+
+def find_duplicates(paths: List[str], cache: HashCache = None, workers: int = WORKERS) -> Dict[str, str]:
+    """
+    Finding files with the same content.
+    Only files of the same size are hashed, first by the first block, then completely
+    :param paths: list
+        files in order of priority: the first of the same files is the original
+    :param cache: HashCache
+    :param workers: int
+        number of threads hashing files
+    :return: dict
+        duplicate -> original
+    """
+    by_size = {}
+    for path in paths:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        by_size.setdefault(stat.st_size, []).append((path, file_key(stat)))
+    # files of one block are hashed completely by the first block
+    small = alike((group for size, group in by_size.items() if size <= BLOCK_SIZE), 0, cache, workers)
+    large = alike((group for size, group in by_size.items() if size > BLOCK_SIZE), 0, cache, workers)
+    duplicates = {}
+    for group in small + alike(large, 1, cache, workers):
+        original, original_key = group[0]
+        for path, key in group[1:]:
+            # hard links of the original have the same key
+            if key != original_key:
+                duplicates[path] = original
+    return duplicates
@@ -0,0 +1,239 @@
+"""
+Streaming export of contacts and notes to CSV, JSONL and vCard files.
+Records are taken from the storage one by one and written at once,
+so memory doesn't depend on the size of the book.
+"""
+
+import csv
+import json
+from pathlib import Path
+
+
+PERSON_FIELDS = ('name', 'address', 'phone', 'email', 'birthday')
+NOTE_FIELDS = ('date', 'value', 'keywords')
+PLURALS = {'address': 'addresses', 'phone': 'phones', 'email': 'emails'}
+SINGULARS = {plural: field for field, plural in PLURALS.items()}
+VCARD_PROPERTIES = {'name': 'FN', 'address': 'ADR', 'phone': 'TEL', 'email': 'EMAIL', 'birthday': 'BDAY'}
+
+
+def projection(fields, allowed: tuple) -> tuple:
+    """
+    Checking the requested fields
+    :param fields: iterable or None
+        requested fields, None for all
+    :param allowed: tuple
+        all fields of the record
+    :return: tuple
+    :raise ValueError: if a field is unknown
+    """
+    fields = tuple(field.strip().lower() for field in fields or () if field.strip())
+    if not fields:
+        return allowed
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields {', '.join(unknown)}, use {', '.join(allowed)}")
+    return fields
+
+
+def person_columns(fields: tuple) -> tuple:
+    """
+    Columns of exported contacts: the list of all addresses, phones or emails follows the main one
+    :param fields: tuple
+        requested fields
+    :return: tuple
+    """
+    return tuple(column for field in fields for column in (field, PLURALS.get(field)) if column)
+
+
+def person_rows(persons, fields: tuple):
+    """
+    Turning contacts into dicts of the requested fields, "NULL" fields are exported empty.
+    Addresses, phones and emails are given as the main value and the list of all values, see person_columns
+    :param persons: iterable
+    :param fields: tuple
+    :return: generator
+    """
+    for person in persons:
+        row = {}
+        for field in fields:
+            value = person["birthday"].date().isoformat() if field == 'birthday' else person[field]
+            row[field] = '' if value in (None, "NULL") else value
+            if field in PLURALS:
+                row[PLURALS[field]] = list(person.values(field))
+        yield row
+
+
+def note_rows(notes, fields: tuple):
+    """
+    Turning notes into dicts of the requested fields
+    :param notes: iterable
+    :param fields: tuple
+    :return: generator
+    """
+    for note in notes:
+        row = {'date': note.date, 'value': note.value, 'keywords': note.keyWords}
+        yield {field: row[field] for field in fields}
+
+
+def contact_json(person) -> dict:
+    """
+    All fields of the contact as the JSON object, it's used by the HTTP API and JSON lines of commands.
+    All addresses, phones and emails are given as lists besides the main ones
+    :param person: Person
+    :return: dict
+    """
+    return next(person_rows([person], PERSON_FIELDS))
+
+
+def notes_json(notes) -> list:
+    """
+    All fields of notes as JSON objects
+    :param notes: iterable
+    :return: list
+    """
+    return list(note_rows(notes, NOTE_FIELDS))
+
+
+def write_csv(file, rows, fields: tuple) -> int:
+    """
+    Writing rows as CSV with header, keywords are joined with commas,
+    all addresses, phones and emails are put in one cell line by line
+    :param file: file object
+    :param rows: iterable
+        dicts of fields
+    :param fields: tuple
+    :return: int
+        number of written rows
+    """
+    writer = csv.DictWriter(file, fieldnames=fields)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        # rows may be shared with the caller, the copy is changed
+        row = dict(row)
+        if isinstance(row.get('keywords'), list):
+            row['keywords'] = ', '.join(row['keywords'])
+        for plural in PLURALS.values():
+            if plural in row:
+                row[plural] = '\n'.join(row[plural])
+        writer.writerow(row)
+        count += 1
+    return count
+
+
+def write_jsonl(file, rows, fields: tuple) -> int:
+    """
+    Writing rows as JSON lines
+    :param file: file object
+    :param rows: iterable
+        dicts of fields
+    :param fields: tuple
+    :return: int
+        number of written rows
+    """
+    count = 0
+    for row in rows:
+        file.write(json.dumps(row, ensure_ascii=False) + '\n')
+        count += 1
+    return count
+
+
+def vcard_value(text: str) -> str:
+    """
+    Escaping special symbols of vCard values
+    :param text: str
+    :return: str
+    """
+    return text.replace('\\', '\\\\').replace(',', '\\,').replace(';', '\\;').replace('\n', '\\n')
+
+
+def write_vcard(file, rows, fields: tuple) -> int:
+    """
+    Writing rows as vCard 3.0 cards, every address, phone and email is a property of its own,
+    the main one goes first
+    :param file: file object
+    :param rows: iterable
+        dicts of fields
+    :param fields: tuple
+    :return: int
+        number of written rows
+    """
+    count = 0
+    for row in rows:
+        lines = ['BEGIN:VCARD', 'VERSION:3.0']
+        for field, value in row.items():
+            if not value or PLURALS.get(field) in row:
+                continue
+            values = [value]
+            if field in SINGULARS:
+                field, values = SINGULARS[field], value
+            for value in values:
+                if field == 'address':
+                    lines.append(f'ADR:;;{vcard_value(value)};;;;')
+                else:
+                    lines.append(f'{VCARD_PROPERTIES[field]}:{vcard_value(value)}')
+        if 'name' in row:
+            lines.append(f"N:{vcard_value(row['name'])};;;;")
+        lines.append('END:VCARD')
+        file.write('\r\n'.join(lines) + '\r\n')
+        count += 1
+    return count
+
+
+WRITERS = {'.csv': write_csv, '.jsonl': write_jsonl, '.vcf': write_vcard, '.vcard': write_vcard}
+
+
+def writer_for(path: str):
+    """
+    Choosing the writer by the file extension
+    :param path: str
+    :return: function
+    :raise ValueError: if the format is unknown
+    """
+    writer = WRITERS.get(Path(path).suffix.lower())
+    if writer is None:
+        raise ValueError(f"Unknown format of {path}, use one of {', '.join(WRITERS)}")
+    return writer
+
+
+def export_contacts(storage, path: str, fields=None, query: str = None) -> int:
+    """
+    Exporting contacts to CSV, JSONL or vCard file
+    :param storage: Storage
+    :param path: str
+        file with extension .csv, .jsonl, .vcf or .vcard
+    :param fields: iterable
+        fields to export, all by default
+    :param query: str
+        text to filter contacts like the command 'find' does, all contacts by default
+    :return: int
+        number of exported contacts
+    """
+    writer = writer_for(path)
+    fields = projection(fields, PERSON_FIELDS)
+    persons = storage.find_persons(query) if query else storage.persons.values()
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        return writer(file, person_rows(persons, fields), person_columns(fields))
+
+
+def export_notes(storage, path: str, fields=None, query: str = None) -> int:
+    """
+    Exporting notes to CSV or JSONL file
+    :param storage: Storage
+    :param path: str
+        file with extension .csv or .jsonl
+    :param fields: iterable
+        fields to export: date, value, keywords, all by default
+    :param query: str
+        tag, beginning of tag or phrase to filter notes like the command 'search_notes' does,
+        all notes by default
+    :return: int
+        number of exported notes
+    """
+    writer = writer_for(path)
+    if writer is write_vcard:
+        raise ValueError("vCard is available for contacts only")
+    fields = projection(fields, NOTE_FIELDS)
+    notes = storage.iter_found_notes(query) if query else storage.notes.values()
+    with open(path, 'w', newline='', encoding='utf-8') as file:
+        return writer(file, note_rows(notes, fields), fields)
@@ -0,0 +1,182 @@
+"""
+Streaming extraction of zip, tar and gz archives.
+Entries are copied by chunks, so memory doesn't depend on the size of the archive.
+The expanded size is counted while writing: an archive which expands too much
+(e.g. a zip bomb) is stopped and its partial output is removed.
+"""
+
+import gzip
+import os
+from pathlib import Path, PurePosixPath
+import shutil
+import tarfile
+import zipfile
+import zlib
+
+
+CHUNK_SIZE = 1024 * 1024
+MAX_SIZE = 4 * 1024 ** 3
+MAX_RATIO = 100
+RATIO_FLOOR = 16 * 1024 ** 2
+
+
+class Budget:
+    """
+    Counting expanded bytes of the archive against the limit
+    """
+
+    def __init__(self, archive_size: int, max_size: int, max_ratio: float) -> None:
+        self.limit = min(max_size, max(archive_size * max_ratio, RATIO_FLOOR))
+        self.written = 0
+
+    def spend(self, size: int) -> None:
+        self.written += size
+        if self.written > self.limit:
+            raise ValueError(f'expands over {self.limit} bytes, the limit of size or compression ratio')
+
+
+def entry_path(name: str, rename, taken: set) -> PurePosixPath:
+    """
+    Making the safe relative path of the entry: absolute parts and '..' are dropped,
+    names are renamed, the extension of the file is kept, taken paths get a number
+    :param name: str
+        name of the entry in the archive
+    :param rename: function
+        normalizing of names
+    :param taken: set
+        extracted paths, the chosen one is added
+    :return: PurePosixPath or None
+        None for an entry without a name
+    """
+    parts = [part for part in PurePosixPath(name.replace('\\', '/')).parts if part not in ('/', '.', '..')]
+    if not parts:
+        return None
+    stem, suffix = os.path.splitext(parts[-1])
+    folders = [rename(part) for part in parts[:-1]]
+    path = PurePosixPath(*folders, f'{rename(stem)}{suffix}')
+    number = 0
+    while path in taken:
+        number += 1
+        path = PurePosixPath(*folders, f'{rename(stem)}_{number}{suffix}')
+    taken.add(path)
+    return path
+
+
+def copy_entry(stream, path: Path, budget: Budget) -> None:
+    """
+    Copying the entry by chunks
+    :param stream: file object
+    :param path: Path
+    :param budget: Budget
+    :return: None
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as file:
+        while chunk := stream.read(CHUNK_SIZE):
+            budget.spend(len(chunk))
+            file.write(chunk)
+
+
+def zip_name(info: zipfile.ZipInfo) -> str:
+    """
+    Name of the zip entry: names without the UTF-8 flag are decoded by zipfile as cp437,
+    but many archivers write them in UTF-8 anyway
+    :param info: zipfile.ZipInfo
+    :return: str
+    """
+    if info.flag_bits & 0x800:
+        return info.filename
+    try:
+        return info.filename.encode('cp437').decode('utf-8')
+    except UnicodeError:
+        return info.filename
+
+
+def extract_zip(source: str, folder: Path, rename, budget: Budget) -> None:
+    taken = set()
+    with zipfile.ZipFile(source) as archive:
+        # the declared size is checked first, the real one is counted while copying
+        budget.spend(sum(info.file_size for info in archive.infolist()))
+        budget.written = 0
+        for info in archive.infolist():
+            path = None if info.is_dir() else entry_path(zip_name(info), rename, taken)
+            if path is not None:
+                with archive.open(info) as stream:
+                    copy_entry(stream, folder / path, budget)
+
+
+def extract_tar(source: str, folder: Path, rename, budget: Budget, mode: str = 'r|*') -> None:
+    taken = set()
+    with tarfile.open(source, mode) as archive:
+        for member in archive:
+            # links, devices and other special entries are skipped
+            path = entry_path(member.name, rename, taken) if member.isfile() else None
+            if path is not None:
+                copy_entry(archive.extractfile(member), folder / path, budget)
+
+
+def extract_gzip(source: str, folder: Path, rename, budget: Budget) -> None:
+    """
+    Extracting tar.gz, or the single compressed file named after the archive
+    """
+    with gzip.open(source) as stream:
+        try:
+            tarfile.TarInfo.frombuf(stream.read(tarfile.BLOCKSIZE), tarfile.ENCODING, 'surrogateescape')
+        except tarfile.HeaderError:
+            stream.seek(0)
+            copy_entry(stream, folder / entry_path(Path(source).stem, rename, set()), budget)
+            return
+    extract_tar(source, folder, rename, budget, 'r|gz')
+
+
+EXTRACTORS = {'.zip': extract_zip, '.tar': extract_tar, '.gz': extract_gzip}
+
+
+def extract(source: str, target: str, ext: str, rename=str, max_size: int = MAX_SIZE,
+            max_ratio: float = MAX_RATIO) -> None:
+    """
+    Extracting the archive to the folder. Entries are extracted to the temporary folder first,
+    which becomes the target folder, or its entries are added to the existing target folder
+    :param source: str
+        archive location
+    :param target: str
+        folder for extracting
+    :param ext: str
+        extension of the archive: .zip, .tar or .gz
+    :param rename: function
+        normalizing of names of entries
+    :param max_size: int
+        maximal number of expanded bytes
+    :param max_ratio: float
+        maximal ratio of expanded bytes to the size of the archive
+    :return: None
+    :raise ValueError: if the archive expands too much or the format is unknown
+    :raise OSError: if the archive is broken
+    """
+    extractor = EXTRACTORS.get(ext.lower())
+    if extractor is None:
+        raise ValueError(f'Unknown archive format {ext}')
+    part = Path(f'{target}.part')
+    shutil.rmtree(part, ignore_errors=True)
+    part.mkdir(parents=True)
+    budget = Budget(os.path.getsize(source), max_size, max_ratio)
+    try:
+        extractor(source, part, rename, budget)
+    except (zipfile.BadZipFile, tarfile.TarError, EOFError, zlib.error) as error:
+        shutil.rmtree(part, ignore_errors=True)
+        raise OSError(f'broken archive: {error}') from error
+    except BaseException:
+        shutil.rmtree(part, ignore_errors=True)
+        raise
+    if not os.path.exists(target):
+        os.rename(part, target)
+        return
+    for entry in os.listdir(part):
+        new_path = Path(target, entry)
+        stem, suffix = os.path.splitext(entry)
+        number = 0
+        while new_path.exists():
+            number += 1
+            new_path = Path(target, f'{stem}_{number}{suffix}')
+        os.rename(Path(part, entry), new_path)
+    part.rmdir()
@@ -0,0 +1,254 @@
+"""
+Bulk import of contacts from CSV, vCard and JSONL files.
+Records are read as a stream, validated in batches by a pool of processes
+(see validator.validate_many) and written to the storage in one transaction.
+Rejected records are written to the side file with reasons.
+"""
+
+import csv
+import json
+import os
+import re
+from pathlib import Path
+
+from tools import validator
+from tools.exporter import PLURALS
+from tools.lazy import lazy_import
+
+parser = lazy_import('dateutil.parser')
+
+
+FIELDS = ('name', 'address', 'phone', 'email', 'birthday')
+VCARD_FIELDS = {'FN': 'name', 'ADR': 'address', 'TEL': 'phone', 'EMAIL': 'email', 'BDAY': 'birthday'}
+
+
+def read_csv(path: str):
+    """
+    Reading contacts from CSV file with header: name, address, phone, email, birthday[, region]
+    [, addresses, phones, emails], lists of all values are given line by line in one cell
+    :param path: str
+    :return: generator
+        dicts of fields
+    """
+    with open(path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            record = {key.strip().lower(): (value or '').strip() for key, value in row.items() if key}
+            for plural in PLURALS.values():
+                if plural in record:
+                    record[plural] = [value.strip() for value in record[plural].splitlines() if value.strip()]
+            yield record
+
+
+def read_jsonl(path: str):
+    """
+    Reading contacts from JSON lines file, one object with fields per line
+    :param path: str
+    :return: generator
+        dicts of fields
+    """
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            if line.strip():
+                try:
+                    yield {key.lower(): [str(item) for item in value] if isinstance(value, list) else str(value)
+                           for key, value in json.loads(line).items()}
+                except (ValueError, AttributeError):
+                    yield {'line': line.strip(), 'error': 'Invalid JSON'}
+
+
+def unfold_lines(file):
+    """
+    Joining vCard lines which are folded with a leading space or tab
+    :param file: file object
+    :return: generator
+        logical lines
+    """
+    line = None
+    for raw_line in file:
+        raw_line = raw_line.rstrip('\r\n')
+        if raw_line[:1] in (' ', '\t') and line is not None:
+            line += raw_line[1:]
+            continue
+        if line is not None:
+            yield line
+        line = raw_line
+    if line is not None:
+        yield line
+
+
+def read_vcard(path: str):
+    """
+    Reading contacts from vCard file: FN, ADR, TEL, EMAIL and BDAY properties.
+    The first ADR, TEL and EMAIL is the main one, all of them are given as lists
+    :param path: str
+    :return: generator
+        dicts of fields
+    """
+    with open(path, encoding='utf-8') as file:
+        record = None
+        for line in unfold_lines(file):
+            name, _, value = line.partition(':')
+            name = name.split(';')[0].split('.')[-1].upper()
+            if name == 'BEGIN':
+                record = {}
+            elif name == 'END' and record is not None:
+                yield record
+                record = None
+            elif record is not None and name in VCARD_FIELDS:
+                field = VCARD_FIELDS[name]
+                if name == 'ADR':
+                    value = ', '.join(part for part in re.split(r'(?<!\\);', value) if part)
+                value = value.replace('\\,', ',').replace('\\;', ';').strip()
+                if field in PLURALS:
+                    record.setdefault(PLURALS[field], []).append(value)
+                if field not in record:
+                    record[field] = value
+
+
+READERS = {'.csv': read_csv, '.jsonl': read_jsonl, '.vcf': read_vcard, '.vcard': read_vcard}
+
+
+def main_values(record: dict) -> dict:
+    """
+    Taking the main address, phone and email from lists of all values if they aren't given
+    :param record: dict
+    :return: dict
+    """
+    record = dict(record)
+    for field, plural in PLURALS.items():
+        values = [value for value in record.get(plural) or () if value]
+        if not record.get(field) and values:
+            record[field] = values[0]
+    return record
+
+
+def other_values(field: str, values: list, region: str, errors: list) -> list:
+    """
+    Validating other addresses, phones or emails of the contact
+    :param field: str
+        'address', 'phone' or 'email'
+    :param values: list
+    :param region: str
+        ISO country code for phones without own region
+    :param errors: list
+        errors are added to it
+    :return: list
+        valid values, phones in E.164 format
+    """
+    valid = []
+    for value in values:
+        try:
+            if field == 'phone':
+                value = validator.validate_phone(value, region)
+            elif field == 'email':
+                validator.validate_email(value)
+        except ValueError as error:
+            errors.append(str(error))
+            continue
+        valid.append(value)
+    return valid
+
+
+def validate_record(record: dict, region: str = None) -> dict:
+    """
+    Validating fields of the contact like the interactive command 'add' does,
+    empty fields get the same defaults
+    :param record: dict
+        fields of the contact, 'region' is the ISO country code of the phone;
+        'addresses', 'phones' and 'emails' are lists of all values, the main one is the first
+    :param region: str
+        ISO country code for phones without own region
+    :return: dict
+        validated fields, 'addresses', 'phones' and 'emails' are tuples of other values
+    :raise ValueError: with all errors of the record
+    """
+    if 'error' in record:
+        raise ValueError(record['error'])
+    record = main_values(record)
+    errors = []
+    fields = {field: record.get(field, '') for field in FIELDS}
+    try:
+        fields.update(validator.validate_contact(record, region))
+    except ValueError as error:
+        errors.append(str(error))
+    if fields['birthday']:
+        try:
+            fields['birthday'] = parser.parse(fields['birthday']).date().isoformat()
+        except (ValueError, OverflowError):
+            errors.append(f"Invalid birthday: {fields['birthday']!r}")
+    for field, plural in PLURALS.items():
+        others = [value for value in record.get(plural) or () if value and value != record.get(field)]
+        fields[plural] = tuple(other_values(field, others, record.get('region') or region, errors))
+    if errors:
+        raise ValueError('; '.join(errors))
+    fields['address'] = fields['address'] or "NULL"
+    fields['phone'] = fields['phone'] or "NULL"
+    fields['email'] = fields['email'] or "NULL"
+    fields['birthday'] = fields['birthday'] or "1900-01-01"
+    return fields
+
+
+def conflict(storage, fields: dict) -> str:
+    """
+    Checking that all phones and emails of the record don't belong to other contacts
+    :param storage: Storage
+    :param fields: dict
+        validated fields
+    :return: str or None
+        the reason of the conflict, None if there is no conflict
+    """
+    for field in ('phone', 'email'):
+        for value in (fields[field],) + fields[PLURALS[field]]:
+            reason = storage.conflict(fields['name'], **{field: value})
+            if reason:
+                return reason
+    return None
+
+
+def import_file(path: str, storage, person_type, region: str = None, rejects_path: str = None,
+                batch_size: int = 1000, workers: int = None) -> tuple:
+    """
+    Importing contacts from CSV, vCard or JSONL file into the storage in one transaction.
+    Contacts with names, phones or emails already present in the book are rejected like in the command 'add'
+    :param path: str
+        file with extension .csv, .vcf, .vcard or .jsonl
+    :param storage: Storage
+    :param person_type: type
+        class of contacts
+    :param region: str
+        ISO country code for phones without own region
+    :param rejects_path: str
+        JSON lines file for rejected records, '<path>.rejects.jsonl' by default
+    :param batch_size: int
+        number of records validated by a process at once
+    :param workers: int
+        number of processes, all CPUs by default
+    :return: tuple
+        number of imported and rejected contacts
+    """
+    reader = READERS.get(Path(path).suffix.lower())
+    if reader is None:
+        raise ValueError(f"Unknown format of {path}, use one of {', '.join(READERS)}")
+    rejects_path = rejects_path or f'{path}.rejects.jsonl'
+    imported = rejected = 0
+    with open(rejects_path, 'w', encoding='utf-8') as rejects, storage.transaction():
+        results = validator.validate_many(reader(path), validate_record, region, batch_size, workers)
+        for number, (record, fields, error) in enumerate(results, start=1):
+            if fields is not None and fields['name'] in storage.persons:
+                error = "Contact already present"
+            elif fields is not None:
+                error = conflict(storage, fields)
+            if error is not None:
+                rejected += 1
+                rejects.write(json.dumps({'number': number, 'record': record, 'error': error},
+                                         ensure_ascii=False) + '\n')
+                continue
+            person = person_type(*(fields[field] for field in FIELDS))
+            for field, plural in PLURALS.items():
+                if fields[plural]:
+                    person.set_value(field, (fields[field],) + fields[plural])
+            storage.put_person(fields['name'], person)
+            imported += 1
+    if not rejected:
+        os.remove(rejects_path)
+    return imported, rejected
@@ -0,0 +1,686 @@
+"""
+In-memory indexes of the address book & diary.
+Indexes are kept in sync with the storage on every change,
+so searching doesn't scan all records.
+"""
+
+import re
+from bisect import bisect_left, insort
+from datetime import date
+from itertools import count
+
+
+PERSON_FIELDS = ('name', 'phone', 'email', 'address', 'birthday')
+COMPLETE_LIMIT = 20
+TYPO_MIN_LENGTH = 3
+NOT_PHONE = re.compile(r'[^\d+]')
+
+
+def person_fields(person) -> tuple:
+    """
+    Getting lowercased searchable fields of the contact in order of their rank
+    :param person: Person
+    :return: tuple
+    """
+    extra = person["extra"] or {}
+    return tuple(
+        str(person["birthday"].date() if field == 'birthday' else person[field]).lower()
+        + ''.join('\n' + value.lower() for value in extra.get(field, ()))
+        for field in PERSON_FIELDS
+    )
+
+
+def trigrams(text: str) -> set:
+    """
+    Splitting the text into overlapping 3-symbol grams
+    :param text: str
+    :return: set
+    """
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TokenIndex:
+    """
+    A class is used to find contacts by a substring of any field.
+    ________________________________________________
+
+    Attributes
+    __________
+    postings : dict
+        trigram -> set of keys of contacts which contain it
+    fields : dict
+        key -> lowercased fields of the contact
+    order : dict
+        key -> number of adding, to keep the order of the book
+
+    Methods
+    _______
+    add
+        indexing the contact, replacing the old fields if the key is indexed
+    discard
+        removing the contact from the index
+    clear
+        removing all contacts
+    search
+        finding keys of contacts ranked by the field which matches
+
+    """
+
+    def __init__(self, items=()) -> None:
+        self.postings = {}
+        self.fields = {}
+        self.order = {}
+        self.counter = count()
+        for key, person in items:
+            self.add(key, person)
+
+    def add(self, key, person) -> None:
+        self.discard(key)
+        fields = person_fields(person)
+        self.fields[key] = fields
+        self.order[key] = next(self.counter)
+        for gram in set().union(*(trigrams(field) for field in fields)):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def discard(self, key) -> None:
+        fields = self.fields.pop(key, None)
+        if fields is None:
+            return
+        del self.order[key]
+        for gram in set().union(*(trigrams(field) for field in fields)):
+            keys = self.postings[gram]
+            keys.discard(key)
+            if not keys:
+                del self.postings[gram]
+
+    def clear(self) -> None:
+        self.postings = {}
+        self.fields = {}
+        self.order = {}
+
+    def candidates(self, text: str) -> set:
+        """
+        Collecting keys which may contain the text.
+        Texts shorter than a trigram are checked against all contacts
+        :param text: str
+            lowercased text
+        :return: set
+        """
+        if len(text) < 3:
+            return set(self.fields)
+        postings = sorted((self.postings.get(gram, set()) for gram in trigrams(text)), key=len)
+        return set(postings[0]).intersection(*postings[1:])
+
+    def search(self, text: str) -> list:
+        """
+        Finding contacts which contain the text in any field.
+        Contacts matched by name go first, then by phone, email, address, birthday
+        :param text: str
+            searched text, case insensitive
+        :return: list
+            keys of found contacts
+        """
+        text = text.lower()
+        ranked = []
+        for key in self.candidates(text):
+            for rank, field in enumerate(self.fields[key]):
+                if text in field:
+                    ranked.append((rank, self.order[key], key))
+                    break
+        return [key for _, _, key in sorted(ranked)]
+
+
+def phone_value(phone) -> str:
+    """
+    Value of the phone in the index: phones are kept in E.164 format by validator.validate_phone,
+    other symbols of old records are dropped
+    :param phone: str
+    :return: str or None
+        None if the contact has no phone
+    """
+    if not phone or phone == "NULL":
+        return None
+    return NOT_PHONE.sub('', str(phone)) or None
+
+
+def email_value(email) -> str:
+    """
+    Value of the email in the index
+    :param email: str
+    :return: str or None
+        None if the contact has no email
+    """
+    if not email or email == "NULL":
+        return None
+    return str(email).strip().lower() or None
+
+
+UNIQUE_FIELDS = {'phone': phone_value, 'email': email_value}
+
+
+class UniqueIndex:
+    """
+    A class is used to find contacts by the phone or the email at once.
+    Every phone or email of the contact is indexed.
+    New contacts are checked against it, so a phone or an email belongs to one contact;
+    duplicates of old books are kept in it and reported.
+    ________________________________________________
+
+    Attributes
+    __________
+    field : str
+        'phone' or 'email'
+    keys : dict
+        value -> key of the contact, or list of keys if the value is duplicated
+    values : dict
+        key -> tuple of indexed values of the contact
+
+    Methods
+    _______
+    add
+        indexing the contact, replacing the old value if the key is indexed
+    discard
+        removing the contact from the index
+    clear
+        removing all contacts
+    get
+        finding keys of contacts by the value
+    duplicates
+        lists of keys of contacts which share a value
+
+    """
+
+    def __init__(self, field: str, items=()) -> None:
+        self.field = field
+        self.normalize = UNIQUE_FIELDS[field]
+        self.keys = {}
+        self.values = {}
+        for key, person in items:
+            self.add(key, person)
+
+    def add(self, key, person) -> None:
+        self.discard(key)
+        values = tuple(dict.fromkeys(
+            value for value in map(self.normalize, person.values(self.field)) if value is not None))
+        if not values:
+            return
+        self.values[key] = values
+        for value in values:
+            owner = self.keys.setdefault(value, key)
+            if owner is key:
+                continue
+            if isinstance(owner, list):
+                owner.append(key)
+            else:
+                self.keys[value] = [owner, key]
+
+    def discard(self, key) -> None:
+        for value in self.values.pop(key, ()):
+            owner = self.keys[value]
+            if not isinstance(owner, list):
+                del self.keys[value]
+                continue
+            owner.remove(key)
+            if len(owner) == 1:
+                self.keys[value] = owner[0]
+
+    def clear(self) -> None:
+        self.keys = {}
+        self.values = {}
+
+    def get(self, value) -> list:
+        """
+        Finding contacts by the value
+        :param value: str
+            phone or email, it's normalized like indexed values
+        :return: list
+            keys of contacts in order of adding
+        """
+        owner = self.keys.get(self.normalize(value))
+        if owner is None:
+            return []
+        return list(owner) if isinstance(owner, list) else [owner]
+
+    def duplicates(self):
+        """
+        Finding values which are shared by contacts
+        :return: generator
+            (value, list of keys) tuples
+        """
+        for value, owner in self.keys.items():
+            if isinstance(owner, list):
+                yield value, list(owner)
+
+
+def group_duplicates(shared) -> list:
+    """
+    Joining contacts which share any value into groups, e.g. A and B share the phone,
+    B and C share the email: A, B and C are one group. Groups are joined by union-find,
+    so the time is nearly linear in the number of shared values
+    :param shared: iterable
+        lists of keys of contacts which share a value
+    :return: list
+        groups of keys in order of the first key
+    """
+    parent = {}
+
+    def root(key):
+        parent.setdefault(key, key)
+        while parent[key] != key:
+            parent[key] = parent[parent[key]]
+            key = parent[key]
+        return key
+
+    order = {}
+    for keys in shared:
+        first = root(keys[0])
+        order.setdefault(keys[0], len(order))
+        for key in keys[1:]:
+            order.setdefault(key, len(order))
+            other = root(key)
+            if other != first:
+                parent[other] = first
+    groups = {}
+    for key in sorted(order, key=order.get):
+        groups.setdefault(root(key), []).append(key)
+    return list(groups.values())
+
+
+class NoteIndex:
+    """
+    A class is used to find notes by tags and by a substring of the text.
+    ________________________________________________
+
+    Attributes
+    __________
+    tags : dict
+        tag -> set of keys of notes which have it
+    sorted_tags : list
+        all tags in sorted order, for completion
+    tag_grams : dict
+        trigram -> set of tags which contain it
+    postings : dict
+        trigram -> set of keys of notes which contain it in the text
+    notes : dict
+        key -> (tags, lowercased text) of the note
+
+    Methods
+    _______
+    add
+        indexing the note, replacing the old one if the key is indexed
+    discard
+        removing the note from the index
+    clear
+        removing all notes
+    with_tag
+        finding notes by the exact tag
+    with_tag_part
+        finding notes by a part of a tag
+    with_phrase
+        finding notes which contain the phrase
+    complete_tag
+        finding tags by the beginning, one typo is forgiven
+
+    """
+
+    def __init__(self, items=()) -> None:
+        self.tags = {}
+        self.sorted_tags = []
+        self.tag_grams = {}
+        self.postings = {}
+        self.notes = {}
+        for key, note in items:
+            self.add(key, note)
+
+    def add(self, key, note) -> None:
+        self.discard(key)
+        tags = tuple(note.keyWords)
+        text = note.value.lower()
+        self.notes[key] = (tags, text)
+        for tag in tags:
+            if tag not in self.tags:
+                self.tags[tag] = set()
+                insort(self.sorted_tags, tag)
+                for gram in trigrams(tag):
+                    self.tag_grams.setdefault(gram, set()).add(tag)
+            self.tags[tag].add(key)
+        for gram in trigrams(text):
+            self.postings.setdefault(gram, set()).add(key)
+
+    def discard(self, key) -> None:
+        indexed = self.notes.pop(key, None)
+        if indexed is None:
+            return
+        tags, text = indexed
+        for tag in tags:
+            keys = self.tags.get(tag)
+            if keys is None:
+                continue
+            keys.discard(key)
+            if not keys:
+                del self.tags[tag]
+                del self.sorted_tags[bisect_left(self.sorted_tags, tag)]
+                self._discard_grams(self.tag_grams, trigrams(tag), tag)
+        self._discard_grams(self.postings, trigrams(text), key)
+
+    @staticmethod
+    def _discard_grams(postings: dict, grams: set, value) -> None:
+        for gram in grams:
+            values = postings.get(gram)
+            if values is None:
+                continue
+            values.discard(value)
+            if not values:
+                del postings[gram]
+
+    def clear(self) -> None:
+        self.tags = {}
+        self.sorted_tags = []
+        self.tag_grams = {}
+        self.postings = {}
+        self.notes = {}
+
+    def with_tag(self, tag: str) -> list:
+        """
+        Finding notes which have the tag
+        :param tag: str
+            exact tag
+        :return: list
+            sorted keys of notes
+        """
+        return sorted(self.tags.get(tag, ()))
+
+    def with_tag_part(self, part: str) -> list:
+        """
+        Finding notes which have a tag containing the part, e.g. 'hop' finds the tag 'shop'
+        :param part: str
+            beginning, middle or end of the tag
+        :return: list
+            sorted keys of notes
+        """
+        keys = set()
+        for tag in self._candidates(self.tag_grams, self.tags, part):
+            if part in tag:
+                keys |= self.tags[tag]
+        return sorted(keys)
+
+    def complete_tag(self, prefix: str, limit: int = COMPLETE_LIMIT) -> list:
+        """
+        Finding tags which begin with the prefix, or with the prefix with one typo
+        :param prefix: str
+        :param limit: int
+        :return: list
+            tags
+        """
+        return complete(self.sorted_tags, prefix, limit)
+
+    @staticmethod
+    def _candidates(postings: dict, everything, text: str):
+        """
+        Values which may contain the text, like TokenIndex.candidates.
+        Texts shorter than a trigram are checked against everything
+        """
+        if len(text) < 3:
+            return everything
+        found = sorted((postings.get(gram, set()) for gram in trigrams(text)), key=len)
+        return set(found[0]).intersection(*found[1:])
+
+    def with_phrase(self, phrase: str) -> list:
+        """
+        Finding notes which contain the phrase anywhere in the text, also inside words, case insensitive.
+        Candidates are found by trigrams of the phrase and checked against the text
+        :param phrase: str
+            searched text
+        :return: list
+            sorted keys of notes
+        """
+        phrase = phrase.lower()
+        return sorted(key for key in self._candidates(self.postings, self.notes, phrase) if phrase in self.notes[key][1])
+
+
+def next_symbols(sorted_values: list, stem: str, key=None):
+    """
+    Finding symbols which follow the stem in the sorted values, like children of the node of a trie:
+    values with the same next symbol are jumped over by bisection
+    :param sorted_values: list
+    :param stem: str
+        beginning in terms of the key
+    :param key: function
+        the key which the list is sorted by
+    :return: generator
+        symbols in sorted order
+    """
+    position = bisect_left(sorted_values, stem, key=key)
+    size = len(stem)
+    while position < len(sorted_values):
+        value = key(sorted_values[position]) if key else sorted_values[position]
+        if not value.startswith(stem):
+            break
+        if len(value) == size:
+            position += 1
+            continue
+        symbol = value[size]
+        yield symbol
+        position = bisect_left(sorted_values, stem + chr(ord(symbol) + 1), position, key=key)
+
+
+def typo_variants(prefix: str, symbols) -> list:
+    """
+    Making beginnings at the edit distance 1 from the prefix: a symbol swapped with the next one,
+    replaced, deleted or inserted. Only symbols which follow the beginning in the values
+    are replaced or inserted, so variants which can't match are not made
+    :param prefix: str
+        prefix in terms of the key
+    :param symbols: function
+        stem -> symbols which follow the stem in the values, like next_symbols
+    :return: list
+        variants without repeats, swaps and replacements first
+    """
+    variants = [prefix[:i] + prefix[i + 1] + prefix[i] + prefix[i + 2:] for i in range(len(prefix) - 1)]
+    for i in range(len(prefix)):
+        variants.extend(prefix[:i] + symbol + prefix[i + 1:] for symbol in symbols(prefix[:i]) if symbol != prefix[i])
+    variants.extend(prefix[:i] + prefix[i + 1:] for i in range(len(prefix)))
+    for i in range(len(prefix) + 1):
+        variants.extend(prefix[:i] + symbol + prefix[i:] for symbol in symbols(prefix[:i]))
+    return [variant for variant in dict.fromkeys(variants) if variant and variant != prefix]
+
+
+def with_prefix(sorted_values: list, prefix: str, limit: int, key=None) -> list:
+    """
+    Taking values which begin with the prefix from the sorted list
+    :param sorted_values: list
+    :param prefix: str
+        prefix in terms of the key
+    :param limit: int
+    :param key: function
+        the key which the list is sorted by, e.g. str.lower
+    :return: list
+    """
+    found = []
+    for position in range(bisect_left(sorted_values, prefix, key=key), len(sorted_values)):
+        value = sorted_values[position]
+        if len(found) == limit or not (key(value) if key else value).startswith(prefix):
+            break
+        found.append(value)
+    return found
+
+
+def complete(sorted_values: list, prefix: str, limit: int = COMPLETE_LIMIT, key=None) -> list:
+    """
+    Completing the prefix by the sorted list.
+    Values beginning with the prefix go first; if they are fewer than the limit, values beginning
+    with the prefix with one typo are added. Variants of the prefix are looked up by bisection,
+    so the time depends on the length of the prefix, not on the number of values
+    :param sorted_values: list
+    :param prefix: str
+        prefix in terms of the key
+    :param limit: int
+        maximal number of values
+    :param key: function
+        the key which the list is sorted by
+    :return: list
+    """
+    return complete_by(prefix, limit, lambda stem, count: with_prefix(sorted_values, stem, count, key),
+                       lambda stem: next_symbols(sorted_values, stem, key))
+
+
+def complete_by(prefix: str, limit: int, starting, symbols) -> list:
+    """
+    Completing the prefix by values kept anywhere sorted, e.g. in the index of the database
+    :param prefix: str
+        prefix in terms of the key
+    :param limit: int
+        maximal number of values
+    :param starting: function
+        (prefix, limit) -> values which begin with the prefix, like with_prefix
+    :param symbols: function
+        stem -> symbols which follow the stem in the values, like next_symbols
+    :return: list
+    """
+    found = starting(prefix, limit)
+    if len(found) == limit or len(prefix) < TYPO_MIN_LENGTH:
+        return found
+    seen = set(found)
+    for variant in typo_variants(prefix, symbols):
+        for value in starting(variant, limit):
+            if value not in seen:
+                seen.add(value)
+                found.append(value)
+                if len(found) == limit:
+                    return found
+    return found
+
+
+class NameIndex:
+    """
+    A class is used to complete names of contacts by the beginning, one typo is forgiven.
+    Names are kept in one list sorted case insensitively, so searching by the beginning is a bisection.
+    ________________________________________________
+
+    Attributes
+    __________
+    names : list
+        keys of contacts sorted by lowercased names
+
+    Methods
+    _______
+    add
+        indexing the contact if it isn't indexed
+    discard
+        removing the contact from the index
+    clear
+        removing all contacts
+    complete
+        finding names by the beginning, case insensitive
+
+    """
+
+    def __init__(self, keys=()) -> None:
+        self.names = sorted(keys, key=str.lower)
+
+    def position(self, key):
+        """
+        Finding the position of the name in the list
+        :param key: str
+        :return: int or None
+            None if the name isn't indexed
+        """
+        lowered = key.lower()
+        for position in range(bisect_left(self.names, lowered, key=str.lower), len(self.names)):
+            name = self.names[position]
+            if name == key:
+                return position
+            if name.lower() != lowered:
+                break
+        return None
+
+    def add(self, key, person) -> None:
+        if self.position(key) is None:
+            insort(self.names, key, key=str.lower)
+
+    def discard(self, key) -> None:
+        position = self.position(key)
+        if position is not None:
+            del self.names[position]
+
+    def clear(self) -> None:
+        self.names = []
+
+    def complete(self, prefix: str, limit: int = COMPLETE_LIMIT) -> list:
+        """
+        Finding names which begin with the prefix, or with the prefix with one typo
+        :param prefix: str
+            beginning of the name, case insensitive
+        :param limit: int
+        :return: list
+            names
+        """
+        return complete(self.names, prefix.lower(), limit, str.lower)
+
+
+def day_of_year(month: int, day: int) -> int:
+    """
+    Getting the number of the day in a leap year, from 0 to 365, so 29 February has its own slot
+    :param month: int
+    :param day: int
+    :return: int
+    """
+    return date(2000, month, day).timetuple().tm_yday - 1
+
+
+class BirthdayIndex:
+    """
+    A class is used to find contacts by days of birthdays.
+    ________________________________________________
+
+    Attributes
+    __________
+    buckets : list
+        366 buckets of a leap year, each bucket keeps keys of contacts in order of adding
+    slots : dict
+        key -> number of the bucket of the contact
+
+    Methods
+    _______
+    add
+        indexing the contact, replacing the old birthday if the key is indexed
+    discard
+        removing the contact from the index
+    clear
+        removing all contacts
+    keys_on
+        finding keys of contacts which have birthday on the day
+
+    """
+
+    def __init__(self, items=()) -> None:
+        self.buckets = [{} for _ in range(366)]
+        self.slots = {}
+        for key, person in items:
+            self.add(key, person)
+
+    def add(self, key, person) -> None:
+        self.discard(key)
+        birthday = person["birthday"]
+        slot = day_of_year(birthday.month, birthday.day)
+        self.slots[key] = slot
+        self.buckets[slot][key] = None
+
+    def discard(self, key) -> None:
+        slot = self.slots.pop(key, None)
+        if slot is not None:
+            del self.buckets[slot][key]
+
+    def clear(self) -> None:
+        self.buckets = [{} for _ in range(366)]
+        self.slots = {}
+
+    def keys_on(self, month: int, day: int):
+        """
+        Finding contacts which have birthday on the day
+        :param month: int
+        :param day: int
+        :return: iterable
+            keys of contacts in order of adding
+        """
+        return self.buckets[day_of_year(month, day)].keys()
@@ -0,0 +1,245 @@
+"""
+Append-only journal for the address book & diary.
+Every change is appended to the log file and flushed to the disk.
+The whole book is rewritten into the snapshot only during compaction.
+"""
+
+import io
+import os
+import pickle
+from pathlib import Path
+
+
+# contacts and notes were pickled by old versions as '__main__.<name>' when the book was started by py main.py,
+# now they live in the module tools.records
+RECORDS_MODULE = 'tools.records'
+RECORD_CLASSES = ('Person', 'Note')
+OLD_MODULES = ('__main__', 'main')
+
+
+class RecordUnpickler(pickle.Unpickler):
+    """
+    Unpickler of records, contacts and notes pickled under old modules are taken from tools.records
+    """
+
+    def find_class(self, module: str, name: str):
+        if module in OLD_MODULES and name in RECORD_CLASSES:
+            module = RECORDS_MODULE
+        return super().find_class(module, name)
+
+
+def load(file):
+    """
+    Reading one pickled record from the file
+    :param file: file object
+    :return: object
+    """
+    return RecordUnpickler(file).load()
+
+
+def loads(data: bytes):
+    """
+    Decoding one pickled record, the usual pickle.loads is tried first as it's faster
+    :param data: bytes
+    :return: object
+    """
+    try:
+        return pickle.loads(data)
+    except (AttributeError, ImportError):
+        return load(io.BytesIO(data))
+
+
+def apply_record(data: dict, record: tuple) -> None:
+    """
+    Applying one journal record to the loaded data
+    :param data: dict
+        sections of the book, e.g. {"persons": {...}, "notes": {...}}
+    :param record: tuple
+        ('put', section, key, value) | ('pop', section, key) | ('clear', section)
+        | ('patch', section, key, changed fields, seconds since the epoch)
+    :return: None
+    """
+    operation, section, *args = record
+    if operation == 'put':
+        key, value = args
+        data[section][key] = value
+    elif operation == 'patch':
+        key, changes, when = args
+        value = data[section][key]
+        value.apply(changes, when)
+        # the snapshot table decodes the record on access, the changed one is put back
+        data[section][key] = value
+    elif operation == 'pop':
+        data[section].pop(args[0], None)
+    elif operation == 'clear':
+        data[section].clear()
+
+
+def write_snapshot(path: str, data: dict) -> None:
+    """
+    Writing the whole book atomically: to the temporary file first, then renaming it
+    :param path: str
+        snapshot location
+    :param data: dict
+        sections of the book
+    :return: None
+    """
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as db:
+        pickle.dump(data, db)
+        db.flush()
+        os.fsync(db.fileno())
+    os.replace(tmp_path, path)
+
+
+class Journal:
+    """
+    A class is used to keep the log of changes next to the snapshot.
+    ________________________________________________
+
+    Attributes
+    __________
+    path : str
+        location of the log file
+    rotated_path : str
+        location of the log renamed during the background compaction
+    compact_every : int
+        number of records after which the log is compacted into the snapshot
+    records : int
+        number of records in the log
+    sync : bool
+        if False, appended records are not flushed to the disk until flush is called
+
+    Methods
+    _______
+    replay
+        reading all complete records from the log
+    append
+        adding a record to the log
+    flush
+        flushing appended records to the disk
+    truncate
+        emptying the log after compaction
+    rotate
+        starting the new log before the background compaction
+
+    """
+
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        self.path = path
+        self.rotated_path = f'{path}.1'
+        self.compact_every = compact_every
+        self.records = 0
+        self.sync = True
+        self.file = None
+
+    def replay(self):
+        """
+        Reading records from the rotated log (left by an interrupted background compaction)
+        and from the log
+        :return: generator
+            records in the order of writing
+        """
+        yield from self.replay_file(self.rotated_path)
+        for record in self.replay_file(self.path):
+            self.records += 1
+            yield record
+
+    @staticmethod
+    def replay_file(path: str):
+        """
+        Reading records from the log file. A torn record at the tail
+        (left by a crash in the middle of writing) is cut off
+        :param path: str
+        :return: generator
+            records in the order of writing
+        :raise pickle.UnpicklingError: if a record in the middle of the log is broken
+        :raise AttributeError: if the class of a record can't be found; the log is left as it is
+        """
+        if not os.path.exists(path):
+            return
+        size = Path(path).stat().st_size
+        good_offset = 0
+        with open(path, 'rb') as log:
+            while True:
+                try:
+                    record = load(log)
+                except EOFError:
+                    break
+                except pickle.UnpicklingError:
+                    # only the last record can be torn, it's read up to the end of the file
+                    if log.tell() < size:
+                        raise
+                    break
+                good_offset = log.tell()
+                yield record
+        if good_offset != size:
+            os.truncate(path, good_offset)
+
+    def append(self, *record) -> None:
+        """
+        Adding a record to the log and flushing it to the disk
+        :param record: tuple
+            journal record, see apply_record
+        :return: None
+        """
+        if self.file is None:
+            self.file = open(self.path, 'ab')
+        pickle.dump(record, self.file)
+        self.records += 1
+        if self.sync:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Flushing appended records to the disk
+        :return: None
+        """
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def needs_compaction(self) -> bool:
+        """
+        Checking whether the log has grown enough to be compacted
+        :return: bool
+        """
+        return self.records >= self.compact_every
+
+    def truncate(self) -> None:
+        """
+        Emptying the log after its records were written into the snapshot
+        :return: None
+        """
+        self.close()
+        with open(self.path, 'wb') as log:
+            os.fsync(log.fileno())
+        self.records = 0
+
+    def rotate(self) -> None:
+        """
+        Renaming the log before the background compaction, next records go to the new log.
+        Records of the rotated log are in the snapshot being written, so it's removed after writing
+        :return: None
+        """
+        self.close()
+        if os.path.exists(self.path):
+            os.replace(self.path, self.rotated_path)
+        self.records = 0
+
+    def has_rotated(self) -> bool:
+        return os.path.exists(self.rotated_path)
+
+    def remove_rotated(self) -> None:
+        if os.path.exists(self.rotated_path):
+            os.remove(self.rotated_path)
+
+    def close(self) -> None:
+        """
+        Closing the log file
+        :return: None
+        """
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
@@ -0,0 +1,75 @@
+"""
+Lazy imports of heavy packages.
+The module is imported on the first use of its attribute, not when the importing module is loaded,
+so the address book starts without waiting for rich, dateutil, phonenumbers, prompt_toolkit or numpy
+and only the command which needs them pays for their import.
+
+Example:
+    parser = lazy_import('dateutil.parser')
+    parser.parse('1990-01-01')  # dateutil is imported here
+"""
+
+import importlib
+import importlib.util
+import threading
+
+
+class LazyModule:
+    """
+    A class is used to stand for the module until it's used.
+    Its own attributes are name-mangled, so every attribute of the module is reached through it.
+    ________________________________________________
+
+    Attributes
+    __________
+    __name : str
+        full name of the module
+    __module : module
+        the imported module, None until the first use
+
+    Methods
+    _______
+    __load
+        importing the module once, importing is safe from many threads
+
+    """
+
+    def __init__(self, name: str) -> None:
+        self.__dict__['_LazyModule__name'] = name
+        self.__dict__['_LazyModule__module'] = None
+        self.__dict__['_LazyModule__lock'] = threading.Lock()
+
+    def __load(self):
+        if self.__module is None:
+            with self.__lock:
+                if self.__module is None:
+                    self.__dict__['_LazyModule__module'] = importlib.import_module(self.__name)
+        return self.__module
+
+    def __getattr__(self, attribute: str):
+        return getattr(self.__load(), attribute)
+
+    def __setattr__(self, attribute: str, value) -> None:
+        setattr(self.__load(), attribute, value)
+
+    def __repr__(self) -> str:
+        return f"<lazy module '{self.__name}', {'loaded' if self.__module is not None else 'not loaded'}>"
+
+
+def lazy_import(name: str, optional: bool = False):
+    """
+    Making the module which is imported on the first use
+    :param name: str
+        full name of the module, e.g. 'rich.console'
+    :param optional: bool
+        True if the package may be not installed
+    :return: LazyModule or None
+        None if the optional package isn't installed
+    """
+    if optional:
+        try:
+            if importlib.util.find_spec(name.partition('.')[0]) is None:
+                return None
+        except ValueError:
+            return None
+    return LazyModule(name)
@@ -0,0 +1,128 @@
+"""
+Paged output of big tables.
+Rows are taken from an iterator one page at a time, column widths are calculated
+once by the first page, so the first rows are shown at once whatever the size of the book.
+Output to a terminal is drawn with rich page by page with navigation,
+other output (pipe, file) gets plain text lines. A cell can have several lines,
+e.g. all phones of the contact.
+"""
+
+from itertools import islice, zip_longest
+
+from rich.console import Console
+from rich.table import Table
+from rich.text import Text
+
+
+PAGE_SIZE = 20
+MAX_WIDTH = 40
+
+
+class Pager:
+    """
+    A class is used to show rows of a table by pages.
+    ________________________________________________
+
+    Attributes
+    __________
+    columns : list
+        (title, minimal width) tuples
+    rows : iterator
+        rows of the table, tuples of strings, a string may have several lines
+    page_size : int
+        number of rows in the page
+    widths : list
+        widths of columns, calculated by the first page
+
+    Methods
+    _______
+    pages
+        taking rows from the iterator page by page
+    show
+        printing pages to the terminal with navigation, or all pages as plain text
+
+    """
+
+    def __init__(self, columns: list, rows, page_size: int = PAGE_SIZE, console: Console = None) -> None:
+        self.columns = columns
+        self.rows = iter(rows)
+        self.page_size = page_size
+        self.console = console or Console()
+        self.widths = None
+
+    def pages(self):
+        """
+        Taking rows from the iterator page by page
+        :return: generator
+            lists of rows
+        """
+        while page := list(islice(self.rows, self.page_size)):
+            if self.widths is None:
+                self.widths = [
+                    min(max([min_width, len(title)] + [len(line) for row in page for line in row[number].split('\n')]),
+                        max(min_width, MAX_WIDTH))
+                    for number, (title, min_width) in enumerate(self.columns)
+                ]
+            yield page
+
+    def render(self, page: list, title: str = None) -> None:
+        """
+        Printing the page as a formatted table, cells are not parsed as markup
+        :param page: list
+        :param title: str
+        :return: None
+        """
+        table = Table(show_header=True, header_style="bold blue", show_lines=True, title=title)
+        for number, (column, _) in enumerate(self.columns):
+            table.add_column(column, width=self.widths[number], justify="center",
+                             style="dim" if number == 0 else "cyan")
+        for row in page:
+            table.add_row(*(Text(cell) for cell in row))
+        self.console.print(table)
+
+    def render_plain(self, page: list, header: bool = False) -> None:
+        """
+        Printing the page as plain text lines
+        :param page: list
+        :param header: bool
+            if True, the line with titles of columns is printed first
+        :return: None
+        """
+        lines = []
+        if header:
+            lines.append(' | '.join(title.ljust(width) for (title, _), width in zip(self.columns, self.widths)))
+        for row in page:
+            for cells in zip_longest(*(cell.split('\n') for cell in row), fillvalue=''):
+                lines.append(' | '.join(cell.ljust(width) for cell, width in zip(cells, self.widths)))
+        self.console.file.write('\n'.join(lines) + '\n')
+
+    def show(self) -> int:
+        """
+        Printing the table. In the terminal pages are shown one by one:
+        Enter - next page, p - previous page, q - quit
+        :return: int
+            number of shown rows
+        """
+        pages = self.pages()
+        if not self.console.is_terminal:
+            shown = 0
+            for number, page in enumerate(pages):
+                self.render_plain(page, header=number == 0)
+                shown += len(page)
+            return shown
+        visited = []
+        number = 0
+        while True:
+            if number == len(visited):
+                page = next(pages, None)
+                if page is None:
+                    break
+                visited.append(page)
+            self.render(visited[number], title=f"page {number + 1}")
+            if len(visited[number]) < self.page_size:
+                break
+            choice = input("Enter - next page, p - previous page, q - quit: ").strip().lower()
+            if choice == 'q':
+                break
+            number = max(number - 1, 0) if choice == 'p' else number + 1
+        return sum(len(page) for page in visited)
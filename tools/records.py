@@ -0,0 +1,301 @@
+"""
+Records of the address book & diary: contacts and notes.
+They live in their own module, so they are pickled by the same module path
+whether the book is started by py main.py or imported.
+"""
+
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from tools.lazy import lazy_import
+
+parser = lazy_import('dateutil.parser')
+rich_console = lazy_import('rich.console')
+rich_table = lazy_import('rich.table')
+
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+MULTI_FIELDS = ('address', 'phone', 'email')
+HISTORY_LIMIT = 100
+
+
+@lru_cache(maxsize=None)
+def console():
+    """
+    The console of rich, it's made by the first printing of a table
+    :return: rich.console.Console
+    """
+    return rich_console.Console()
+
+
+class Person:
+    """
+    A class is used to create fields to address book.
+    ________________________________________________
+
+    Attributes
+    __________
+    name : str
+        name of the contact
+    address : str
+        address of the contact
+    phone : str
+        phone of the contact
+    email : str
+        email of the contact
+    birthday : datetime
+        birthday of the contact, kept as the number of the day (date.toordinal)
+    extra : dict
+        more addresses, phones and emails: field -> tuple of values, None if the contact has one of each
+    history : tuple
+        (seconds since the epoch, field, old value) entries of changes, None if the contact wasn't changed
+
+    Methods
+    _______
+    print_tab
+        used to show info about the contact as a table
+    values
+        all values of the address, the phone or the email, the main one first
+    apply
+        changing fields, old values go to the history
+    value_at
+        the value of the field at the moment in the past
+
+    """
+
+    __slots__ = ('name', 'address', 'phone', 'email', '_birthday', 'extra', 'history')
+
+    def __init__(self, name: str = None, address: str = None, phone: str = None, email: str = None, birthday: str = None):
+        """
+        Creating fields of the address book
+        :param name: str
+            name of the contact
+        :param address: str
+            address of the contact
+        :param phone: str
+            phone of the contact
+        :param email: str
+            email of the contact
+        :param birthday: str
+            birthday of the contact
+        """
+        self.name = name
+        self.address = address
+        self.phone = phone
+        self.email = email
+        self.birthday = parser.parse(birthday)
+        self.extra = None
+        self.history = None
+
+    @property
+    def birthday(self) -> datetime:
+        return datetime.fromordinal(self._birthday)
+
+    @birthday.setter
+    def birthday(self, value: datetime) -> None:
+        self._birthday = value.toordinal()
+
+    def __getitem__(self, i):
+        return getattr(self, i)
+
+    def __getstate__(self):
+        if self.extra is None and self.history is None:
+            return self.name, self.address, self.phone, self.email, self._birthday
+        return self.name, self.address, self.phone, self.email, self._birthday, self.extra, self.history
+
+    def __setstate__(self, state):
+        self.extra = self.history = None
+        if isinstance(state, dict):
+            # Contacts pickled before __slots__ keep their fields in __dict__
+            self.name, self.address, self.phone, self.email = (
+                state["name"], state["address"], state["phone"], state["email"])
+            self.birthday = state["birthday"]
+        elif len(state) == 5:
+            self.name, self.address, self.phone, self.email, self._birthday = state
+        else:
+            self.name, self.address, self.phone, self.email, self._birthday, self.extra, self.history = state
+
+    def values(self, field: str) -> tuple:
+        """
+        All values of the field
+        :param field: str
+            'address', 'phone' or 'email'
+        :return: tuple
+            the main value first, empty if the contact has no value
+        """
+        main = getattr(self, field)
+        extra = self.extra.get(field, ()) if self.extra else ()
+        return ((main,) if main not in (None, '', "NULL") else ()) + extra
+
+    def get_value(self, field: str):
+        """
+        The value of the field like it's kept in changes: tuple of values of the address, the phone
+        and the email, ISO date of the birthday, the name
+        """
+        if field in MULTI_FIELDS:
+            return self.values(field)
+        if field == 'birthday':
+            return self.birthday.date().isoformat()
+        return getattr(self, field)
+
+    def set_value(self, field: str, value) -> None:
+        if field == 'birthday':
+            # the date is validated before, it isn't parsed by dateutil again
+            self.birthday = datetime.fromisoformat(value)
+        elif field in MULTI_FIELDS:
+            values = tuple(dict.fromkeys(item for item in value if item not in (None, '', "NULL")))
+            setattr(self, field, values[0] if values else "NULL")
+            extra = dict(self.extra or {})
+            if len(values) > 1:
+                extra[field] = values[1:]
+            else:
+                extra.pop(field, None)
+            self.extra = extra or None
+        else:
+            setattr(self, field, value)
+
+    def apply(self, changes: dict, when: int) -> dict:
+        """
+        Changing fields, only changed fields are kept in the history with their old values
+        :param changes: dict
+            field -> new value like get_value returns it
+        :param when: int
+            seconds since the epoch
+        :return: dict
+            fields which are really changed
+        """
+        applied = {}
+        history = list(self.history or ())
+        for field, value in changes.items():
+            if field in MULTI_FIELDS:
+                value = tuple(value)
+            old = self.get_value(field)
+            if value == old:
+                continue
+            self.set_value(field, value)
+            history.append((when, field, old))
+            applied[field] = value
+        if applied:
+            self.history = tuple(history[-HISTORY_LIMIT:])
+        return applied
+
+    def value_at(self, field: str, when: int):
+        """
+        The value of the field at the moment, changes made later are rolled back
+        :param field: str
+        :param when: int
+            seconds since the epoch
+        :return: tuple or str
+            like get_value
+        """
+        value = self.get_value(field)
+        for moment, changed, old in reversed(self.history or ()):
+            if moment <= when:
+                break
+            if changed == field:
+                value = old
+        return value
+
+    def __str__(self):
+        """
+        Returning all data of the contact as a string
+        :return: str
+        """
+        return f"{self.name}, {self.address}, {self.phone}, {self.email}, {self.birthday.date()}"
+
+    def print_tab(self):
+        """
+        Printing data of the contact as a formatted table
+        :return: None
+        """
+        table = rich_table.Table(show_header=False,
+                                 header_style="bold blue", show_lines=True)
+        address, phone, email = ('\n'.join(self.values(field)) or "NULL" for field in MULTI_FIELDS)
+        table.add_row(
+            f'[cyan]{self.name}[/cyan]', f'[cyan]{address}[/cyan]', f'[cyan]{phone}[/cyan]',
+            f'[cyan]{email}[/cyan]', f'[cyan]{self.birthday.date()}[/cyan]'
+        )
+        console().print(table)
+
+
+class Note:
+    """
+    A class is used to create fields to diary.
+    ________________________________________________
+
+    Attributes
+    __________
+    value : str
+        text of the note
+    keyWords : list
+        a keywords list of the note
+    date : str
+        date of note creating in ISO format, kept as microseconds since the epoch
+    created : datetime
+        date of note creating
+
+    Methods
+    _______
+    print_in_table
+        used to show info about the note as a table
+
+    """
+
+    __slots__ = ('_date', 'value', 'keyWords')
+
+    def __init__(self, value: str, keyWords: list) -> None:
+        """
+        Creating fields of the diary
+        :param value: str
+            text of the note
+        :param keyWords: list
+            a keywords list of the note
+        """
+        self._date = (datetime.now() - EPOCH) // MICROSECOND
+        self.value = value
+        self.keyWords = keyWords
+
+    @property
+    def created(self) -> datetime:
+        return EPOCH + self._date * MICROSECOND
+
+    @property
+    def date(self) -> str:
+        return self.created.isoformat()
+
+    @date.setter
+    def date(self, value: str) -> None:
+        self._date = (datetime.fromisoformat(value) - EPOCH) // MICROSECOND
+
+    def __getstate__(self):
+        return self._date, self.value, self.keyWords
+
+    def __setstate__(self, state):
+        if isinstance(state, dict):
+            # Notes pickled before __slots__ keep their fields in __dict__
+            self.date, self.value, self.keyWords = state["date"], state["value"], state["keyWords"]
+        else:
+            self._date, self.value, self.keyWords = state
+
+    def get_keywords(self):
+        """
+        Joining all tags of the note in string
+        :return: str
+            string of keywords
+        """
+        return ", ".join(self.keyWords)
+
+    def print_in_table(self):
+        """
+        Printing notes as a formatted table
+        :return: None
+        """
+        table = rich_table.Table(show_header=False,
+                                 header_style="bold blue", show_lines=True)
+        table.add_row(
+            f'[cyan]{self.created.strftime("%m/%d/%Y, %H:%M:%S")}[/cyan]', f'[cyan]{self.value}[/cyan]')
+        console().print(table)
+
+    def __str__(self):
+        return "{:<25} {}".format(self.created.strftime("%m/%d/%Y, %H:%M:%S"), self.value)
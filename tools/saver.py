@@ -0,0 +1,88 @@
+"""
+Background saving of the address book & diary.
+Commands only change the book in memory, the saver thread writes changes
+on a timer or when enough changes are made, coalescing all changes made meanwhile.
+The thread is stopped with the last saving on exit.
+"""
+
+import atexit
+import sys
+import threading
+
+
+SAVE_INTERVAL = 5.0
+SAVE_THRESHOLD = 100
+
+
+class BackgroundSaver:
+    """
+    A class is used to save the storage by the background thread.
+    ________________________________________________
+
+    Attributes
+    __________
+    storage : PickleStorage
+        storage with the method persist, which saves changes made since the previous call
+    interval : float
+        seconds between savings
+    threshold : int
+        number of unsaved changes which wakes the thread up before the interval
+
+    Methods
+    _______
+    start
+        starting the thread and registering the shutdown hook
+    notify
+        waking the thread up if there are enough unsaved changes
+    stop
+        stopping the thread after the last saving
+
+    """
+
+    def __init__(self, storage, interval: float = SAVE_INTERVAL, threshold: int = SAVE_THRESHOLD) -> None:
+        self.storage = storage
+        self.interval = interval
+        self.threshold = threshold
+        self.condition = threading.Condition()
+        self.stopping = False
+        self.thread = threading.Thread(target=self.run, name='background saver', daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def notify(self, unsaved: int) -> None:
+        if unsaved >= self.threshold:
+            with self.condition:
+                self.condition.notify()
+
+    def run(self) -> None:
+        """
+        Saving changes until the thread is stopped. An error of writing is reported,
+        changes stay unsaved and are written next time
+        :return: None
+        """
+        while True:
+            with self.condition:
+                if not self.stopping:
+                    self.condition.wait(self.interval)
+                stopping = self.stopping
+            try:
+                self.storage.persist()
+            except OSError as error:
+                print(f"Background saving failed: {error}", file=sys.stderr)
+            if stopping:
+                return
+
+    def stop(self) -> None:
+        """
+        Stopping the thread, the last changes are saved before it ends
+        :return: None
+        """
+        with self.condition:
+            if self.stopping:
+                return
+            self.stopping = True
+            self.condition.notify()
+        self.thread.join()
+        atexit.unregister(self.stop)
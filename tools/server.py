@@ -0,0 +1,374 @@
+"""
+Local HTTP/JSON API over the address book & diary.
+One in-memory book is shared by all clients: requests are read and answered by asyncio,
+commands run in a pool of threads under the readers-writer lock, so many searches go at once
+and changes go one by one. Changes are saved in batches by the background saver of the book.
+
+Endpoints (bodies and answers are JSON):
+GET    /contacts?q=text&limit=100&offset=0  all contacts or found by any field like 'find'
+GET    /contacts?phone=+380...|email=...    contacts found by the phone or the email through the hash index
+GET    /duplicates                          contacts which share a phone or an email with the merged ones
+GET    /contacts/<name>                     the contact like 'search'
+POST   /contacts                            adding: name, address, phone, email, birthday, region
+PATCH  /contacts/<name>                     changing: address, phone, email, birthday, region
+DELETE /contacts/<name>                     deleting
+GET    /contacts/<name>/history?at=2024-05-01 changes of the contact or its fields at the moment like 'history'
+GET    /birthdays?days=7 | ?period=week     birthdays like 'sort_birthday'
+GET    /notes?q=text                        all notes or found by tag or phrase like 'search_notes'
+POST   /notes                               adding: text with keywords as #words#
+DELETE /notes?keyword=tag                   deleting by keyword
+"""
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+import json
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from tools.exporter import contact_json, notes_json
+
+
+HOST = '127.0.0.1'
+PORT = 8765
+WORKERS = 8
+PAGE_LIMIT = 100
+MAX_BODY = 1024 * 1024
+MAX_LINE = 8 * 1024
+REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+           409: 'Conflict', 413: 'Payload Too Large', 422: 'Unprocessable Entity', 500: 'Internal Server Error'}
+
+
+class HTTPError(Exception):
+    """
+    Error answered to the client with the status
+    """
+
+    def __init__(self, status: int, message: str) -> None:
+        super().__init__(message)
+        self.status = status
+
+
+class ReadWriteLock:
+    """
+    A class is used to let many readers or one writer in at once.
+    Waiting writers go before new readers, so changes are not starved by searches.
+    ________________________________________________
+
+    Attributes
+    __________
+    readers : int
+        number of readers inside
+    writer : bool
+        True if the writer is inside
+    waiting_writers : int
+        number of writers waiting
+
+    Methods
+    _______
+    read
+        async context manager for readers
+    write
+        async context manager for writers
+
+    """
+
+    def __init__(self) -> None:
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writer = False
+        self.waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writer and not self.waiting_writers)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                if not self.readers:
+                    self.condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            try:
+                await self.condition.wait_for(lambda: not self.writer and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writer = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writer = False
+                self.condition.notify_all()
+
+
+def text_fields(body: dict, fields: tuple) -> dict:
+    """
+    Taking string fields of the request body
+    :param body: dict
+    :param fields: tuple
+        allowed fields
+    :return: dict
+    :raise HTTPError: if a field is unknown or isn't a string
+    """
+    unknown = [field for field in body if field not in fields]
+    if unknown:
+        raise HTTPError(400, f"Unknown fields {', '.join(unknown)}, use {', '.join(fields)}")
+    if not all(isinstance(value, str) for value in body.values()):
+        raise HTTPError(400, "Fields must be strings")
+    return body
+
+
+class Server:
+    """
+    A class is used to answer HTTP requests to the address book.
+    ________________________________________________
+
+    Attributes
+    __________
+    book : AddressBook
+        the shared book
+    lock : ReadWriteLock
+        searches go at once, changes one by one
+    executor : ThreadPoolExecutor
+        threads running commands of the book, so the event loop isn't blocked
+
+    Methods
+    _______
+    serve
+        accepting connections until the task is cancelled
+    handle
+        answering requests of one connection, it's kept alive between requests
+    dispatch
+        calling the endpoint by the method and the path
+
+    """
+
+    def __init__(self, book, host: str = HOST, port: int = PORT, workers: int = WORKERS) -> None:
+        self.book = book
+        self.host = host
+        self.port = port
+        self.lock = None
+        self.executor = ThreadPoolExecutor(workers)
+
+    async def run(self, write: bool, function, *args):
+        """
+        Running the command of the book in the pool under the lock
+        """
+        async with self.lock.write() if write else self.lock.read():
+            return await asyncio.get_running_loop().run_in_executor(self.executor, self.call, function, args)
+
+    def call(self, function, args: tuple):
+        """
+        Calling the command in the thread of the pool, the snapshot isn't unmapped by the saver meanwhile
+        """
+        with self.book.storage.reading():
+            return function(*args)
+
+    async def serve(self) -> None:
+        self.lock = ReadWriteLock()
+        server = await asyncio.start_server(self.handle, self.host, self.port, limit=MAX_LINE)
+        print(f"Serving the address book on http://{self.host}:{self.port}, press Ctrl+C to stop")
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                try:
+                    request = await self.read_request(reader)
+                except HTTPError as error:
+                    await self.answer(writer, error.status, {'error': str(error)}, False)
+                    break
+                except ValueError:
+                    # too long line or invalid Content-Length
+                    await self.answer(writer, 400, {'error': "Invalid request"}, False)
+                    break
+                if request is None:
+                    break
+                method, target, body, keep_alive = request
+                try:
+                    status, payload = await self.dispatch(method, target, body)
+                except HTTPError as error:
+                    status, payload = error.status, {'error': str(error)}
+                except KeyError as error:
+                    status, payload = 404, {'error': f"Not found: {error.args[0]}"}
+                except ValueError as error:
+                    status, payload = 422, {'error': str(error)}
+                except Exception as error:
+                    status, payload = 500, {'error': repr(error)}
+                await self.answer(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def read_request(reader: asyncio.StreamReader):
+        """
+        Reading the request line, headers and the body
+        :return: tuple or None
+            method, target, parsed JSON body or None, keep alive; None if the client closed the connection
+        """
+        line = await reader.readline()
+        if not line.strip():
+            return None
+        try:
+            method, target, version = line.decode('latin-1').split()
+        except ValueError:
+            raise HTTPError(400, "Invalid request line")
+        headers = {}
+        while (line := await reader.readline()) not in (b'\r\n', b'\n', b''):
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0) or 0)
+        if length > MAX_BODY:
+            raise HTTPError(413, f"Body is over {MAX_BODY} bytes")
+        body = None
+        if length:
+            try:
+                body = json.loads(await reader.readexactly(length))
+            except ValueError:
+                raise HTTPError(400, "Body must be JSON")
+            if not isinstance(body, dict):
+                raise HTTPError(400, "Body must be a JSON object")
+        connection = headers.get('connection', '').lower()
+        keep_alive = connection != 'close' if version == 'HTTP/1.1' else connection == 'keep-alive'
+        return method.upper(), target, body, keep_alive
+
+    @staticmethod
+    async def answer(writer: asyncio.StreamWriter, status: int, payload: dict, keep_alive: bool) -> None:
+        data = json.dumps(payload, ensure_ascii=False).encode()
+        head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + data)
+        await writer.drain()
+
+    async def dispatch(self, method: str, target: str, body: dict) -> tuple:
+        """
+        Calling the endpoint
+        :return: tuple
+            status, JSON payload
+        """
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/')]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        body = body or {}
+        book = self.book
+        if parts[0] == 'contacts' and len(parts) == 1:
+            if method == 'GET':
+                return 200, await self.run(False, self.list_contacts, query)
+            if method == 'POST':
+                fields = text_fields(body, ('name', 'address', 'phone', 'email', 'birthday', 'region'))
+                if not fields.get('name', '').strip():
+                    raise HTTPError(400, "Field name is required")
+                try:
+                    person = await self.run(True, lambda: book.add_contact(**fields))
+                except ValueError as error:
+                    if str(error) == "Contact already present":
+                        raise HTTPError(409, str(error))
+                    raise
+                return 201, contact_json(person)
+        elif parts[0] == 'contacts' and len(parts) == 2:
+            name = parts[1]
+            if method == 'GET':
+                return 200, contact_json(await self.run(False, book.persons.__getitem__, name))
+            if method in ('PATCH', 'PUT'):
+                fields = text_fields(body, ('address', 'phone', 'email', 'birthday', 'region'))
+                return 200, contact_json(await self.run(True, lambda: book.update_contact(name, **fields)))
+            if method == 'DELETE':
+                await self.run(True, book.delete_contact, name)
+                return 200, {'deleted': name}
+        elif parts[0] == 'contacts' and len(parts) == 3 and parts[2] == 'history':
+            if method == 'GET':
+                return 200, {'history': await self.run(False, book.contact_history, parts[1], query.get('at'))}
+        elif parts == ['duplicates']:
+            if method == 'GET':
+                return 200, {'duplicates': await self.run(False, book.duplicates_report)}
+        elif parts == ['birthdays']:
+            if method == 'GET':
+                return 200, {'birthdays': await self.run(False, self.birthdays, query)}
+        elif parts == ['notes']:
+            if method == 'GET':
+                return 200, await self.run(False, self.list_notes, query)
+            if method == 'POST':
+                text = text_fields(body, ('text',)).get('text', '')
+                if not text.strip():
+                    raise HTTPError(400, "Field text is required")
+                return 201, notes_json([await self.run(True, book.add_note_text, text)])[0]
+            if method == 'DELETE':
+                if not query.get('keyword'):
+                    raise HTTPError(400, "Parameter keyword is required")
+                deleted = await self.run(True, book.delete_notes_with_keyword, query['keyword'])
+                return 200, {'deleted': notes_json(deleted)}
+        else:
+            raise HTTPError(404, f"Unknown endpoint {url.path}")
+        raise HTTPError(405, f"Method {method} isn't allowed for {url.path}")
+
+    def list_contacts(self, query: dict) -> dict:
+        try:
+            limit = int(query.get('limit', PAGE_LIMIT))
+            offset = int(query.get('offset', 0))
+        except ValueError:
+            raise HTTPError(400, "limit and offset must be numbers")
+        if query.get('phone'):
+            found = (person for _, person in self.book.find_by_phone(query['phone'], query.get('region')))
+        elif query.get('email'):
+            found = (person for _, person in self.book.find_by_email(query['email']))
+        elif query.get('q'):
+            found = self.book.storage.find_persons(query['q'])
+        else:
+            found = self.book.persons.values()
+        contacts, count = [], 0
+        for person in found:
+            if offset <= count < offset + limit:
+                contacts.append(contact_json(person))
+            count += 1
+        return {'count': count, 'contacts': contacts}
+
+    def list_notes(self, query: dict) -> dict:
+        if not query.get('q'):
+            return {'notes': notes_json(self.book.notes.values())}
+        by_key, by_text = self.book.storage.search_notes(query['q'])
+        return {'by_key': notes_json(by_key), 'by_text': notes_json(by_text)}
+
+    def birthdays(self, query: dict) -> dict:
+        period = query.get('period', '').lower()
+        if period in ('week', 'month'):
+            today = datetime.now()
+            calendar = self.book.birthday_calendar(today, self.book.period_days(period, today))
+            return {day.isoformat(): names for day, names in calendar.items()}
+        try:
+            return self.book.birthdays(int(query.get('days', 7)))
+        except ValueError:
+            raise HTTPError(400, "days must be a number, or use period=week|month")
+
+
+def serve(book, host: str = HOST, port: int = PORT) -> None:
+    """
+    Serving the book until Ctrl+C
+    :param book: AddressBook
+        the book, its changes are saved by the background saver
+    :param host: str
+        localhost by default
+    :param port: int
+    :return: None
+    """
+    server = Server(book, host, port)
+    try:
+        asyncio.run(server.serve())
+    except KeyboardInterrupt:
+        print("Server is stopped")
+    finally:
+        server.executor.shutdown()
@@ -0,0 +1,344 @@
+"""
+Compact snapshot of the address book & diary opened through mmap.
+Records are decoded only when they are accessed, so opening the book
+does not depend on its size.
+
+Layout of the file:
+    header      magic, version, number of sections
+    sections    name, number of records, offset of the index, offset of the order
+    data        length-prefixed keys and length-prefixed pickled records
+    index       (key offset, record offset) entries sorted by key, for binary search
+    order       numbers of index entries in the order of writing
+"""
+
+import mmap
+import os
+import pickle
+import struct
+import threading
+from collections.abc import Mapping, MutableMapping
+from contextlib import contextmanager
+
+from tools.journal import loads
+
+
+MAGIC = b'PCAB'
+VERSION = 1
+HEADER = struct.Struct('<4sHH')
+SECTION = struct.Struct('<16sQQQ')
+ENTRY = struct.Struct('<QQ')
+LENGTH = struct.Struct('<I')
+ORDER = struct.Struct('<I')
+
+
+def is_snapshot(path: str) -> bool:
+    """
+    Checking whether the file is written in the snapshot format
+    :param path: str
+        file location
+    :return: bool
+    """
+    try:
+        with open(path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write(path: str, sections: dict) -> None:
+    """
+    Writing the snapshot atomically: to the temporary file first, then renaming it.
+    The snapshot being replaced must not be mapped, Windows doesn't replace mapped files
+    :param path: str
+        snapshot location
+    :param sections: dict
+        section name -> iterable of (key, pickled record) tuples
+    :return: None
+    """
+    tmp_path = f'{path}.tmp'
+    write_file(tmp_path, sections)
+    os.replace(tmp_path, path)
+
+
+def write_file(path: str, sections: dict) -> None:
+    """
+    Writing the snapshot into the file and flushing it to the disk
+    :param path: str
+        location of the written file
+    :param sections: dict
+        section name -> iterable of (key, pickled record) tuples
+    :return: None
+    """
+    with open(path, 'wb') as file:
+        table_offset = HEADER.size
+        file.write(HEADER.pack(MAGIC, VERSION, len(sections)))
+        file.write(b'\0' * SECTION.size * len(sections))
+        table = []
+        for name, records in sections.items():
+            entries = []
+            for key, record in records:
+                key = key.encode()
+                key_offset = file.tell()
+                file.write(LENGTH.pack(len(key)))
+                file.write(key)
+                record_offset = file.tell()
+                file.write(LENGTH.pack(len(record)))
+                file.write(record)
+                entries.append((key, key_offset, record_offset))
+            by_key = sorted(range(len(entries)), key=lambda number: entries[number][0])
+            index_offset = file.tell()
+            for number in by_key:
+                file.write(ENTRY.pack(entries[number][1], entries[number][2]))
+            position = [0] * len(entries)
+            for index_number, number in enumerate(by_key):
+                position[number] = index_number
+            order_offset = file.tell()
+            for index_number in position:
+                file.write(ORDER.pack(index_number))
+            table.append(SECTION.pack(name.encode(), len(entries), index_offset, order_offset))
+        file.seek(table_offset)
+        file.write(b''.join(table))
+        file.flush()
+        os.fsync(file.fileno())
+
+
+def open_sections(path: str) -> dict:
+    """
+    Mapping the snapshot into memory
+    :param path: str
+        snapshot location
+    :return: dict
+        section name -> SnapshotTable
+    """
+    with open(path, 'rb') as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    magic, version, count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} isn't a snapshot of version {VERSION}")
+    sections = {}
+    for number in range(count):
+        name, records, index_offset, order_offset = SECTION.unpack_from(
+            buffer, HEADER.size + number * SECTION.size)
+        sections[name.rstrip(b'\0').decode()] = SnapshotTable(buffer, records, index_offset, order_offset)
+    return sections
+
+
+class Readers:
+    """
+    A class is used to keep the snapshot mapped while other threads read it.
+    The mapping is replaced only when no thread reads it, new readers wait until it's replaced.
+    ________________________________________________
+
+    Attributes
+    __________
+    count : int
+        number of threads reading the mapping
+    replacing : bool
+        True if the mapping is being replaced or waits for readers to replace it
+
+    Methods
+    _______
+    reading
+        context manager for threads which read records of the snapshot
+    replacing_mapping
+        context manager for the thread which closes the mapping and maps the new snapshot
+
+    """
+
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.count = 0
+        self.replacing = False
+
+    @contextmanager
+    def reading(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.replacing)
+            self.count += 1
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.count -= 1
+                if not self.count:
+                    self.condition.notify_all()
+
+    @contextmanager
+    def replacing_mapping(self):
+        with self.condition:
+            self.condition.wait_for(lambda: not self.replacing)
+            self.replacing = True
+            self.condition.wait_for(lambda: not self.count)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.replacing = False
+                self.condition.notify_all()
+
+
+class SnapshotTable(Mapping):
+    """
+    Read-only mapping over one section of the snapshot.
+    Keys are found by binary search over the index, records are unpickled on access.
+    """
+
+    def __init__(self, buffer, count: int, index_offset: int, order_offset: int) -> None:
+        self.buffer = buffer
+        self.count = count
+        self.index_offset = index_offset
+        self.order_offset = order_offset
+
+    def _chunk(self, offset: int) -> bytes:
+        length, = LENGTH.unpack_from(self.buffer, offset)
+        return self.buffer[offset + LENGTH.size:offset + LENGTH.size + length]
+
+    def _entry(self, index_number: int) -> tuple:
+        return ENTRY.unpack_from(self.buffer, self.index_offset + index_number * ENTRY.size)
+
+    def _record_offset(self, key):
+        if not isinstance(key, str):
+            return None
+        key = key.encode()
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            key_offset, record_offset = self._entry(middle)
+            middle_key = self._chunk(key_offset)
+            if middle_key == key:
+                return record_offset
+            if middle_key < key:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def raw(self, key) -> bytes:
+        """
+        Getting the pickled record without decoding it
+        :param key: str
+        :return: bytes
+        """
+        record_offset = self._record_offset(key)
+        if record_offset is None:
+            raise KeyError(key)
+        return self._chunk(record_offset)
+
+    def __getitem__(self, key):
+        return loads(self.raw(key))
+
+    def __contains__(self, key) -> bool:
+        return self._record_offset(key) is not None
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _entries(self):
+        for number in range(self.count):
+            index_number, = ORDER.unpack_from(self.buffer, self.order_offset + number * ORDER.size)
+            yield self._entry(index_number)
+
+    def __iter__(self):
+        for key_offset, _ in self._entries():
+            yield self._chunk(key_offset).decode()
+
+    def raw_items(self):
+        """
+        Iterating (key, pickled record) tuples in the order of writing
+        """
+        for key_offset, record_offset in self._entries():
+            yield self._chunk(key_offset).decode(), self._chunk(record_offset)
+
+    def close(self) -> None:
+        """
+        Unmapping the snapshot, all sections share the mapping, so they are closed together
+        """
+        self.buffer.close()
+
+
+class OverlayTable(MutableMapping):
+    """
+    Changes made on top of the read-only snapshot section.
+    The snapshot itself is rewritten only during compaction.
+    """
+
+    def __init__(self, base: SnapshotTable) -> None:
+        self.base = base
+        self.changes = {}
+        self.deleted = set()
+        self.cleared = False
+
+    def _in_base(self, key) -> bool:
+        return not self.cleared and key not in self.deleted and key in self.base
+
+    def __getitem__(self, key):
+        if key in self.changes:
+            return self.changes[key]
+        if not self._in_base(key):
+            raise KeyError(key)
+        return self.base[key]
+
+    def __contains__(self, key) -> bool:
+        return key in self.changes or self._in_base(key)
+
+    def __setitem__(self, key, value) -> None:
+        self.changes[key] = value
+        self.deleted.discard(key)
+
+    def __delitem__(self, key) -> None:
+        in_base = self._in_base(key)
+        if key not in self.changes and not in_base:
+            raise KeyError(key)
+        self.changes.pop(key, None)
+        if in_base:
+            self.deleted.add(key)
+
+    def clear(self) -> None:
+        self.changes = {}
+        self.deleted = set()
+        self.cleared = True
+
+    def __iter__(self):
+        if not self.cleared:
+            for key in self.base:
+                if key not in self.deleted:
+                    yield key
+        for key in self.changes:
+            if self.cleared or key not in self.base:
+                yield key
+
+    def __len__(self) -> int:
+        if self.cleared:
+            return len(self.changes)
+        added = sum(1 for key in self.changes if key not in self.base)
+        return len(self.base) - len(self.deleted) + added
+
+    def __bool__(self) -> bool:
+        return bool(self.changes) or (not self.cleared and len(self.base) > len(self.deleted))
+
+    def copy(self) -> 'OverlayTable':
+        """
+        Copying changes on top of the same snapshot section
+        """
+        table = OverlayTable(self.base)
+        table.changes = dict(self.changes)
+        table.deleted = set(self.deleted)
+        table.cleared = self.cleared
+        return table
+
+    def close(self) -> None:
+        self.base.close()
+
+    def raw_items(self):
+        """
+        Iterating (key, pickled record) tuples, unchanged records are not decoded
+        """
+        if not self.cleared:
+            for key, record in self.base.raw_items():
+                if key in self.changes:
+                    yield key, pickle.dumps(self.changes[key])
+                elif key not in self.deleted:
+                    yield key, record
+        for key, value in self.changes.items():
+            if self.cleared or key not in self.base:
+                yield key, pickle.dumps(value)
@@ -5,14 +5,24 @@ Remoting empty folders.
 Unpacking archives.
 """
 
-from itertools import chain
-
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+import ctypes
+import errno
+import json
 import os
 from pathlib import Path
 import re
-from shutil import move, unpack_archive
+import select
+import struct
+import sys
+import time
 from typing import List
 
+from tools.dedup import POLICIES, HashCache, find_duplicates
+from tools.extractor import MAX_RATIO, MAX_SIZE, extract
+
 
 files_extension_to_folders = {
     'images': ['.jpeg', '.png', '.jpg', '.svg', '.bmp', '.tiff'],
@@ -34,146 +44,745 @@ for cyrillic, latin in zip(cyrillic_symbols, cyrillic_to_latin):
     transliteration[ord(cyrillic)] = latin
     transliteration[ord(cyrillic.upper())] = latin.upper()
 
-empty_folders = []
-folders_to_rename = []
+NOT_WORD = re.compile(r'\W')
+SEPARATOR = '\0'
 
 
-def find_files(path: Path) -> None:
+class NameTable(dict):
     """
-    Recursive searching files for sorting
-    :param path: Path
-        selected folder for sorting
-    :return: None
+    The translate table doing all normalizing in one pass: cyrillic symbols to latin ones,
+    other symbols matching \\W to '_'. Entries are added on the first use of the symbol.
+    The separator of names (NUL, which can't be in a file name) is kept for normalize_many
     """
-    for i in path.iterdir():
 
-        if i.is_file():
+    def __missing__(self, code: int) -> str:
+        symbol = chr(code)
+        self[code] = symbol if symbol == SEPARATOR or not NOT_WORD.match(symbol) else '_'
+        return self[code]
 
-            if (ext := i.suffix) in chain(*files_extension_to_folders.values()):
 
-                new_name = normalize(i.stem)
+name_table = NameTable(transliteration)
 
-                if ext in files_extension_to_folders['images']:
-                    move_file(i, new_name, ext, 'images')
+EXTENSION_TO_FOLDER = {ext: folder for folder, extensions in files_extension_to_folders.items() for ext in extensions}
+BATCH_SIZE = 256
+WORKERS = min(32, (os.cpu_count() or 1) * 4)
+JOURNAL_NAME = '.file_sort.journal'
+CACHE_NAME = '.file_sort.cache'
+RACY_NS = 2_000_000_000
+DEBOUNCE = 0.5
+POLL_INTERVAL = 2.0
+RESCAN_INTERVAL = 60.0
+IN_CLOSE_WRITE, IN_MOVED_TO, IN_CREATE, IN_ISDIR = 0x8, 0x80, 0x100, 0x40000000
+INOTIFY_EVENT = struct.Struct('iIII')
 
-                elif ext in files_extension_to_folders['video']:
-                    move_file(i, new_name, ext, 'video')
 
-                elif ext in files_extension_to_folders['documents']:
-                    move_file(i, new_name, ext, 'documents')
+def scan(path: Path, empty_folders: List[Path], folders_to_rename: List[Path], cache=None):
+    """
+    Walking the folder with os.scandir without recursion.
+    Categorical folders are skipped, other folders are collected for removing (if empty) or renaming.
+    Folders which are not changed since the previous scan are not listed again, if the cache is given
+    :param path: Path
+        selected folder for sorting
+    :param empty_folders: list
+        empty folders are appended to it
+    :param folders_to_rename: list
+        not empty folders are appended to it, parents go before their subfolders
+    :param cache: ScanCache
+    :return: generator
+        (file path, extension, categorical folder) tuples of files to sort
+    """
+    stack = [path]
+    while stack:
+        folder = stack.pop()
+        stat = os.stat(folder)
+        subfolders = cache.unchanged(folder, stat) if cache is not None else None
+        if subfolders is None:
+            subfolders, is_empty, has_files = [], True, False
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    is_empty = False
+                    if entry.is_file(follow_symlinks=False):
+                        ext = os.path.splitext(entry.name)[1]
+                        if ext and ext in EXTENSION_TO_FOLDER:
+                            has_files = True
+                            yield Path(entry.path), ext, EXTENSION_TO_FOLDER[ext]
+                    elif entry.is_dir(follow_symlinks=False) and entry.name not in files_extension_to_folders:
+                        subfolders.append(entry.name)
+            subfolders.sort()
+            if folder != path and is_empty:
+                empty_folders.append(folder)
+                continue
+            if cache is not None:
+                cache.record(folder, stat, subfolders, has_files)
+        if folder != path:
+            folders_to_rename.append(folder)
+        stack.extend(Path(folder, name) for name in reversed(subfolders))
 
-                elif ext in files_extension_to_folders['audio']:
-                    move_file(i, new_name, ext, 'audio')
 
-                elif ext in files_extension_to_folders['archives']:
-                    unpack_archive_file(i, new_name, ext, 'archives')
+def free_path(path: Path, taken: set) -> Path:
+    """
+    Choosing the name which is neither on the disk nor planned already: name, name_1, name_2 ...
+    :param path: Path
+        wanted location
+    :param taken: set
+        planned locations, the chosen one is added
+    :return: Path
+    """
+    stem, suffix = path.stem, path.suffix
+    number = 0
+    while path in taken or path.exists():
+        number += 1
+        path = path.with_name(f'{stem}_{number}{suffix}')
+    taken.add(path)
+    return path
+
 
-        elif i.is_dir() and not (i.name in files_extension_to_folders):
+def sorted_files(folders) -> List[str]:
+    """
+    Listing files which are in categorical folders already
+    :param folders: iterable
+        categorical folders
+    :return: list
+    """
+    files = []
+    for folder in folders:
+        try:
+            with os.scandir(folder) as entries:
+                files.extend(entry.path for entry in entries if entry.is_file(follow_symlinks=False))
+        except OSError:
+            continue
+    return files
 
-            if not os.listdir(i):
-                empty_folders.append(i)
-            else:
-                folders_to_rename.append(i)
 
-            find_files(i)
+def plan_moves(moves: List[tuple], dedup: dict = None) -> List[tuple]:
+    """
+    Planning moves of files: names taken on the disk or by other files get a number,
+    duplicates of files which are sorted already or moved before are reported, hard linked or skipped
+    :param moves: list
+        (file, wanted location) tuples
+    :param dedup: dict
+        'policy': 'report' | 'hardlink' | 'skip', 'hashes': HashCache or None,
+        'found' - (duplicate, original) tuples are appended to it
+    :return: list
+        'move' steps followed by 'link' steps
+    """
+    duplicates = {}
+    if dedup is not None:
+        existing = sorted_files({target.parent for _, target in moves})
+        duplicates = find_duplicates(existing + [str(source) for source, _ in moves], dedup['hashes'])
+    taken, targets, steps, links = set(), {}, [], []
+    for source, target in moves:
+        original = duplicates.get(str(source))
+        if original is not None:
+            original = targets.get(original, original)
+            dedup['found'].append((str(source), original))
+            if dedup['policy'] == 'skip':
+                continue
+            if dedup['policy'] == 'hardlink':
+                links.append(('link', str(source), str(free_path(target, taken)), original))
+                continue
+        target = str(free_path(target, taken))
+        targets[str(source)] = target
+        steps.append(('move', str(source), target))
+    return steps + links
 
 
-def move_file(old_file_path: Path, new_name: str, ext: str, folder: str) -> None:
+def plan_sort(path: Path, cache=None, dedup: dict = None, limits: tuple = (MAX_SIZE, MAX_RATIO)) -> list:
+    """
+    Planning the sorting without changing anything.
+    Steps go in order of execution: moving files & unpacking archives, linking duplicates,
+    removing empty folders, renaming folders (subfolders before their parents)
+    :param path: Path
+        selected folder for sorting
+    :param cache: ScanCache
+        if given, only folders changed since the previous scan are listed
+    :param dedup: dict
+        finding duplicates, see plan_moves
+    :param limits: tuple
+        maximal expanded size and compression ratio of archives
+    :return: list
+        steps: ('move', file, new file) | ('unpack', archive, folder, extension, max size, max ratio)
+        | ('link', file, new file, original) | ('remove', folder) | ('rename', folder, new folder)
     """
-    Moving normalized files to categorical folders
-    :param old_file_path: Path
+    empty_folders, folders_to_rename = [], []
+    plan, moves = [], []
+    # files are sorted by path, so names with numbers are chosen the same way on any file system
+    files = sorted(scan(path, empty_folders, folders_to_rename, cache))
+    for (file_path, ext, folder), new_name in zip(files, normalize_many([file.stem for file, _, _ in files])):
+        if folder == 'archives':
+            plan.append(('unpack', str(file_path), str(Path(file_path.parent, folder, new_name)), ext, *limits))
+        else:
+            moves.append((file_path, Path(file_path.parent, folder, f'{new_name}{ext}')))
+    plan.extend(plan_moves(moves, dedup))
+    plan.extend(('remove', str(folder)) for folder in empty_folders)
+    planned = set()
+    folders_to_rename.reverse()
+    new_folder_names = normalize_many([folder.name for folder in folders_to_rename])
+    for folder, new_folder_name in zip(folders_to_rename, new_folder_names):
+        if new_folder_name == folder.name:
+            continue
+        new_path_folder = free_path(Path(folder.parent, new_folder_name), planned)
+        plan.append(('rename', str(folder), str(new_path_folder)))
+    return plan
+
+
+def print_plan(plan: list, path: Path, done: set = frozenset()) -> None:
+    """
+    Printing steps of the plan which are not done yet, paths are relative to the sorting folder
+    :param plan: list
+    :param path: Path
+        selected folder for sorting
+    :param done: set
+        numbers of done steps
+    :return: None
+    """
+    for number, (operation, source, *target) in enumerate(plan):
+        if number in done:
+            continue
+        line = f'{operation:<7} {os.path.relpath(source, path)}'
+        if operation != 'remove':
+            line += f' -> {os.path.relpath(target[0], path)}'
+        print(line)
+    print(f'{len(plan) - len(done)} steps')
+
+
+def move_file(source: str, target: str) -> None:
+    """
+    Moving the file to the categorical folder with a single rename.
+    An existing file is never overwritten. A step done before the interruption is skipped
+    :param source: str
         old file location
-    :param new_name: str
-        normalized file name
-    :param ext: str
-        file extension
-    :param folder: str
-        categorical folder name
+    :param target: str
+        new file location
     :return: None
     """
-    new_path_file = Path(old_file_path.parent, folder)
-    new_path_file.mkdir(exist_ok=True, parents=True)
-    new_path = (Path(old_file_path.parent, f'{new_name}{ext}'))
-    os.rename(old_file_path, new_path)
-    move(new_path, new_path_file)
+    if not os.path.exists(source) and os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        raise FileExistsError(f'{target} already exists')
+    os.rename(source, target)
 
 
-def unpack_archive_file(old_file_path: Path, new_name: str, ext: str, folder: str) -> None:
+def link_file(source: str, target: str, original: str) -> None:
+    """
+    Replacing the duplicate with the hard link to the original in the categorical folder.
+    On another file system the duplicate is moved. A step done before the interruption is skipped
+    :param source: str
+        duplicate location
+    :param target: str
+        new location
+    :param original: str
+        file with the same content
+    :return: None
     """
-    Working with archives.
-    Moving archives to the folder 'archives' and unpacking they there
-    :param old_file_path: Path
+    if not os.path.exists(source) and os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    if os.path.exists(target):
+        raise FileExistsError(f'{target} already exists')
+    try:
+        os.link(original, target)
+    except OSError as error:
+        if error.errno != errno.EXDEV:
+            raise
+        os.rename(source, target)
+        return
+    os.remove(source)
+
+
+def unpack_archive_file(source: str, target: str, ext: str, max_size: int = MAX_SIZE,
+                        max_ratio: float = MAX_RATIO) -> None:
+    """
+    Unpacking the archive by streaming to its folder in 'archives' and removing the archive.
+    Names of entries are normalized. A step done before the interruption is skipped
+    :param source: str
         archive location
-    :param new_name: str
-        folder name of unpacking archive
+    :param target: str
+        folder for unpacking
     :param ext: str
         archive extension
+    :param max_size: int
+        maximal expanded size in bytes
+    :param max_ratio: float
+        maximal ratio of the expanded size to the size of the archive
+    :return: None
+    """
+    if not os.path.exists(source):
+        return
+    extract(source, target, ext, normalize, max_size, max_ratio)
+    os.remove(source)
+
+
+def remove_empty_folder(folder: str) -> None:
+    """
+    Removing the empty folder. A step done before the interruption is skipped
     :param folder: str
-        collective folder for unpacking archives, 'archives' by default
     :return: None
     """
-    new_path_file = Path(old_file_path.parent, folder)
-    new_path_file.mkdir(exist_ok=True, parents=True)
-    new_path = (Path(old_file_path.parent, f'{new_name}{ext}'))
-    os.rename(old_file_path, new_path)
-    unpack_archive(new_path, Path(new_path_file, new_name), ext.replace('.', ''))
-    os.remove(new_path)
+    if os.path.exists(folder):
+        os.rmdir(folder)
 
 
-def normalize(old_name: str) -> str:
+def rename_folder(source: str, target: str) -> None:
     """
-    Normalizing files' & folders' names.
-    Translating cyrillic symbols to latin ones.
-    Amending unacceptable symbols to '_' symbol.
-    :param old_name: str
-        folder/file's name before normalizing
-    :return new_name: str
-        folder/file's name after normalizing
+    Renaming the folder. A step done before the interruption is skipped
+    :param source: str
+    :param target: str
+    :return: None
     """
-    new_name = old_name.translate(transliteration)
-    new_name = re.sub(r'\W', '_', new_name)
+    if not os.path.exists(source) and os.path.exists(target):
+        return
+    os.rename(source, target)
+
 
-    return new_name
+STEPS = {'move': move_file, 'unpack': unpack_archive_file, 'link': link_file,
+         'remove': remove_empty_folder, 'rename': rename_folder}
 
 
-def remove_empty_folders(folders: List[Path]) -> None:
+def run_steps(batch: list) -> tuple:
     """
-    Removing empty folders
-    :param folders: list
-        list of empty folder in sorting folder
-    :return: None
+    Running the batch of steps, it runs in a thread of the pool
+    :param batch: list
+        (number, step) tuples
+    :return: tuple
+        numbers of done steps, errors
     """
-    for folder in folders:
-        folder.rmdir()
+    done, errors = [], []
+    for number, (operation, *arguments) in batch:
+        try:
+            STEPS[operation](*arguments)
+            done.append(number)
+        except (OSError, ValueError) as error:
+            errors.append(f'{operation} {arguments[0]}: {error}')
+    return done, errors
 
-    global empty_folders
-    empty_folders = []
 
+class SortJournal:
+    """
+    A class is used to keep the plan of sorting and numbers of done steps on the disk,
+    so an interrupted sorting is resumed without scanning the folder again.
+    ________________________________________________
+
+    Attributes
+    __________
+    path : Path
+        location of the journal in the sorting folder
+
+    Methods
+    _______
+    write_plan
+        writing the plan before execution
+    load
+        reading the plan and numbers of done steps
+    mark_done
+        appending numbers of done steps
+    remove
+        removing the journal after sorting
 
-def rename_folders(list_folders: List[Path]) -> None:
     """
-    Renaming folders
-    :param list_folders: list
-        folder list for normalizing
-    :return: None
+
+    def __init__(self, folder: Path) -> None:
+        self.path = Path(folder, JOURNAL_NAME)
+        self.file = None
+
+    def exists(self) -> bool:
+        return self.path.exists()
+
+    def write_plan(self, plan: list) -> None:
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            for step in plan:
+                file.write(json.dumps({'step': step}, ensure_ascii=False) + '\n')
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, self.path)
+
+    def load(self) -> tuple:
+        """
+        Reading the journal, a torn line at the end is ignored
+        :return: tuple
+            plan, set of numbers of done steps
+        """
+        plan, done = [], set()
+        with open(self.path, encoding='utf-8') as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if 'step' in record:
+                    plan.append(tuple(record['step']))
+                else:
+                    done.update(record['done'])
+        return plan, done
+
+    def mark_done(self, numbers: list) -> None:
+        if not numbers:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'a', encoding='utf-8')
+        self.file.write(json.dumps({'done': numbers}) + '\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def remove(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.path.unlink(missing_ok=True)
+
+
+class ScanCache:
     """
-    for folder in list_folders[::-1]:
-        new_folder_name = normalize(folder.name)
-        new_path_folder = (Path(folder.parent, f'{new_folder_name}'))
+    A class is used to remember folders which have nothing to sort, so repeated sorting
+    lists only folders changed since the previous scan. A folder is recognised by its inode
+    and modification time, which changes whenever an entry is added, removed or renamed in it.
+    ________________________________________________
+
+    Attributes
+    __________
+    path : Path
+        location of the cache in the sorting folder
+    entries : dict
+        folder -> [inode, modification time in ns, names of subfolders]
+    folders : list
+        all folders visited by the last scan
+
+    Methods
+    _______
+    unchanged
+        names of subfolders of the folder if it isn't changed, otherwise None
+    record
+        remembering the scanned folder
+    save
+        writing the cache after the scan
+
+    """
+
+    def __init__(self, folder: Path) -> None:
+        self.path = Path(folder, CACHE_NAME)
+        self.visited = {}
+        self.folders = []
         try:
-            os.rename(folder, new_path_folder)
-        except FileExistsError:
-            new_path_folder = (Path(folder.parent, f'{new_folder_name}_1'))
-            os.rename(folder, new_path_folder)
+            with open(self.path, encoding='utf-8') as file:
+                self.entries = json.load(file)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def unchanged(self, folder: Path, stat: os.stat_result):
+        self.folders.append(folder)
+        entry = self.entries.get(str(folder))
+        if entry is None or entry[0] != stat.st_ino or entry[1] != stat.st_mtime_ns:
+            return None
+        self.visited[str(folder)] = entry
+        return entry[2]
+
+    def record(self, folder: Path, stat: os.stat_result, subfolders: List[str], has_files: bool) -> None:
+        """
+        Remembering the folder if it has no files to sort. A folder modified just now isn't remembered:
+        a change in the same tick of the file system clock would keep the modification time
+        :param folder: Path
+        :param stat: os.stat_result
+        :param subfolders: list
+            names of subfolders
+        :param has_files: bool
+            True if the folder has files to sort
+        :return: None
+        """
+        if not has_files and time.time_ns() - stat.st_mtime_ns > RACY_NS:
+            self.visited[str(folder)] = [stat.st_ino, stat.st_mtime_ns, subfolders]
+
+    def save(self) -> None:
+        """
+        Writing the cache atomically if it's changed, visited folders only are kept
+        :return: None
+        """
+        visited, self.visited = self.visited, {}
+        if visited == self.entries:
+            return
+        self.entries = visited
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump(visited, file, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def reset(self) -> None:
+        """
+        Forgetting visited folders before the next scan
+        :return: None
+        """
+        self.folders = []
+
+
+class Watcher:
+    """
+    A class is used to wait for new files in folders with Linux inotify.
+    A file is taken when it's closed after writing or moved in, so half-written files are not sorted.
+    ________________________________________________
+
+    Attributes
+    __________
+    fd : int
+        inotify file descriptor
+
+    Methods
+    _______
+    add
+        watching the folder, repeated adding of the same folder is ignored by the kernel
+    wait
+        waiting for new files or folders
+    close
+        closing the inotify file descriptor
+
+    """
+
+    def __init__(self) -> None:
+        if not sys.platform.startswith('linux'):
+            # ctypes.CDLL(None) isn't available on Windows, the folder is polled there
+            raise OSError(errno.ENOSYS, 'inotify is available on Linux only')
+        self.libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify is not available')
+
+    def add(self, folder: Path) -> None:
+        self.libc.inotify_add_watch(self.fd, os.fsencode(folder), IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+
+    def events(self) -> bool:
+        """
+        Reading pending events
+        :return: bool
+            True if a new file or folder appeared, own files and categorical folders of sorting are ignored
+        """
+        found = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except BlockingIOError:
+                return found
+            offset = 0
+            while offset < len(data):
+                _, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0')
+                offset += INOTIFY_EVENT.size + length
+                if name.startswith(b'.file_sort') or os.fsdecode(name) in files_extension_to_folders:
+                    continue
+                if mask & IN_CREATE and not mask & IN_ISDIR:
+                    continue
+                found = True
+
+    def wait(self, timeout: float) -> bool:
+        """
+        Waiting for new files, then for the quiet time so that a bunch of files is sorted at once
+        :param timeout: float
+            seconds
+        :return: bool
+            True if new files or folders appeared
+        """
+        deadline = time.monotonic() + timeout
+        while not self.events():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([self.fd], [], [], remaining)[0]:
+                return False
+        while select.select([self.fd], [], [], DEBOUNCE)[0]:
+            self.events()
+        return True
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+def watch(path: Path, workers: int = WORKERS, duplicates: str = None) -> None:
+    """
+    Sorting new files of the folder as they land, until Ctrl+C.
+    Only changed folders are scanned again. Without inotify the folder is polled,
+    with inotify it's also scanned once in a while in case an event was missed
+    :param path: Path
+        selected folder for sorting
+    :param workers: int
+        number of threads moving files
+    :param duplicates: str
+        'report', 'hardlink' or 'skip', see sort_folder; None - duplicates aren't looked for
+    :return: None
+    """
+    cache = ScanCache(path)
+    try:
+        watcher = Watcher()
+    except (OSError, AttributeError):
+        watcher = None
+    print(f"Watching {path}{'' if watcher else ' by polling'}, press Ctrl+C to stop")
+    try:
+        while True:
+            cache.reset()
+            for error in sort_folder(path, workers=workers, cache=cache, duplicates=duplicates):
+                print(error)
+            if watcher is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            for folder in cache.folders:
+                if folder.exists():
+                    watcher.add(folder)
+            watcher.wait(RESCAN_INTERVAL)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        if watcher is not None:
+            watcher.close()
+
+
+class Progress:
+    """
+    Printing the number of processed steps and throughput not more often than once in a second
+    """
 
-    global folders_to_rename
-    folders_to_rename = []
+    def __init__(self, total: int) -> None:
+        self.started = self.printed = time.monotonic()
+        self.total = total
+        self.steps = 0
+
+    def add(self, steps: int) -> None:
+        self.steps += steps
+        now = time.monotonic()
+        if now - self.printed >= 1:
+            self.printed = now
+            self.print(end='\r')
+
+    def print(self, end: str = '\n') -> None:
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        print(f'processed {self.steps} of {self.total} steps, {self.steps / elapsed:.0f} steps/s', end=end, flush=True)
+
+
+def execute(plan: list, journal: SortJournal, done: set = frozenset(), workers: int = WORKERS) -> List[str]:
+    """
+    Executing steps of the plan which are not done yet.
+    Files are moved in batches by a pool of threads, archives are unpacked by a pool of processes
+    at the same time; afterwards duplicates are linked, folders are removed and renamed in order.
+    Done steps are recorded in the journal
+    :param plan: list
+    :param journal: SortJournal
+    :param done: set
+        numbers of steps done before the interruption
+    :param workers: int
+        number of threads moving files
+    :return: list
+        errors
+    """
+    errors = []
+    progress = Progress(len(plan) - len(done))
+    pending = [(number, step) for number, step in enumerate(plan) if number not in done]
+    files = [item for item in pending if item[1][0] == 'move']
+    archives = [item for item in pending if item[1][0] == 'unpack']
+    folders = [item for item in pending if item[1][0] in ('link', 'remove', 'rename')]
+
+    def collect(result):
+        numbers, batch_errors = result
+        journal.mark_done(numbers)
+        errors.extend(batch_errors)
+        progress.add(len(numbers) + len(batch_errors))
+
+    with ThreadPoolExecutor(workers) as threads, ProcessPoolExecutor() as processes:
+        unpacks = [processes.submit(run_steps, [item]) for item in archives]
+        moves = deque()
+        for start in range(0, len(files), BATCH_SIZE):
+            moves.append(threads.submit(run_steps, files[start:start + BATCH_SIZE]))
+            while len(moves) > workers * 2:
+                collect(moves.popleft().result())
+        for future in moves:
+            collect(future.result())
+        for future in unpacks:
+            collect(future.result())
+    for item in folders:
+        collect(run_steps([item]))
+    progress.print()
+    return errors
+
+
+def sort_folder(path: Path, dry_run: bool = False, workers: int = WORKERS, cache=None,
+                duplicates: str = None, limits: tuple = (MAX_SIZE, MAX_RATIO)) -> List[str]:
+    """
+    Sorting the folder: planning, then executing the plan through the journal.
+    If the journal of an interrupted sorting is found, its plan is resumed without scanning
+    :param path: Path
+        selected folder for sorting
+    :param dry_run: bool
+        if True, the plan is only printed
+    :param workers: int
+        number of threads moving files
+    :param cache: ScanCache
+        the scan cache of the folder, it's loaded from the folder by default
+    :param duplicates: str
+        what to do with files which are already sorted or moved by this run:
+        'report' - move them anyway, 'hardlink' - replace them with hard links, 'skip' - leave them in place;
+        None - duplicates aren't looked for, files aren't hashed
+    :param limits: tuple
+        maximal expanded size in bytes and compression ratio of archives,
+        an archive expanding more is left in place with the error
+    :return: list
+        errors
+    """
+    journal = SortJournal(path)
+    if journal.exists():
+        plan, done = journal.load()
+        print(f'Resuming interrupted sorting: {len(done)} of {len(plan)} steps are done')
+    else:
+        cache = cache or ScanCache(path)
+        dedup = {'policy': duplicates, 'hashes': HashCache(path), 'found': []} if duplicates else None
+        plan, done = plan_sort(path, cache, dedup, limits), set()
+        if not dry_run:
+            # the dry run leaves nothing in the folder
+            cache.save()
+            if dedup is not None:
+                dedup['hashes'].save()
+        for duplicate, original in dedup['found'] if dedup is not None else ():
+            print(f'duplicate {os.path.relpath(duplicate, path)} of {os.path.relpath(original, path)}')
+    if dry_run:
+        print_plan(plan, path, done)
+        return []
+    if len(done) == len(plan):
+        journal.remove()
+        return []
+    if not journal.exists():
+        journal.write_plan(plan)
+    errors = execute(plan, journal, done, workers)
+    journal.remove()
+    return errors
+
+
+@lru_cache(maxsize=65536)
+def normalize(old_name: str) -> str:
+    """
+    Normalizing files' & folders' names.
+    Translating cyrillic symbols to latin ones.
+    Amending unacceptable symbols to '_' symbol.
+    Both are done by one translate table, repeated names are taken from the cache.
+    :param old_name: str
+        folder/file's name before normalizing
+    :return new_name: str
+        folder/file's name after normalizing
+    """
+    return old_name.translate(name_table)
+
+
+def normalize_many(names: List[str]) -> List[str]:
+    """
+    Normalizing the list of names in one go: distinct names are joined and translated at once
+    :param names: list
+        folders/files' names before normalizing
+    :return: list
+        names after normalizing in the same order
+    """
+    distinct = list(dict.fromkeys(names))
+    normalized = dict(zip(distinct, SEPARATOR.join(distinct).translate(name_table).split(SEPARATOR)))
+    return [normalized[name] for name in names]
 
 
 def perform() -> None:
     """
     Sorting files to categorical folders. Normalising names of files & folders.
     Remoting empty folders. Unpacking archives.
+    The plan can be shown without changes, an interrupted sorting is resumed from the journal.
+    Repeated sorting scans only changed folders, new files can be sorted as they land (watch mode).
     """
 
     while True:
@@ -189,10 +798,24 @@ def perform() -> None:
                 path = Path(sorting_folder)
         break
 
-    find_files(path)
-    remove_empty_folders(empty_folders)
-    rename_folders(folders_to_rename)
-    print('sorting is complete')
+    while True:
+        duplicates = input(f"Duplicates: {', '.join(POLICIES)}? [Enter - don't look for them]: ").strip().lower()
+        if not duplicates:
+            duplicates = None
+            break
+        if duplicates in POLICIES:
+            break
+        print(f"Choose one of {', '.join(POLICIES)}")
+
+    dry_run = input('Only show the plan without changes? [y/N]: ').strip().lower() == 'y'
+    if not dry_run and input('Keep watching the folder and sort new files? [y/N]: ').strip().lower() == 'y':
+        watch(path, duplicates=duplicates)
+        return
+    errors = sort_folder(path, dry_run, duplicates=duplicates)
+    for error in errors:
+        print(error)
+    if not dry_run:
+        print('sorting is complete')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,1174 @@
+"""
+Storage backends of the address book & diary.
+The book reads records through the mappings 'persons' and 'notes'
+and changes them only through the methods of the backend.
+"""
+
+import copy
+import json
+import os
+import pickle
+import sqlite3
+import time
+from collections.abc import Mapping
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from threading import RLock
+
+from tools import snapshot
+from tools.columnar import Column, ColumnStore
+from tools.indexing import (COMPLETE_LIMIT, UNIQUE_FIELDS, BirthdayIndex, NameIndex, NoteIndex, TokenIndex,
+                            UniqueIndex, complete_by, email_value, group_duplicates, phone_value)
+from tools.journal import Journal, apply_record, load, write_snapshot
+from tools.saver import SAVE_INTERVAL, SAVE_THRESHOLD, BackgroundSaver
+
+
+SQLITE_SUFFIXES = ('.db', '.sqlite', '.sqlite3')
+
+
+def birthday_dates(start: datetime, days: int) -> dict:
+    """
+    Mapping (month, day) pairs of birthdays to the dates of the period when they are celebrated.
+    29 February is celebrated on 28 February of a non-leap year
+    :param start: datetime
+        first date of the period
+    :param days: int
+        length of the period, a year at most is taken
+    :return: dict
+        (month, day) tuple -> date
+    """
+    dates = {}
+    for shift in range(min(max(days, 0), 366)):
+        date = (start + timedelta(days=shift)).date()
+        dates.setdefault((date.month, date.day), date)
+        if (date.month, date.day) == (2, 28) and (date + timedelta(days=1)).month == 3:
+            dates.setdefault((2, 29), date)
+    return dates
+
+
+def birthday_keys(start: datetime, days: int) -> set:
+    """
+    Collecting (month, day) pairs of birthdays celebrated in the period
+    :param start: datetime
+        first date of the period
+    :param days: int
+        length of the period
+    :return: set
+        set of (month, day) tuples
+    """
+    return set(birthday_dates(start, days))
+
+
+class Storage:
+    """
+    A class is used to keep the address book & diary in memory.
+    ________________________________________________
+
+    Attributes
+    __________
+    persons : Mapping
+        contacts by names
+    notes : Mapping
+        notes by dates of creating
+    person_indexes : list
+        indexes of contacts which are built, they are updated on every change
+    note_indexes : list
+        indexes of notes which are built, they are updated on every change
+    lock : RLock
+        changes and copying for the background saver are made under it
+    unsaved : int
+        number of changes which are not saved yet
+
+    Methods
+    _______
+    put_person, pop_person, clear_persons
+        changing contacts
+    patch_person
+        changing fields of the contact, only changed fields are written
+    put_note, pop_note, clear_notes
+        changing notes
+    find_persons
+        searching contacts by a substring of any field, the token index is built on the first search
+    birthday_persons
+        searching contacts by days of birthdays, the calendar index is built on the first search
+    notes_with_keyword
+        searching notes by keyword
+    search_notes
+        searching notes by a part of tag or of the text
+    iter_found_notes
+        the same notes one by one, e.g. for the export
+    complete_names, complete_tags
+        completing names of contacts and tags of notes by the beginning, one typo is forgiven
+    keys_by, persons_by
+        searching contacts by the phone or the email through the hash index
+    conflict
+        checking that the phone and the email don't belong to another contact
+    duplicate_groups
+        finding groups of contacts which share a phone or an email
+    enable_columns
+        keeping the columnar copy of contacts, searching runs over it as vectorized masks
+    filter_persons
+        searching contacts by the filter expression over columns
+    transaction
+        context manager, changes made inside are written together
+    close
+        saving changes before exit
+
+    """
+
+    def __init__(self) -> None:
+        self.persons = {}
+        self.notes = {}
+        self.person_indexes = []
+        self.note_indexes = []
+        self.token_index = None
+        self.birthday_index = None
+        self.note_index = None
+        self.name_index = None
+        self.unique_indexes = {}
+        self.column_store = None
+        self.lock = RLock()
+        self.unsaved = 0
+        self.saver = None
+
+    def put_person(self, key, person) -> None:
+        with self.lock:
+            self.persons[key] = person
+            for index in self.person_indexes:
+                index.add(key, person)
+            self.changed()
+
+    def pop_person(self, key) -> None:
+        with self.lock:
+            del self.persons[key]
+            for index in self.person_indexes:
+                index.discard(key)
+            self.changed()
+
+    def clear_persons(self) -> None:
+        with self.lock:
+            self.persons.clear()
+            for index in self.person_indexes:
+                index.clear()
+            self.changed()
+
+    def patch_person(self, key, changes: dict, when: int = None) -> dict:
+        """
+        Changing fields of the contact, old values are kept in its history.
+        The contact is copied before changing, so the copy of the book being written by the background saver
+        isn't changed; fields themselves are shared by both contacts
+        :param key: str
+            name of the contact
+        :param changes: dict
+            field -> new value like Person.get_value returns it
+        :param when: int
+            seconds since the epoch, now by default
+        :return: dict
+            fields which are really changed
+        :raise KeyError: if the contact isn't found
+        """
+        with self.lock:
+            person = copy.copy(self.persons[key])
+            applied = person.apply(changes, int(time.time()) if when is None else when)
+            if applied:
+                self.persons[key] = person
+                for index in self.person_indexes:
+                    index.add(key, person)
+                self.changed()
+            return applied
+
+    def put_note(self, key, note) -> None:
+        with self.lock:
+            self.notes[key] = note
+            for index in self.note_indexes:
+                index.add(key, note)
+            self.changed()
+
+    def pop_note(self, key) -> None:
+        with self.lock:
+            del self.notes[key]
+            for index in self.note_indexes:
+                index.discard(key)
+            self.changed()
+
+    def clear_notes(self) -> None:
+        with self.lock:
+            self.notes.clear()
+            for index in self.note_indexes:
+                index.clear()
+            self.changed()
+
+    def changed(self) -> None:
+        """
+        Counting the change, the background saver is woken up when enough changes are made
+        :return: None
+        """
+        self.unsaved += 1
+        if self.saver is not None:
+            self.saver.notify(self.unsaved)
+
+    def find_persons(self, text: str):
+        """
+        Searching contacts which contain the text in any field.
+        Contacts matched by name go first, then by phone, email, address, birthday
+        :param text: str
+            searched text, case insensitive
+        :return: generator
+            found contacts
+        """
+        if self.column_store is not None:
+            for key in self.column_store.search(text):
+                yield self.persons[key]
+            return
+        for key in self.get_token_index().search(text):
+            yield self.persons[key]
+
+    def birthday_persons(self, keys: set):
+        """
+        Searching contacts which have birthday on one of the days
+        :param keys: set
+            set of (month, day) tuples, see birthday_keys
+        :return: generator
+            (name, contact) tuples
+        """
+        if self.column_store is not None:
+            for name in self.column_store.filter(Column('birthday').born_on(keys)):
+                yield name, self.persons[name]
+            return
+        birthday_index = self.get_birthday_index()
+        for month, day in sorted(keys):
+            for name in list(birthday_index.keys_on(month, day)):
+                yield name, self.persons[name]
+
+    def enable_columns(self) -> None:
+        """
+        Building the columnar copy of contacts, it needs numpy
+        """
+        with self.lock:
+            if self.column_store is None:
+                self.column_store = ColumnStore(self.persons.items())
+                self.person_indexes.append(self.column_store)
+
+    def filter_persons(self, expression):
+        """
+        Searching contacts by the filter expression, see tools.columnar
+        :param expression: Expression
+            e.g. Column('email').endswith('@corp.com') & Column('birthday').between(date(1980, 1, 1), date(1989, 12, 31))
+        :return: generator
+            (name, contact) tuples
+        """
+        self.enable_columns()
+        for name in self.column_store.filter(expression):
+            yield name, self.persons[name]
+
+    def notes_with_keyword(self, keyword: str) -> list:
+        """
+        Searching notes which have the keyword among tags
+        :param keyword: str
+            exact keyword
+        :return: list
+            (key, note) tuples
+        """
+        return [(key, self.notes[key]) for key in self.get_note_index().with_tag(keyword)]
+
+    def search_notes(self, text: str) -> tuple:
+        """
+        Searching notes by a part of tag or by a part of the text
+        :param text: str
+            tag or its part, phrase or its part, e.g. 'ilk' finds "buy milk"
+        :return: tuple
+            1st element: notes which have a tag containing the text
+            2nd element: other notes which contain the text, case insensitive
+        """
+        index = self.get_note_index()
+        by_key = index.with_tag_part(text)
+        found = set(by_key)
+        by_text = [key for key in index.with_phrase(text) if key not in found]
+        return [self.notes[key] for key in by_key], [self.notes[key] for key in by_text]
+
+    def iter_found_notes(self, text: str):
+        """
+        Taking notes found like search_notes one by one, notes with the tag go first.
+        Only keys of matches are kept, notes are taken from the storage when they are needed
+        :param text: str
+        :return: generator
+            notes
+        """
+        index = self.get_note_index()
+        by_key = index.with_tag_part(text)
+        for key in by_key:
+            yield self.notes[key]
+        found = set(by_key)
+        for key in index.with_phrase(text):
+            if key not in found:
+                yield self.notes[key]
+
+    def complete_names(self, prefix: str, limit: int = COMPLETE_LIMIT) -> list:
+        """
+        Completing the name of the contact, the index of names is built on the first use
+        and kept in sync with every change
+        :param prefix: str
+            beginning of the name, case insensitive, one typo is forgiven
+        :param limit: int
+        :return: list
+            names
+        """
+        with self.lock:
+            if self.name_index is None:
+                self.name_index = NameIndex(self.persons)
+                self.person_indexes.append(self.name_index)
+            return self.name_index.complete(prefix, limit)
+
+    def complete_tags(self, prefix: str, limit: int = COMPLETE_LIMIT) -> list:
+        """
+        Completing the tag of notes
+        :param prefix: str
+            beginning of the tag, one typo is forgiven
+        :param limit: int
+        :return: list
+            tags
+        """
+        with self.lock:
+            return self.get_note_index().complete_tag(prefix, limit)
+
+    def get_unique_index(self, field: str) -> UniqueIndex:
+        """
+        Getting the hash index of phones or emails, it's built on the first use
+        :param field: str
+            'phone' or 'email'
+        :return: UniqueIndex
+        """
+        with self.lock:
+            index = self.unique_indexes.get(field)
+            if index is None:
+                index = self.unique_indexes[field] = UniqueIndex(field, self.persons.items())
+                self.person_indexes.append(index)
+            return index
+
+    def keys_by(self, field: str, value: str) -> list:
+        """
+        Searching names of contacts by the phone or the email
+        :param field: str
+            'phone' or 'email'
+        :param value: str
+            phone in E.164 format or email, case insensitive
+        :return: list
+            names
+        """
+        return self.get_unique_index(field).get(value)
+
+    def persons_by(self, field: str, value: str) -> list:
+        """
+        Searching contacts by the phone or the email
+        :param field: str
+            'phone' or 'email'
+        :param value: str
+        :return: list
+            (name, contact) tuples
+        """
+        return [(key, self.persons[key]) for key in self.keys_by(field, value)]
+
+    def conflict(self, name: str, phone: str = None, email: str = None) -> str:
+        """
+        Checking that the phone and the email don't belong to another contact
+        :param name: str
+            name of the checked contact, its own values are not a conflict
+        :param phone: str
+        :param email: str
+        :return: str or None
+            the reason of the conflict, None if there is no conflict
+        """
+        for field, value in (('phone', phone), ('email', email)):
+            owners = [key for key in self.keys_by(field, value) if key != name]
+            if owners:
+                return f"{field.capitalize()} {value} already belongs to {owners[0]}"
+        return None
+
+    def shared_values(self, field: str):
+        """
+        Finding phones or emails which belong to more than one contact
+        :param field: str
+        :return: iterable
+            (value, list of names) tuples
+        """
+        return self.get_unique_index(field).duplicates()
+
+    def duplicate_groups(self) -> list:
+        """
+        Finding groups of contacts which share a phone or an email, directly or through each other
+        :return: list
+            lists of names
+        """
+        return group_duplicates(keys for field in UNIQUE_FIELDS for _, keys in self.shared_values(field))
+
+    def get_token_index(self) -> TokenIndex:
+        """
+        Getting the index of trigrams of contacts, it's built once on the first use,
+        even if the first searches run at once
+        :return: TokenIndex
+        """
+        with self.lock:
+            if self.token_index is None:
+                self.token_index = TokenIndex(self.persons.items())
+                self.person_indexes.append(self.token_index)
+            return self.token_index
+
+    def get_birthday_index(self) -> BirthdayIndex:
+        """
+        Getting the calendar index of birthdays, it's built once on the first use
+        :return: BirthdayIndex
+        """
+        with self.lock:
+            if self.birthday_index is None:
+                self.birthday_index = BirthdayIndex(self.persons.items())
+                self.person_indexes.append(self.birthday_index)
+            return self.birthday_index
+
+    def get_note_index(self) -> NoteIndex:
+        """
+        Getting the index of notes, it's built once on the first use
+        :return: NoteIndex
+        """
+        with self.lock:
+            if self.note_index is None:
+                self.note_index = NoteIndex(self.notes.items())
+                self.note_indexes.append(self.note_index)
+            return self.note_index
+
+    @contextmanager
+    def transaction(self):
+        """
+        Writing changes made inside the block together, e.g. during bulk import
+        """
+        yield self
+
+    @contextmanager
+    def reading(self):
+        """
+        Reading the book by a thread while the background saver may save it, e.g. by the server:
+        records which are read inside the block aren't unmapped by the saver
+        """
+        yield self
+
+    def close(self) -> None:
+        pass
+
+
+class PickleStorage(Storage):
+    """
+    The whole book is kept in memory and rewritten into the pickle file on exit,
+    or by the background saver while the book is used.
+    """
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.path = path
+        self.load()
+
+    def load(self) -> None:
+        """
+        Reading the whole book from the pickle file
+        """
+        if not os.path.exists(self.path):
+            with open(self.path, 'wb') as db:
+                pickle.dump({}, db)
+        else:
+            with open(self.path, 'rb') as db:
+                data = load(db)
+                self.persons = data.get("persons", self.persons)
+                self.notes = data.get("notes", self.notes)
+
+    def save(self) -> None:
+        """
+        Writing the whole book into the pickle file
+        """
+        self.write_data(self.copy_data())
+
+    def copy_data(self) -> dict:
+        """
+        Copying the book for writing while it's being changed, it's called under the lock
+        :return: dict
+            sections of the book
+        """
+        return {"persons": dict(self.persons), "notes": dict(self.notes)}
+
+    def write_data(self, data: dict) -> None:
+        """
+        Writing the copy of the book atomically: to the temporary file first, then renaming it
+        :param data: dict
+            result of copy_data
+        :return: None
+        """
+        write_snapshot(self.path, data)
+
+    def start_saver(self, interval: float = SAVE_INTERVAL, threshold: int = SAVE_THRESHOLD) -> None:
+        """
+        Saving changes by the background thread, so commands don't wait for the disk
+        :param interval: float
+            seconds between saving of changes
+        :param threshold: int
+            number of changes which are saved at once, without waiting for the interval
+        :return: None
+        """
+        if self.saver is None:
+            self.saver = BackgroundSaver(self, interval, threshold)
+            self.saver.start()
+
+    def persist(self) -> None:
+        """
+        Saving changes made since the previous call, it's called by the background saver.
+        The book is copied under the lock and written without it
+        :return: None
+        """
+        with self.lock:
+            unsaved = self.unsaved
+            if not unsaved:
+                return
+            data = self.copy_data()
+        self.write_data(data)
+        with self.lock:
+            self.unsaved -= unsaved
+
+    def close(self) -> None:
+        if self.saver is not None:
+            self.saver.stop()
+            return
+        self.save()
+
+
+class JournalStorage(PickleStorage):
+    """
+    The book is kept in memory, every change is appended to the log file '<path>.log'.
+    The pickle file is rewritten only during compaction.
+    """
+
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        super().__init__(path)
+        self.journal = Journal(f'{path}.log', compact_every)
+        data = {"persons": self.persons, "notes": self.notes}
+        for record in self.journal.replay():
+            apply_record(data, record)
+        if self.journal.has_rotated():
+            # the background compaction was interrupted
+            self.compact()
+
+    def put_person(self, key, person) -> None:
+        with self.lock:
+            super().put_person(key, person)
+            self.log('put', 'persons', key, person)
+
+    def pop_person(self, key) -> None:
+        with self.lock:
+            super().pop_person(key)
+            self.log('pop', 'persons', key)
+
+    def clear_persons(self) -> None:
+        with self.lock:
+            super().clear_persons()
+            self.log('clear', 'persons')
+
+    def patch_person(self, key, changes: dict, when: int = None) -> dict:
+        """
+        Changing fields of the contact, the journal gets only changed fields instead of the whole contact
+        """
+        when = int(time.time()) if when is None else when
+        with self.lock:
+            applied = super().patch_person(key, changes, when)
+            if applied:
+                self.log('patch', 'persons', key, applied, when)
+            return applied
+
+    def put_note(self, key, note) -> None:
+        with self.lock:
+            super().put_note(key, note)
+            self.log('put', 'notes', key, note)
+
+    def pop_note(self, key) -> None:
+        with self.lock:
+            super().pop_note(key)
+            self.log('pop', 'notes', key)
+
+    def clear_notes(self) -> None:
+        with self.lock:
+            super().clear_notes()
+            self.log('clear', 'notes')
+
+    def log(self, *record) -> None:
+        """
+        Appending the change to the journal and compacting the journal when it grows
+        """
+        self.journal.append(*record)
+        if self.journal.sync and self.journal.needs_compaction():
+            self.compact()
+
+    @contextmanager
+    def transaction(self):
+        """
+        Appending changes made inside the block to the journal with a single flush to the disk
+        """
+        if not self.journal.sync:
+            yield self
+            return
+        self.journal.sync = False
+        try:
+            yield self
+        finally:
+            self.journal.sync = True
+            self.journal.flush()
+            if self.journal.needs_compaction():
+                self.compact()
+
+    def compact(self) -> None:
+        """
+        Writing the whole book into the snapshot and emptying the journal
+        """
+        self.save()
+        self.journal.truncate()
+        self.journal.remove_rotated()
+
+    def start_saver(self, interval: float = SAVE_INTERVAL, threshold: int = SAVE_THRESHOLD) -> None:
+        """
+        Saving changes by the background thread: records are appended to the journal without
+        waiting for the disk, the thread flushes them and compacts the journal
+        :param interval: float
+            seconds between flushes of the journal
+        :param threshold: int
+            number of changes which are flushed at once, without waiting for the interval
+        :return: None
+        """
+        self.journal.sync = False
+        super().start_saver(interval, threshold)
+
+    def persist(self) -> None:
+        """
+        Flushing the journal, it's called by the background saver. When the journal has grown,
+        it's rotated and the copy of the book is written into the snapshot without the lock;
+        changes made meanwhile go to the new journal
+        :return: None
+        """
+        with self.lock:
+            unsaved = self.unsaved
+        if not unsaved:
+            return
+        self.journal.flush()
+        data = None
+        with self.lock:
+            # the rotated journal is left by a failed writing, the snapshot is written again
+            if self.journal.needs_compaction() or self.journal.has_rotated():
+                data = self.copy_data()
+                if not self.journal.has_rotated():
+                    self.journal.rotate()
+        if data is not None:
+            self.write_data(data)
+            self.reload()
+            # records of the rotated log are in the snapshot now
+            self.journal.remove_rotated()
+        with self.lock:
+            self.unsaved -= unsaved
+
+    def reload(self) -> None:
+        """
+        Taking the written snapshot after the background compaction, the book in memory is up to date.
+        It's called without the lock
+        :return: None
+        """
+
+    def close(self) -> None:
+        if self.saver is not None:
+            self.saver.stop()
+        self.journal.close()
+
+
+class SnapshotStorage(JournalStorage):
+    """
+    The book is kept in the snapshot file opened through mmap, records are decoded on access.
+    Every change is appended to the log file '<path>.log' and kept in memory on top of the snapshot.
+    The snapshot is rewritten only during compaction: the new one is written next to it as '<path>.tmp'
+    and replaces it in load, after the old one is unmapped.
+    """
+
+    written = None
+
+    def __init__(self, path: str, compact_every: int = 1000) -> None:
+        self.readers = snapshot.Readers()
+        super().__init__(path, compact_every)
+
+    def load(self) -> None:
+        """
+        Mapping the snapshot into memory, no records are decoded.
+        The snapshot written by write_data replaces the mapped one first
+        """
+        self.unmap()
+        if self.written is not None:
+            os.replace(self.written, self.path)
+            self.written = None
+        if not os.path.exists(self.path):
+            snapshot.write(self.path, {"persons": [], "notes": []})
+        sections = snapshot.open_sections(self.path)
+        self.persons = snapshot.OverlayTable(sections["persons"])
+        self.notes = snapshot.OverlayTable(sections["notes"])
+
+    def save(self) -> None:
+        """
+        Writing the book into the new snapshot, unchanged records are copied without decoding
+        """
+        self.write_data(self.copy_data())
+        self.load()
+
+    def copy_data(self) -> dict:
+        """
+        Copying changes on top of the snapshot, the snapshot itself isn't changed until it's replaced
+        """
+        return {"persons": self.persons.copy(), "notes": self.notes.copy()}
+
+    def write_data(self, data: dict) -> None:
+        """
+        Writing the new snapshot next to the mapped one, records are copied from the mapped one,
+        so it's replaced only in load
+        """
+        written = f'{self.path}.tmp'
+        snapshot.write_file(written, {section: table.raw_items() for section, table in data.items()})
+        self.written = written
+
+    def unmap(self) -> None:
+        """
+        Closing the mapping of the snapshot
+        """
+        for table in (self.persons, self.notes):
+            if isinstance(table, snapshot.OverlayTable):
+                table.close()
+
+    def close(self) -> None:
+        super().close()
+        self.unmap()
+
+    def reading(self):
+        return self.readers.reading()
+
+    def reload(self) -> None:
+        """
+        Mapping the new snapshot and applying changes made during the background compaction
+        from the new journal. The old snapshot is unmapped when threads reading it are done,
+        they are waited for before the lock is taken, as they may wait for the lock themselves
+        """
+        with self.readers.replacing_mapping(), self.lock:
+            self.journal.flush()
+            self.load()
+            data = {"persons": self.persons, "notes": self.notes}
+            for record in self.journal.replay_file(self.journal.path):
+                apply_record(data, record)
+
+
+def migrate_to_snapshot(path: str) -> None:
+    """
+    Converting the pickle file (and its journal) into the snapshot format
+    :param path: str
+        location of the pickle file
+    :return: None
+    """
+    if snapshot.is_snapshot(path):
+        return
+    storage = JournalStorage(path)
+    snapshot.write(path, {
+        "persons": ((key, pickle.dumps(person)) for key, person in storage.persons.items()),
+        "notes": ((key, pickle.dumps(note)) for key, note in storage.notes.items()),
+    })
+    storage.journal.truncate()
+
+
+class SqliteTable(Mapping):
+    """
+    Read-only mapping over a table of the SQLite database.
+    Records are decoded only when they are accessed.
+    """
+
+    def __init__(self, connection: sqlite3.Connection, table: str, key: str, decode) -> None:
+        self.connection = connection
+        self.table = table
+        self.key = key
+        self.decode = decode
+
+    def __getitem__(self, key):
+        row = self.connection.execute(
+            f'SELECT * FROM {self.table} WHERE {self.key} = ?', (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return self.decode(row)
+
+    def __contains__(self, key) -> bool:
+        return self.connection.execute(
+            f'SELECT 1 FROM {self.table} WHERE {self.key} = ?', (key,)).fetchone() is not None
+
+    def __iter__(self):
+        for row in self.connection.execute(f'SELECT {self.key} FROM {self.table} ORDER BY rowid'):
+            yield row[0]
+
+    def __len__(self) -> int:
+        return self.connection.execute(f'SELECT count(*) FROM {self.table}').fetchone()[0]
+
+    def __bool__(self) -> bool:
+        return self.connection.execute(f'SELECT 1 FROM {self.table} LIMIT 1').fetchone() is not None
+
+    def values(self):
+        for row in self.connection.execute(f'SELECT * FROM {self.table} ORDER BY rowid'):
+            yield self.decode(row)
+
+    def items(self):
+        for row in self.connection.execute(f'SELECT * FROM {self.table} ORDER BY rowid'):
+            yield row[self.key], self.decode(row)
+
+
+class SqliteStorage(Storage):
+    """
+    The book is kept in the SQLite database and read lazily.
+    Contacts are indexed by name, phone, email and month/day of birthday.
+    More addresses, phones and emails of the contact are kept in the table person_values
+    and as JSON in the column extra, the history of changes is kept as JSON in the column history.
+    Names are completed by the index of lowercased names in the column name_key, the book isn't loaded.
+    Phones and emails are found by the columns phone_key and email_key, which keep them like the hash index.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS persons (
+            name TEXT PRIMARY KEY,
+            address TEXT,
+            phone TEXT,
+            email TEXT,
+            birthday TEXT,
+            birthday_md INTEGER,
+            extra TEXT,
+            history TEXT,
+            name_key TEXT,
+            phone_key TEXT,
+            email_key TEXT
+        );
+        CREATE INDEX IF NOT EXISTS persons_birthday_md ON persons (birthday_md);
+        CREATE TABLE IF NOT EXISTS person_values (
+            name TEXT,
+            field TEXT,
+            value TEXT
+        );
+        CREATE INDEX IF NOT EXISTS person_values_value ON person_values (field, value);
+        CREATE INDEX IF NOT EXISTS person_values_name ON person_values (name);
+        CREATE TABLE IF NOT EXISTS notes (
+            date TEXT PRIMARY KEY,
+            value TEXT,
+            keywords TEXT
+        );
+    '''
+
+    # columns of the values which are searched by the index: column -> its value of the row
+    KEY_COLUMNS = {'name_key': 'lower_text(name)', 'phone_key': 'phone_value(phone)', 'email_key': 'email_value(email)'}
+
+    def __init__(self, path: str, person_type, note_type) -> None:
+        super().__init__()
+        self.path = path
+        self.person_type = person_type
+        self.note_type = note_type
+        self.connection = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.create_function('lower_text', 1, lambda text: (text or '').lower(), deterministic=True)
+        self.connection.create_function('phone_value', 1, phone_value, deterministic=True)
+        self.connection.create_function('email_value', 1, email_value, deterministic=True)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+        columns = {row['name'] for row in self.connection.execute('PRAGMA table_info(persons)')}
+        for column in ('extra', 'history'):
+            if column not in columns:
+                # databases made before contacts got more values and the history
+                self.connection.execute(f'ALTER TABLE persons ADD COLUMN {column} TEXT')
+        for column, value in self.KEY_COLUMNS.items():
+            if column not in columns:
+                # databases made before names were completed and phones were found by the index,
+                # phones written before they were normalized are found too
+                self.connection.execute(f'ALTER TABLE persons ADD COLUMN {column} TEXT')
+                self.connection.execute(f'UPDATE persons SET {column} = {value}')
+            self.connection.execute(f'CREATE INDEX IF NOT EXISTS persons_{column} ON persons ({column})')
+        for index in ('persons_phone', 'persons_email', 'persons_email_lower'):
+            # indexes of raw phones and emails are replaced by the ones of the key columns
+            self.connection.execute(f'DROP INDEX IF EXISTS {index}')
+        self.persons = SqliteTable(self.connection, 'persons', 'name', self.decode_person)
+        self.notes = SqliteTable(self.connection, 'notes', 'date', self.decode_note)
+
+    def decode_person(self, row: sqlite3.Row):
+        """
+        Making the contact of the row like it's unpickled: the birthday is kept in ISO format
+        and isn't parsed by dateutil, it's the ordinal of the date in the contact
+        """
+        extra = history = None
+        if row['extra']:
+            extra = {field: tuple(values) for field, values in json.loads(row['extra']).items()}
+        if row['history']:
+            history = tuple((when, field, tuple(old) if isinstance(old, list) else old)
+                            for when, field, old in json.loads(row['history']))
+        person = self.person_type.__new__(self.person_type)
+        person.__setstate__((row['name'], row['address'], row['phone'], row['email'],
+                             datetime.fromisoformat(row['birthday']).toordinal(), extra, history))
+        return person
+
+    def decode_note(self, row: sqlite3.Row):
+        note = self.note_type(row['value'], json.loads(row['keywords']))
+        note.date = row['date']
+        return note
+
+    def put_person(self, key, person) -> None:
+        with self.lock:
+            birthday = person["birthday"]
+            extra = person["extra"] or {}
+            self.connection.execute(
+                '''INSERT INTO persons (name, address, phone, email, birthday, birthday_md, extra, history,
+                                       name_key, phone_key, email_key)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT (name) DO UPDATE SET address = excluded.address, phone = excluded.phone,
+                   email = excluded.email, birthday = excluded.birthday, birthday_md = excluded.birthday_md,
+                   extra = excluded.extra, history = excluded.history,
+                   phone_key = excluded.phone_key, email_key = excluded.email_key''',
+                (key, person["address"], person["phone"], person["email"],
+                 birthday.isoformat(), birthday.month * 100 + birthday.day,
+                 json.dumps(extra, ensure_ascii=False) if extra else None,
+                 json.dumps(person["history"], ensure_ascii=False) if person["history"] else None,
+                 key.lower(), phone_value(person["phone"]), email_value(person["email"])))
+            self.connection.execute('DELETE FROM person_values WHERE name = ?', (key,))
+            self.connection.executemany(
+                'INSERT INTO person_values (name, field, value) VALUES (?, ?, ?)',
+                [(key, field, value) for field, values in extra.items() for value in map(self.value_key(field), values)
+                 if value is not None])
+            for index in self.person_indexes:
+                index.add(key, person)
+
+    def pop_person(self, key) -> None:
+        with self.lock:
+            if self.connection.execute('DELETE FROM persons WHERE name = ?', (key,)).rowcount == 0:
+                raise KeyError(key)
+            self.connection.execute('DELETE FROM person_values WHERE name = ?', (key,))
+            for index in self.person_indexes:
+                index.discard(key)
+
+    def clear_persons(self) -> None:
+        with self.lock:
+            self.connection.execute('DELETE FROM persons')
+            self.connection.execute('DELETE FROM person_values')
+            for index in self.person_indexes:
+                index.clear()
+
+    def patch_person(self, key, changes: dict, when: int = None) -> dict:
+        """
+        Changing fields of the contact, the row of the contact is updated in place
+        """
+        with self.lock:
+            person = self.persons[key]
+            applied = person.apply(changes, int(time.time()) if when is None else when)
+            if applied:
+                self.put_person(key, person)
+            return applied
+
+    @staticmethod
+    def value_key(field: str):
+        """
+        Turning more values of the field into values of the table person_values:
+        phones and emails like in the hash index, addresses lowercased for searching
+        """
+        return UNIQUE_FIELDS.get(field, lambda value: value.lower() if value else None)
+
+    def put_note(self, key, note) -> None:
+        with self.lock:
+            self.connection.execute(
+                '''INSERT INTO notes (date, value, keywords) VALUES (?, ?, ?)
+                   ON CONFLICT (date) DO UPDATE SET value = excluded.value, keywords = excluded.keywords''',
+                (key, note.value, json.dumps(note.keyWords, ensure_ascii=False)))
+            for index in self.note_indexes:
+                index.add(key, note)
+
+    def pop_note(self, key) -> None:
+        with self.lock:
+            if self.connection.execute('DELETE FROM notes WHERE date = ?', (key,)).rowcount == 0:
+                raise KeyError(key)
+            for index in self.note_indexes:
+                index.discard(key)
+
+    def clear_notes(self) -> None:
+        with self.lock:
+            self.connection.execute('DELETE FROM notes')
+            for index in self.note_indexes:
+                index.clear()
+
+    def find_persons(self, text: str):
+        rank = '''CASE WHEN instr(lower_text(name), :text) THEN 0
+                       WHEN instr(lower_text(phone), :text) THEN 1
+                       WHEN instr(lower_text(email), :text) THEN 2
+                       WHEN instr(lower_text(address), :text) THEN 3
+                       WHEN instr(substr(birthday, 1, 10), :text) THEN 4
+                       WHEN extra IS NOT NULL AND EXISTS (
+                           SELECT 1 FROM person_values WHERE person_values.name = persons.name
+                           AND instr(person_values.value, :text)) THEN 5 END'''
+        rows = self.connection.execute(
+            f'SELECT * FROM (SELECT *, {rank} AS rank FROM persons) WHERE rank IS NOT NULL ORDER BY rank, rowid',
+            {'text': text.lower()})
+        for row in rows:
+            yield self.decode_person(row)
+
+    def complete_names(self, prefix: str, limit: int = COMPLETE_LIMIT) -> list:
+        """
+        Completing the name of the contact by the index of lowercased names, one typo is forgiven
+        """
+        return complete_by(prefix.lower(), limit, self.names_starting, self.next_name_symbols)
+
+    def names_starting(self, prefix: str, limit: int) -> list:
+        """
+        Taking names which begin with the lowercased prefix in the order of the index
+        :param prefix: str
+        :param limit: int
+        :return: list
+        """
+        end = prefix_end(prefix)
+        rows = self.connection.execute(
+            f'''SELECT name FROM persons WHERE name_key >= ? {'AND name_key < ?' if end else ''}
+                ORDER BY name_key, rowid LIMIT ?''',
+            (prefix, end, limit) if end else (prefix, limit))
+        return [row[0] for row in rows]
+
+    def next_name_symbols(self, stem: str):
+        """
+        Finding symbols which follow the lowercased stem in names, like next_symbols:
+        names with the same next symbol are jumped over by one query of the index
+        :param stem: str
+        :return: generator
+            symbols in sorted order
+        """
+        end = prefix_end(stem)
+        # the least name longer than the stem
+        bound = stem + '\0'
+        while True:
+            row = self.connection.execute(
+                f'''SELECT name_key FROM persons WHERE name_key >= ? {'AND name_key < ?' if end else ''}
+                    ORDER BY name_key LIMIT 1''',
+                (bound, end) if end else (bound,)).fetchone()
+            if row is None:
+                return
+            symbol = row[0][len(stem)]
+            yield symbol
+            bound = prefix_end(stem + symbol)
+
+    def keys_by(self, field: str, value: str) -> list:
+        value = UNIQUE_FIELDS[field](value)
+        if value is None:
+            return []
+        names = [row[0] for row in self.connection.execute(
+            f'SELECT name FROM persons WHERE {field}_key = ? ORDER BY rowid', (value,))]
+        names.extend(row[0] for row in self.connection.execute(
+            'SELECT name FROM person_values WHERE field = ? AND value = ? ORDER BY rowid', (field, value))
+            if row[0] not in names)
+        return names
+
+    def shared_values(self, field: str):
+        rows = self.connection.execute(
+            f'''SELECT value, json_group_array(DISTINCT name) FROM (
+                   SELECT {field}_key AS value, name FROM persons WHERE {field}_key IS NOT NULL
+                   UNION ALL SELECT value, name FROM person_values WHERE field = ?
+               ) GROUP BY value HAVING count(DISTINCT name) > 1''', (field,))
+        for value, names in rows:
+            yield value, json.loads(names)
+
+    def birthday_persons(self, keys: set):
+        keys = sorted(month * 100 + day for month, day in keys)
+        if not keys:
+            return
+        placeholders = ', '.join('?' * len(keys))
+        rows = self.connection.execute(
+            f'SELECT * FROM persons WHERE birthday_md IN ({placeholders}) ORDER BY rowid', keys)
+        for row in rows:
+            yield row['name'], self.decode_person(row)
+
+    def notes_with_keyword(self, keyword: str) -> list:
+        rows = self.connection.execute(
+            '''SELECT * FROM notes WHERE EXISTS (SELECT 1 FROM json_each(notes.keywords) WHERE value = ?)
+               ORDER BY date''',
+            (keyword,))
+        return [(row['date'], self.decode_note(row)) for row in rows]
+
+    def search_notes(self, text: str) -> tuple:
+        by_key = self.connection.execute(
+            '''SELECT * FROM notes WHERE EXISTS (
+                   SELECT 1 FROM json_each(notes.keywords) WHERE instr(value, :text)
+               ) ORDER BY date''',
+            {'text': text}).fetchall()
+        found = {row['date'] for row in by_key}
+        by_text = self.connection.execute(
+            'SELECT * FROM notes WHERE instr(lower_text(value), ?) ORDER BY date', (text.lower(),))
+        return ([self.decode_note(row) for row in by_key],
+                [self.decode_note(row) for row in by_text if row['date'] not in found])
+
+    def iter_found_notes(self, text: str):
+        with_tag = 'EXISTS (SELECT 1 FROM json_each(notes.keywords) WHERE instr(value, :text))'
+        for row in self.connection.execute(f'SELECT * FROM notes WHERE {with_tag} ORDER BY date', {'text': text}):
+            yield self.decode_note(row)
+        rows = self.connection.execute(
+            f'SELECT * FROM notes WHERE instr(lower_text(value), :lower) AND NOT {with_tag} ORDER BY date',
+            {'text': text, 'lower': text.lower()})
+        for row in rows:
+            yield self.decode_note(row)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Running changes made inside the block in one SQLite transaction,
+        other threads don't write into the connection until it is committed
+        """
+        with self.lock:
+            if self.connection.in_transaction:
+                yield self
+                return
+            self.connection.execute('BEGIN')
+            try:
+                yield self
+            except BaseException:
+                self.connection.execute('ROLLBACK')
+                raise
+            self.connection.execute('COMMIT')
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def prefix_end(prefix: str):
+    """
+    Making the least string which is greater than all strings beginning with the prefix,
+    so the prefix is searched in the index as a range
+    :param prefix: str
+    :return: str or None
+        None for the empty prefix, all strings begin with it
+    """
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1) if prefix else None
+
+
+def open_storage(path: str, person_type=None, note_type=None, journal: bool = True,
+                 background: bool = False) -> Storage:
+    """
+    Choosing the storage backend by the file:
+    .db, .sqlite, .sqlite3 - SQLite database, file in the snapshot format - snapshot, any other - pickle file
+    :param path: str
+        location of the database
+    :param person_type: type
+        class of contacts, needed to decode SQLite rows
+    :param note_type: type
+        class of notes, needed to decode SQLite rows
+    :param journal: bool
+        if True, changes of the pickle file are journaled
+    :param background: bool
+        if True, changes of the pickle file or the snapshot are saved by the background thread;
+        SQLite writes changes itself
+    :return: Storage
+    """
+    if Path(path).suffix.lower() in SQLITE_SUFFIXES:
+        return SqliteStorage(path, person_type, note_type)
+    if snapshot.is_snapshot(path):
+        storage = SnapshotStorage(path)
+    elif journal:
+        storage = JournalStorage(path)
+    else:
+        storage = PickleStorage(path)
+    if background:
+        storage.start_saver()
+    return storage
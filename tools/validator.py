@@ -1,10 +1,177 @@
 """
-This module includes functions which are used to validate data inputting a user
+This module includes functions which are used to validate data inputting a user.
+Pure validate_* functions check values and return normalized ones or raise ValueError,
+so they are used by interactive functions and by bulk import alike.
 """
-from email.policy import default
-import phonenumbers
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from itertools import islice
+import os
 import re
 
+from tools.lazy import lazy_import
+
+phonenumbers = lazy_import('phonenumbers')
+
+
+EMAIL_PATTERN = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
+EMAIL = re.compile(EMAIL_PATTERN)
+BATCH_SIZE = 1000
+
+
+def validate_name(name: str) -> str:
+    """
+    Validating name that it consists of only letters
+    :param name: str
+    :return: str
+        validated name
+    :raise ValueError: if the name is invalid
+    """
+    if isinstance(name, str) and name.isalpha():
+        return name
+    raise ValueError(f"Invalid Name: {name!r}")
+
+
+def validate_email(email: str) -> str:
+    """
+    Validating email on the precompiled pattern
+    :param email: str
+    :return: str
+        validated email
+    :raise ValueError: if the email is invalid
+    """
+    if isinstance(email, str) and EMAIL.fullmatch(email):
+        return email
+    raise ValueError(f"Invalid Email: {email!r}")
+
+
+@lru_cache(maxsize=65536)
+def parse_phone(phone: str, iso_code: str = None) -> str:
+    """
+    Parsing phone with module phonenumbers, results are cached by the number and the region
+    :param phone: str
+    :param iso_code: str
+        ISO country code in upper case or None
+    :return: str
+        phone in E.164 format, empty string if the phone is invalid
+    """
+    try:
+        pattern = phonenumbers.parse(phone, iso_code)
+    except phonenumbers.NumberParseException:
+        return ''
+    if not phonenumbers.is_valid_number(pattern):
+        return ''
+    return phonenumbers.format_number(pattern, phonenumbers.PhoneNumberFormat.E164)
+
+
+def validate_phone(phone: str, iso_code: str = None) -> str:
+    """
+    Validating phone on accordance to international format with module phonenumbers
+    :param phone: str
+    :param iso_code: str
+        ISO country code like UA, GB, PL etc., not needed for numbers starting with +
+    :return: str
+        phone in E.164 format
+    :raise ValueError: if the phone is invalid
+    """
+    region = iso_code.strip().upper() if iso_code else ''
+    international_number = parse_phone(phone.strip(), region or None)
+    if not international_number:
+        raise ValueError(f"Invalid phone number: {phone!r}")
+    return international_number
+
+
+def validate_contact(record: dict, region: str = None) -> dict:
+    """
+    Validating name, phone and email of the contact, phone and email may be empty
+    :param record: dict
+        fields of the contact, 'region' is the ISO country code of the phone
+    :param region: str
+        ISO country code for phones without own region
+    :return: dict
+        validated name, phone in E.164 format and email
+    :raise ValueError: with all errors of the record
+    """
+    errors = []
+    fields = {field: record.get(field) or '' for field in ('name', 'phone', 'email')}
+    try:
+        validate_name(fields['name'])
+    except ValueError as error:
+        errors.append(str(error))
+    if fields['phone']:
+        try:
+            fields['phone'] = validate_phone(fields['phone'], record.get('region') or region)
+        except ValueError as error:
+            errors.append(str(error))
+    if fields['email']:
+        try:
+            validate_email(fields['email'])
+        except ValueError as error:
+            errors.append(str(error))
+    if errors:
+        raise ValueError('; '.join(errors))
+    return fields
+
+
+def validate_batch(check, batch: list, region: str = None) -> list:
+    """
+    Validating the batch of records, it runs in a worker process
+    :param check: function
+        validation of one record like validate_contact
+    :param batch: list
+        records
+    :param region: str
+        ISO country code for phones without own region
+    :return: list
+        (validated fields or None, error or None) tuples
+    """
+    results = []
+    for record in batch:
+        try:
+            results.append((check(record, region), None))
+        except ValueError as error:
+            results.append((None, str(error)))
+    return results
+
+
+def validate_many(records, check=validate_contact, region: str = None, batch_size: int = BATCH_SIZE,
+                  workers: int = None):
+    """
+    Validating the stream of records by batches in a pool of processes.
+    Only a few batches are in flight, so memory doesn't depend on the number of records
+    :param records: iterable
+        dicts of fields
+    :param check: function
+        validation of one record, validate_contact by default; it must be a function of a module
+        to be sent to processes
+    :param region: str
+        ISO country code for phones without own region
+    :param batch_size: int
+        number of records validated by a process at once
+    :param workers: int
+        number of processes, 1 validates in the current process, all CPUs by default
+    :return: generator
+        (record, validated fields or None, error or None) tuples in order of records
+    """
+    workers = workers or os.cpu_count() or 1
+    records = iter(records)
+    batches = iter(lambda: list(islice(records, batch_size)), [])
+    if workers == 1:
+        for batch in batches:
+            yield from zip(batch, *zip(*validate_batch(check, batch, region)))
+        return
+    with ProcessPoolExecutor(workers) as executor:
+        in_flight = deque()
+        for batch in batches:
+            in_flight.append((batch, executor.submit(validate_batch, check, batch, region)))
+            if len(in_flight) >= workers * 2:
+                batch, future = in_flight.popleft()
+                yield from zip(batch, *zip(*future.result()))
+        while in_flight:
+            batch, future = in_flight.popleft()
+            yield from zip(batch, *zip(*future.result()))
+
 
 def name_validator():
     """
@@ -14,9 +181,11 @@ def name_validator():
     """
     while True:
         name = input("Name: ")
-        if isinstance(name, str) and name.isalpha() or not name:
+        if not name:
             return name
-        else:
+        try:
+            return validate_name(name)
+        except ValueError:
             print("Please enter a valid Name")
 
 
@@ -28,16 +197,18 @@ def email_check():
     """
     while True:
         email = input("Email: ")
-        pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        if (re.fullmatch(pattern, email)) or not email:
+        if not email:
             return email
-        else:
+        try:
+            return validate_email(email)
+        except ValueError:
             print("Invalid Email")
 
 
 def phone_check():
     """
-    Validating inputted phone on accordance to international format with module phonenumbers
+    Validating inputted phone on accordance to international format with module phonenumbers.
+    ISO country code is asked only for numbers without the international prefix +
     :return: str
         formatted phone number
     """
@@ -45,16 +216,16 @@ def phone_check():
         phone = input("Phone: ")
         if not phone:
             break
-        iso_code = input("ISO country code like UA, GB, PL etc.: ").upper()
-
-        pattern = phonenumbers.parse(phone, iso_code)
-        if not phone or phonenumbers.is_valid_number(pattern):
-            international_number = phonenumbers.format_number(
-                pattern, phonenumbers.PhoneNumberFormat.E164)
-            print(international_number)
-            return international_number
-        else:
+        iso_code = None
+        if not phone.strip().startswith('+'):
+            iso_code = input("ISO country code like UA, GB, PL etc.: ")
+        try:
+            international_number = validate_phone(phone, iso_code)
+        except ValueError:
             print("Invalid phone number")
+            continue
+        print(international_number)
+        return international_number
 
 
 # (self.persons[name].__dict__.values())